@@ -49,6 +49,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 MIDDLEWARE = [
@@ -147,6 +148,51 @@ LOGOUT_REDIRECT_URL = '/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+
+# Background jobs
+# Run jobs in the request instead of queueing them for `manage.py runworker`,
+# handy when developing locally without a worker process
+
+JOBS_EAGER = os.environ.get("JOBS_EAGER") == "True"
+
+
+# Game uploads
+# Content-Encoding to precompress game files that compress well with (js, wasm,
+# html, css, json, data...): "gzip", "br" (requires the brotli package) or "off"
+
+BUNDLE_PRECOMPRESS = os.environ.get("BUNDLE_PRECOMPRESS", "gzip")
+
+# File storage
+# Where uploaded files are kept: "s3" (default), "local" to keep them in
+# STORAGE_ROOT on this server, or "memory" for tests & benchmarks.
+# Files in local & memory storage are served by our own views under STORAGE_URL.
+
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "s3")
+STORAGE_ROOT = os.environ.get("STORAGE_ROOT", BASE_DIR / "storage")
+STORAGE_URL = "/storage/"
+
+# Cache
+# Shared by every web & worker process, e.g. "redis://localhost:6379/0" or
+# "pymemcache://127.0.0.1:11211". Default: a cache per process, in memory.
+
+if os.environ.get("CACHE_URL"):
+    CACHES = {"default": environ.Env.cache_url_config(os.environ["CACHE_URL"])}
+
+# Search
+# How games are searched: "substring" (default) matches words anywhere in tags,
+# titles & usernames, "fuzzy" also matches them with typos, "fulltext" uses the
+# games' full-text search documents, see main_app/search.py.
+# Run `manage.py update_search_vectors` before switching to "fulltext".
+
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "substring")
+
+# Seconds search results are cached for, 0 to not cache them. Results are
+# invalidated as games & tags change, which only reaches every web & worker
+# process through a shared cache, see CACHE_URL. So without one, results
+# are not cached by default: each process would serve its own stale results.
+
+SEARCH_CACHE_TIMEOUT = int(os.environ.get("SEARCH_CACHE_TIMEOUT", 60 if os.environ.get("CACHE_URL") else 0))
+
 if os.environ.get("DEPLOY") == "True":
     import django_on_heroku
     django_on_heroku.settings(locals())
@@ -6,4 +6,13 @@ class GameCreateForm(GameForm):
     """
         Form to edit games
     """
-    zip_upload = forms.FileField(widget=widgets.FileInput(attrs={"accept": ".zip"}), required=True)
\ No newline at end of file
+    zip_upload = forms.FileField(widget=widgets.FileInput(attrs={
+        "accept": ".zip", "data-upload-kind": "bundle", "data-upload-session": "zip_upload_session"}),
+        required=False)
+
+    def clean(self):
+        """Require a zip, either uploaded with the form or straight to s3"""
+        cleaned_data = super().clean()
+        if not cleaned_data.get("zip_upload") and not cleaned_data.get("zip_upload_session"):
+            self.add_error("zip_upload", "This field is required.")
+        return cleaned_data
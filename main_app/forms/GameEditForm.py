@@ -6,4 +6,6 @@ class GameEditForm(GameForm):
     """
         Form to edit games
     """
-    zip_upload = forms.FileField(widget=widgets.FileInput(attrs={"accept": ".zip"}), required=False)
+    zip_upload = forms.FileField(widget=widgets.FileInput(attrs={
+        "accept": ".zip", "data-upload-kind": "bundle", "data-upload-session": "zip_upload_session"}),
+        required=False)
@@ -1,6 +1,6 @@
 from django import forms
 
-from django.forms import FileField, CharField, Textarea
+from django.forms import FileField, CharField, Textarea, IntegerField, HiddenInput, FileInput
 
 from ..models import Game
 from .fields import TagsField
@@ -20,7 +20,13 @@ class GameForm(forms.ModelForm):
     add_fullscreen_btn = CheckboxField(label="Add fullscreen button?", required=False)
     is_published = CheckboxField(label="Publish", required=False)
 
-    screenshot = FileField(required=False)
+    screenshot = FileField(required=False, widget=FileInput(attrs={
+        "accept": "image/*", "data-upload-kind": "screenshot", "data-upload-session": "screenshot_session"}))
+
+    # set instead of the file fields when the browser uploaded straight to s3,
+    # see views/api/uploads.py
+    zip_upload_session = IntegerField(required=False, widget=HiddenInput)
+    screenshot_session = IntegerField(required=False, widget=HiddenInput)
 
 
     class Meta:
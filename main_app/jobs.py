@@ -0,0 +1,438 @@
+"""
+    Background jobs, stored in the database as Job rows
+    main_app / jobs.py
+
+    enqueue    - queues a job to be run by a worker
+    queue_bundle, queue_screenshot - queue processing of a staged upload
+    run_worker - runs queued jobs until stopped, see `manage.py runworker`
+    flush_deletions - deletes files queued for deletion from storage, in batches
+    expire_upload_sessions - discards upload sessions that were never used
+
+    Job kinds:
+        process_bundle     - ingests a game's uploaded zip bundle
+        process_screenshot - replaces a game's cover screenshot with an uploaded image
+        delete_folder      - deletes everything under a folder key in storage
+"""
+import tempfile
+import threading
+import time
+import traceback
+import typing
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File as FileWrapper
+from django.db import connection, transaction, close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import File, Game, Job, PendingDeletion, UploadSession
+from .models.UploadSession import EXPIRES_AFTER
+from .models.helpers import upload_game_bundle, replace_cover_screenshot
+from .util.images import variant_base_key
+from .util.storage import get_storage
+
+# Registered job handlers by kind
+_handlers: dict[str, typing.Callable[..., None]] = {}
+
+# Called with the job's payload once a job has failed for good
+_failure_handlers: dict[str, typing.Callable[..., None]] = {}
+
+# Seconds before a running job is assumed to belong to a dead worker
+_RUNNING_TIMEOUT = 15 * 60
+
+# Seconds between touches of a running job's updated_at, showing its worker is alive
+_HEARTBEAT_INTERVAL = 60
+
+# Seconds to wait before retrying a failed attempt, multiplied by the attempt number
+_RETRY_BACKOFF = 30
+
+# Files deleted from storage per batch, one delete_objects request on s3
+_DELETION_BATCH_SIZE = 1000
+
+# Expired upload sessions discarded per batch
+_EXPIRY_BATCH_SIZE = 100
+
+
+def handler(kind: str, on_failure: typing.Callable[..., None] | None = None):
+    """
+        Decorator that registers a function to run jobs of a kind.
+        The job's payload is passed to it as keyword arguments.
+
+        Args:
+            kind: name of the job kind
+            on_failure: called with the payload once the job has used up its attempts
+    """
+    def register(fn):
+        _handlers[kind] = fn
+        if on_failure:
+            _failure_handlers[kind] = on_failure
+        return fn
+
+    return register
+
+
+def enqueue(kind: str, **payload) -> Job:
+    """
+        Queue a job for a worker to run.
+        With JOBS_EAGER set in the environment, the job is run right away
+        instead, which is handy when developing without a worker.
+
+        Args:
+            kind: kind of job, must have a registered handler
+            payload: keyword arguments for the handler, must be json serializable
+    """
+    if kind not in _handlers:
+        raise ValueError(f"no job handler registered for kind: {kind}")
+
+    job = Job.objects.create(kind=kind, payload=payload)
+
+    if settings.JOBS_EAGER:
+        job.status = Job.Status.RUNNING
+        job.attempts += 1
+        job.save()
+        run_job(job)
+
+    return job
+
+
+def queue_bundle(game: Game, key: str, filename: str) -> Job:
+    """
+        Queue ingesting a game's zip bundle that was staged in storage.
+        The game shows as "processing" until the job is done.
+
+        Args:
+            game: game the bundle belongs to
+            key: staged zip in storage, deleted by the job when done
+            filename: name of the zip that was uploaded
+    """
+    game.status = Game.Status.PROCESSING
+    Game.objects.filter(id=game.id).update(status=Game.Status.PROCESSING)
+
+    return enqueue("process_bundle", game_id=game.id, key=key, filename=filename)
+
+
+def queue_screenshot(game: Game, key: str, filename: str) -> Job:
+    """
+        Queue replacing a game's cover screenshot with an image staged in storage
+
+        Args:
+            game: game the screenshot belongs to
+            key: staged image in storage, deleted by the job when done
+            filename: name of the image that was uploaded
+    """
+    return enqueue("process_screenshot", game_id=game.id, key=key, filename=filename)
+
+
+def claim_next() -> Job | None:
+    """
+        Claims the next due job, marking it as running.
+        Safe to call from many workers at once, each job is only claimed once.
+
+        A job left running by a worker that died, e.g. killed for running out
+        of memory on a huge bundle, is run again, unless that was its last
+        attempt: then it fails for good instead, see _fail, & the next job is claimed.
+
+        Returns:
+            the claimed job, or None if there is nothing to do
+    """
+    while True:
+        now = timezone.now()
+        with transaction.atomic():
+            job = (Job.objects
+                   .select_for_update(skip_locked=True)
+                   .filter(Q(status=Job.Status.QUEUED, run_after__lte=now) |
+                           Q(status=Job.Status.RUNNING,
+                             updated_at__lt=now - timedelta(seconds=_RUNNING_TIMEOUT)))
+                   .order_by("run_after", "id")
+                   .first())
+
+            if job is None:
+                return None
+
+            abandoned = job.status == Job.Status.RUNNING and job.attempts >= job.max_attempts
+            if abandoned:
+                job.status = Job.Status.FAILED
+                job.error = f"worker stopped responding during attempt {job.attempts}\n{job.error}".strip()
+            else:
+                job.status = Job.Status.RUNNING
+                job.attempts += 1
+            job.save()
+
+        if not abandoned:
+            return job
+
+        print(f"job {job} failed: worker stopped responding during its last attempt")
+        _fail(job)
+
+
+class _Heartbeat:
+    """
+        Touches a running job's updated_at every _HEARTBEAT_INTERVAL seconds
+        from a background thread, so however long the job takes, e.g. a 1 GB
+        bundle, other workers don't mistake it for abandoned & run it again.
+        Only a job still running the same attempt is touched.
+    """
+
+    def __init__(self, job: Job):
+        self.job = job
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._beat, name=f"heartbeat-{job.id}", daemon=True)
+
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+
+    def _beat(self):
+        try:
+            while not self._stopped.wait(_HEARTBEAT_INTERVAL):
+                try:
+                    (Job.objects.filter(id=self.job.id, status=Job.Status.RUNNING, attempts=self.job.attempts)
+                                .update(updated_at=timezone.now()))
+                except Exception as e:
+                    print(f"job {self.job} heartbeat failed:", e)
+        finally:
+            # the thread's own database connection
+            connection.close()
+
+
+def run_job(job: Job):
+    """
+        Runs a claimed job, recording whether it succeeded.
+        Failed attempts are retried later until max_attempts is reached.
+    """
+    try:
+        with _Heartbeat(job):
+            _handlers[job.kind](**job.payload)
+    except Exception as e:
+        print(f"job {job} failed:", e)
+        job.error = traceback.format_exc()
+
+        if job.attempts < job.max_attempts:
+            job.status = Job.Status.QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=_RETRY_BACKOFF * job.attempts)
+        else:
+            job.status = Job.Status.FAILED
+            _fail(job)
+    else:
+        job.status = Job.Status.DONE
+        job.error = ""
+
+    job.save()
+
+
+def _fail(job: Job):
+    """
+        Calls the failure handler of a job that has failed for good, if its kind has one
+    """
+    on_failure = _failure_handlers.get(job.kind)
+    if on_failure:
+        try:
+            on_failure(**job.payload)
+        except Exception as e:
+            print(f"job {job} failure handler raised:", e)
+
+
+def run_worker(poll_interval: float = 2, once: bool = False,
+               should_stop: typing.Callable[[], bool] = lambda: False):
+    """
+        Runs jobs until stopped
+
+        Args:
+            poll_interval: seconds to sleep when there are no jobs
+            once: return as soon as there are no jobs left
+            should_stop: checked between jobs, return True to stop the worker
+    """
+    while not should_stop():
+        close_old_connections()
+
+        job = claim_next()
+        if job is None:
+            # idle, catch up on deleting files & abandoned uploads
+            if flush_deletions() or expire_upload_sessions():
+                continue
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+
+        run_job(job)
+
+
+def flush_deletions(batch_size: int = _DELETION_BATCH_SIZE) -> int:
+    """
+        Deletes one batch of files queued for deletion from storage.
+        Safe to call from many workers at once, each row is only handled once.
+        Files that fail to delete are retried later, with a backoff.
+
+        Keys that a File uses again by now are skipped, along with the
+        resized copies of its image, e.g. an avatar replaced by the same picture.
+
+        Returns:
+            number of queued deletions handled
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        pending = list(PendingDeletion.objects
+                       .select_for_update(skip_locked=True)
+                       .filter(run_after__lte=now)
+                       .order_by("run_after", "id")[:batch_size])
+        if not pending:
+            return 0
+
+        keys = {deletion.key for deletion in pending}
+        bases = {key: variant_base_key(key) or key for key in keys}
+        in_use = set(File.objects.filter(key__in=set(bases.values())).values_list("key", flat=True))
+        keys = {key for key in keys if bases[key] not in in_use}
+
+        try:
+            errors = get_storage().delete_many(sorted(keys))
+        except Exception as e:
+            errors = {key: str(e) for key in keys}
+
+        failed = [deletion for deletion in pending if deletion.key in errors]
+        for deletion in failed:
+            deletion.attempts += 1
+            deletion.error = errors[deletion.key]
+            deletion.run_after = now + timedelta(seconds=_RETRY_BACKOFF * deletion.attempts)
+        PendingDeletion.objects.bulk_update(failed, ["attempts", "error", "run_after"])
+
+        PendingDeletion.objects.filter(
+            id__in=[deletion.id for deletion in pending if deletion.key not in errors]).delete()
+
+    if failed:
+        print(f"flush_deletions: failed to delete {len(failed)} files, e.g. {failed[0].key}:",
+              failed[0].error)
+
+    return len(pending)
+
+
+def expire_upload_sessions(batch_size: int = _EXPIRY_BATCH_SIZE) -> int:
+    """
+        Discards one batch of upload sessions older than EXPIRES_AFTER, see
+        UploadSession.discard: uploads that were abandoned, or never completed,
+        or whose game form was never submitted. Their multipart uploads are
+        aborted, which s3 would otherwise keep & bill for without listing them.
+        Queued sessions are only forgotten, the job processing their file
+        deletes it. Safe to call from many workers at once.
+
+        Returns:
+            number of sessions discarded
+    """
+    cutoff = timezone.now() - EXPIRES_AFTER
+    discarded = 0
+    with transaction.atomic():
+        sessions = list(UploadSession.objects
+                        .select_for_update(skip_locked=True)
+                        .filter(created_at__lt=cutoff)
+                        .order_by("created_at", "id")[:batch_size])
+
+        for session in sessions:
+            if session.status == UploadSession.Status.QUEUED:
+                session.delete()
+                discarded += 1
+                continue
+
+            try:
+                with transaction.atomic():
+                    session.discard()
+                discarded += 1
+            except Exception as e:
+                # kept, & tried again the next time the worker is idle
+                print(f"expire_upload_sessions: failed to discard upload session {session.id}:", e)
+
+    return discarded
+
+
+def _download(key: str, filename: str) -> FileWrapper:
+    """
+        Downloads a stored file into a temporary file
+
+        Args:
+            key: key of the object to download
+            filename: name to give the file, e.g. the name of the original upload
+    """
+    tmp = tempfile.TemporaryFile()
+    get_storage().download(key, tmp)
+    tmp.seek(0)
+
+    return FileWrapper(tmp, name=filename)
+
+
+# ===== handlers ==============================================================
+
+
+def _bundle_failed(game_id: int, key: str, filename: str):
+    Game.objects.filter(id=game_id).update(status=Game.Status.FAILED)
+    File.helpers.delete(key)
+
+
+@handler("process_bundle", on_failure=_bundle_failed)
+def process_bundle(game_id: int, key: str, filename: str):
+    """
+        Ingests a game's zip bundle that was staged in storage
+
+        Args:
+            game_id: game the bundle belongs to
+            key: staged zip in storage, deleted when done
+            filename: name of the zip that was uploaded
+    """
+    game = Game.objects.filter(id=game_id).first()
+    if game is None:
+        File.helpers.delete(key)
+        return  # game was deleted in the meantime
+
+    with _download(key, filename) as zip_upload:
+        ok = upload_game_bundle(zip_upload, game)
+
+    Game.objects.filter(id=game_id).update(
+        status=Game.Status.READY if ok else Game.Status.FAILED)
+    File.helpers.delete(key)
+
+
+def _screenshot_failed(game_id: int, key: str, filename: str):
+    File.helpers.delete(key)
+
+
+@handler("process_screenshot", on_failure=_screenshot_failed)
+def process_screenshot(game_id: int, key: str, filename: str):
+    """
+        Replaces a game's cover screenshot with an image staged in storage,
+        see replace_cover_screenshot
+
+        Args:
+            game_id: game the screenshot belongs to
+            key: staged image in storage, deleted when done
+            filename: name of the image that was uploaded
+    """
+    if Game.objects.filter(id=game_id).exists():
+        with _download(key, filename) as screenshot_upload:
+            if not replace_cover_screenshot(screenshot_upload, game_id):
+                print(f"process_screenshot error: failed to create screenshot for game: {game_id}")
+
+    File.helpers.delete(key)
+
+
+@handler("delete_folder")
+def delete_folder(key: str):
+    """
+        Deletes everything under a folder key in storage.
+        Raises if anything was left behind, so the job is retried.
+
+        Args:
+            key: folder key, e.g. "user/1/games/2/"
+    """
+    report = get_storage().delete_prefix(key)
+    print(f"delete_folder {key}: {report}")
+
+    if not report.ok:
+        for failed_key, error in list(report.failed.items())[:10]:
+            print(f"    {failed_key}:", error)
+        raise RuntimeError(f"failed to delete {len(report.failed)} files under {key}")
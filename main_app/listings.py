@@ -0,0 +1,93 @@
+"""
+    Game listings a page at a time, called by the html views and the json api
+    main_app / listings.py
+
+    game_page     - a page of popular games or of search results, with the cursor of the next page
+    popular_games - published games, most viewed first
+
+    Pages are found by keyset pagination: a cursor holds the sort values of
+    the last game of a page, and the next page is the games sorted after it.
+    However deep, a page of popular games is one range scan of the
+    game_popular index, where OFFSET would read & skip every game before it.
+"""
+from django.db import models
+from django.db.models import F, Func, QuerySet, Value
+
+from . import search
+from .models import Game
+from .util.cursor import decode_cursor, encode_cursor
+
+# Games per page of a listing
+PAGE_SIZE = 24
+
+# Most games per page the json api returns
+MAX_PAGE_SIZE = 100
+
+
+def _row(*expressions) -> Func:
+    """
+        Row constructor, compared column by column: ROW(a, b) < ROW(1, 2)
+        is a < 1 OR (a = 1 AND b < 2), as one condition an index can seek to
+    """
+    return Func(*expressions, function="ROW", output_field=models.Field())
+
+
+def popular_games(after: tuple[int, int] | None = None) -> QuerySet:
+    """
+        Published games, most viewed first, then newest first for equal views,
+        with what listings show of them loaded
+
+        Args:
+            after: (times_viewed, id) of the last game of the previous page
+    """
+    games = Game.objects.filter(is_published=True)
+    if after is not None:
+        times_viewed, game_id = after
+        games = (games.alias(position=_row(F("times_viewed"), F("id")))
+                      .filter(position__lt=_row(Value(times_viewed), Value(game_id))))
+
+    return (games.select_related("user", "cover__file").prefetch_related("tags")
+                 .defer("search_vector").order_by("-times_viewed", "-id"))
+
+
+def game_page(q: str | None, cursor: str | None = None, limit: int = PAGE_SIZE) -> tuple[list[Game], str | None]:
+    """
+        A page of games: search results for a query, most relevant first,
+        see search.search_games, or else popular games, see popular_games.
+        One more game than the page holds is fetched, to tell if there is
+        a next page without counting.
+
+        Views change between pages, so a game that gets viewed while someone
+        scrolls may move to a page they have already seen, or not yet seen.
+
+        Args:
+            q: search query, if any
+            cursor: from the previous page, None for the first page
+            limit: number of games on the page
+
+        Returns:
+            the games, and the cursor of the next page, None on the last page
+
+        Raises:
+            ValueError: if the cursor is malformed
+    """
+    if q:
+        after = decode_cursor(cursor, (float, int)) if cursor else None
+        if cursor and after is None:
+            raise ValueError(f"invalid cursor: {cursor}")
+
+        games = search.search_games(q, limit + 1, after)
+        last_key = lambda game: (game.search_score, game.id)
+    else:
+        after = decode_cursor(cursor, (int, int)) if cursor else None
+        if cursor and after is None:
+            raise ValueError(f"invalid cursor: {cursor}")
+
+        games = list(popular_games(after)[:limit + 1])
+        last_key = lambda game: (game.times_viewed, game.id)
+
+    if len(games) <= limit:
+        return games, None
+
+    games = games[:limit]
+    return games, encode_cursor(last_key(games[-1]))
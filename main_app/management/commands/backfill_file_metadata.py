@@ -0,0 +1,104 @@
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from ...models import File
+from ...util.images import image_dimensions
+from ...util.storage import get_storage
+
+# Bytes fetched from the start of an image to read its dimensions from its header
+_IMAGE_HEADER_SIZE = 64 * 1024
+
+# Size of reads while hashing a file
+_CHUNK_SIZE = 1024 * 1024
+
+
+class Command(BaseCommand):
+    """
+        Records the metadata of files uploaded before File kept it:
+        content type & size, and optionally image dimensions and sha256.
+        Files are fetched in batches, with a few requests to storage in flight at once.
+
+        usage: python manage.py backfill_file_metadata [--batch-size N] [--workers N]
+                                                       [--dimensions] [--hash]
+    """
+
+    help = "Records content type, size, image dimensions & hashes of existing files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200,
+                            help="number of files to fetch & save at a time")
+        parser.add_argument("--workers", type=int, default=16,
+                            help="number of requests to storage in flight at once")
+        parser.add_argument("--dimensions", action="store_true",
+                            help="also read the dimensions of images, from the start of the file")
+        parser.add_argument("--hash", action="store_true",
+                            help="also hash files missing a sha256, downloading them entirely")
+
+    def handle(self, *args, **options):
+        workers = max(1, options["workers"])
+        self.storage = get_storage()
+        self.dimensions = options["dimensions"]
+        self.hash = options["hash"]
+
+        missing = File.objects.filter(content_type="")
+        if self.dimensions:
+            missing |= File.objects.filter(content_type__startswith="image/", width__isnull=True)
+        if self.hash:
+            missing |= File.objects.filter(sha256="")
+
+        updated = failed = 0
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                # iterate by id, so rows saved in a batch don't shift the next one
+                batch = list(missing.filter(id__gt=last_id).order_by("id")[:options["batch_size"]])
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                results = list(executor.map(self._fetch, batch))
+                done = [file for file, ok in zip(batch, results) if ok]
+                failed += len(batch) - len(done)
+
+                File.objects.bulk_update(done, ["content_type", "size", "sha256", "width", "height"])
+                updated += len(done)
+                self.stdout.write(f"backfill_file_metadata: {updated} updated, {failed} failed")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"backfill_file_metadata: done, {updated} updated, {failed} failed"))
+
+    def _fetch(self, file: File) -> bool:
+        """
+            Fills in a file's missing metadata from storage, runs on a worker thread
+
+            Returns:
+                True if the file was found and its metadata filled in
+        """
+        try:
+            if not file.content_type or file.size is None:
+                info = self.storage.head(file.key)
+                if info is None:
+                    raise FileNotFoundError("not in storage")
+                file.content_type = info.content_type
+                file.size = info.size
+
+            if self.dimensions and file.content_type.startswith("image/") and file.width is None:
+                header = self.storage.read_range(file.key, 0, _IMAGE_HEADER_SIZE)
+                dimensions = image_dimensions(io.BytesIO(header))
+                if dimensions:
+                    file.width, file.height = dimensions
+
+            if self.hash and not file.sha256:
+                sha256 = hashlib.sha256()
+                with self.storage.open(file.key) as body:
+                    while data := body.read(_CHUNK_SIZE):
+                        sha256.update(data)
+                file.sha256 = sha256.hexdigest()
+        except Exception as e:
+            print(f"backfill_file_metadata error: file {file.id} ({file.key}):", e)
+            return False
+
+        return True
@@ -0,0 +1,152 @@
+import json
+import random
+import time
+import typing
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ... import search
+from ...models import Game, Tag
+from ...util.bench import summarize
+
+# Number of different games, users & queries each benchmark cycles through
+SAMPLE_SIZE = 20
+
+
+class Command(BaseCommand):
+    """
+        Measures how long the hot paths take & how many queries they make,
+        against whatever is in the database, e.g. after `manage.py seed_data`.
+        Each benchmark runs a few warmup rounds, then times every round:
+
+            search_games   - search.search_games, for popular tags & title words
+            top_tags       - search.top_tags, for tag prefixes
+            games.index    - the games listing page, without & with a query
+            games.detail   - a game's page, seen by its creator so views aren't counted
+            profile.profile - a creator's public profile
+
+        Pages are requested through the test client, so they include templates
+        & middleware but no network. The timed requests write nothing, so every
+        run measures the same data. Search results are not cached unless
+        --cache is passed. Runs pick the same games & users with the same --seed,
+        so results of two runs, e.g. before & after a change, are comparable.
+
+        usage: python manage.py benchmark [--rounds N] [--warmup N] [--only NAME ...]
+                                          [--cache] [--seed N] [--json]
+    """
+
+    help = "Measures latency percentiles & query counts of search & the main pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=50,
+                            help="number of timed rounds per benchmark, default: 50")
+        parser.add_argument("--warmup", type=int, default=5,
+                            help="number of untimed rounds per benchmark first, default: 5")
+        parser.add_argument("--only", nargs="+", default=None,
+                            help="names of the benchmarks to run, default: all")
+        parser.add_argument("--cache", action="store_true",
+                            help="keep caching search results, as in production")
+        parser.add_argument("--seed", type=int, default=0,
+                            help="random seed picking the games, users & queries")
+        parser.add_argument("--json", action="store_true",
+                            help="print the results as JSON, to save & compare runs")
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.client = Client()
+
+        benchmarks = self._benchmarks()
+        names = options["only"] or list(benchmarks)
+        unknown = set(names) - set(benchmarks)
+        if unknown:
+            raise CommandError(f"unknown benchmarks: {', '.join(sorted(unknown))}, "
+                               f"expected some of: {', '.join(benchmarks)}")
+
+        # this one process needs no shared cache, so --cache caches even without one
+        overrides = {"ALLOWED_HOSTS": ["testserver"],
+                     "SEARCH_CACHE_TIMEOUT": (settings.SEARCH_CACHE_TIMEOUT or 60) if options["cache"] else 0}
+
+        results = {}
+        with override_settings(**overrides):
+            for name in names:
+                results[name] = self._run(benchmarks[name], options["warmup"], options["rounds"])
+                if not options["json"]:
+                    self._write_result(name, results[name])
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+
+    def _benchmarks(self) -> dict[str, list[typing.Callable[[], typing.Any]]]:
+        """
+            Calls to time for each benchmark, a round makes one of them in turn
+        """
+        games = list(Game.objects.filter(is_published=True).order_by("-times_viewed")
+                                 .values_list("id", "title", "user__username", "user_id")[:SAMPLE_SIZE * 5])
+        tags = list(Tag.objects.filter(published_count__gt=0).order_by("-published_count")
+                               .values_list("text", flat=True)[:SAMPLE_SIZE * 5])
+        if not games or not tags:
+            raise CommandError("no published games to benchmark, try `manage.py seed_data` first")
+
+        games = self.random.sample(games, min(SAMPLE_SIZE, len(games)))
+        tags = self.random.sample(tags, min(SAMPLE_SIZE, len(tags)))
+        queries = tags[:SAMPLE_SIZE // 2] + [title.split()[0] for _, title, _, _ in games[:SAMPLE_SIZE // 2]]
+        usernames = sorted({username for _, _, username, _ in games})
+
+        # a game's creator viewing it doesn't count as a view, which would be a write
+        owners = {}
+        for user in User.objects.filter(id__in={user_id for _, _, _, user_id in games}):
+            owners[user.id] = Client()
+            owners[user.id].force_login(user)
+
+        index_url = reverse("games_index")
+        return {
+            "search_games": [lambda q=q: search.search_games(q) for q in queries],
+            "top_tags": [lambda q=tag[:2]: search.top_tags(q) for tag in tags],
+            "games.index": [lambda: self._get(index_url)]
+                           + [lambda q=q: self._get(index_url, {"q": q}) for q in queries],
+            "games.detail": [lambda url=reverse("games_detail", args=[game_id]), client=owners[user_id]:
+                             self._get(url, client=client)
+                             for game_id, _, _, user_id in games],
+            "profile.profile": [lambda url=reverse("profile_public", args=[username]): self._get(url)
+                                for username in usernames],
+        }
+
+    def _get(self, url: str, data: dict | None = None, client: Client | None = None):
+        response = (client or self.client).get(url, data)
+        if response.status_code != 200:
+            raise CommandError(f"GET {url} returned {response.status_code}")
+
+        return response
+
+    def _run(self, calls: list[typing.Callable[[], typing.Any]], warmup: int, rounds: int) -> dict:
+        """
+            Runs a benchmark's calls in turn, for warmup rounds then timed rounds
+
+            Returns:
+                {"ms": latency statistics, "queries": query count statistics}
+        """
+        for i in range(warmup):
+            calls[i % len(calls)]()
+
+        timings, query_counts = [], []
+        for i in range(rounds):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                calls[i % len(calls)]()
+                timings.append((time.perf_counter() - start) * 1000)
+            query_counts.append(len(queries))
+
+        return {"ms": summarize(timings), "queries": summarize(query_counts)}
+
+    def _write_result(self, name: str, result: dict):
+        ms, queries = result["ms"], result["queries"]
+        self.stdout.write(
+            f"{name:<16} p50 {ms['p50']:8.2f}ms  p90 {ms['p90']:8.2f}ms  "
+            f"p99 {ms['p99']:8.2f}ms  max {ms['max']:8.2f}ms  "
+            f"queries p50 {queries['p50']:g} max {queries['max']:g}")
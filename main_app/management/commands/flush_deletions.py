@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from ... import jobs
+from ...models import PendingDeletion
+
+
+class Command(BaseCommand):
+    """
+        Deletes the files queued for deletion from storage, without waiting
+        for a worker to get to them
+
+        usage: python manage.py flush_deletions [--batch-size N]
+    """
+
+    help = "Deletes files queued for deletion from storage, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="number of files to delete per request")
+
+    def handle(self, *args, **options):
+        handled = 0
+        while count := jobs.flush_deletions(options["batch_size"]):
+            handled += count
+
+        left = PendingDeletion.objects.count()
+        self.stdout.write(f"flush_deletions: {handled} handled, {left} waiting to be retried")
@@ -0,0 +1,75 @@
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from ...models import File, Screenshot
+from ...util.images import SCREENSHOT_WIDTHS, image_dimensions
+from ...util.storage import get_storage
+
+# Downloaded images are buffered in memory up to this size, then spooled to disk
+_SPOOL_SIZE = 8 * 1024 * 1024
+
+
+class Command(BaseCommand):
+    """
+        Makes the resized copies of screenshots uploaded before they were made
+        on upload, see File.variants
+
+        usage: python manage.py generate_image_variants [--batch-size N] [--workers N]
+    """
+
+    help = "Makes resized WebP copies of existing screenshots, for srcset"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100,
+                            help="number of screenshots to process & save at a time")
+        parser.add_argument("--workers", type=int, default=4,
+                            help="number of screenshots processed at once")
+
+    def handle(self, *args, **options):
+        missing = File.objects.filter(
+            id__in=Screenshot.objects.filter(file__isnull=False).values("file_id"),
+            variants=[])
+
+        updated = skipped = 0
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=max(1, options["workers"])) as executor:
+            while True:
+                # iterate by id, images too small for any copy keep an empty list
+                batch = list(missing.filter(id__gt=last_id).order_by("id")[:options["batch_size"]])
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                done = [file for file, ok in zip(batch, executor.map(self._process, batch)) if ok]
+                skipped += len(batch) - len(done)
+
+                File.objects.bulk_update(done, ["variants", "width", "height"])
+                updated += len(done)
+                self.stdout.write(f"generate_image_variants: {updated} updated, {skipped} skipped")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"generate_image_variants: done, {updated} updated, {skipped} skipped"))
+
+    def _process(self, file: File) -> bool:
+        """
+            Downloads a screenshot and uploads its resized copies, runs on a worker thread
+
+            Returns:
+                True if any copies were made
+        """
+        try:
+            with tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE) as image:
+                get_storage().download(file.key, image)
+                image.seek(0)
+
+                if file.width is None:
+                    file.width, file.height = image_dimensions(image) or (None, None)
+
+                file.variants = File.helpers.upload_variants(image, file.key, SCREENSHOT_WIDTHS)
+        except Exception as e:
+            print(f"generate_image_variants error: file {file.id} ({file.key}):", e)
+            return False
+
+        return bool(file.variants)
@@ -0,0 +1,127 @@
+import re
+from datetime import timedelta
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ...models import File, Game, Job, PendingDeletion, UploadSession
+from ...models.UploadSession import EXPIRES_AFTER
+from ...util.images import variant_base_key
+from ...util.storage import ListedObject, get_storage
+
+# Matches a game's bundle files, e.g. "user/1/games/2/files/index.html", and
+# its zip, uploaded to "user/1/games/2//compressed.zip" with a double slash
+_GAME_BUNDLE_KEY = re.compile(r"^user/(\d+)/games/(\d+)/+(?:files/|compressed\.zip$)")
+
+# Upload sessions still using their staged file
+_ACTIVE_UPLOAD_STATUSES = (UploadSession.Status.PENDING, UploadSession.Status.ASSEMBLING,
+                           UploadSession.Status.UPLOADED)
+
+# Jobs that will still read the staged file in their payload's "key"
+_ACTIVE_JOB_STATUSES = (Job.Status.QUEUED, Job.Status.RUNNING)
+
+
+class Command(BaseCommand):
+    """
+        Finds files in storage that nothing references anymore, and optionally
+        deletes them. A file is in use if:
+        - a File has its key, or it is a resized copy of a File's image
+        - it is a bundle file or the zip of a game that exists. Everything else
+          in a game's folder, e.g. screenshots, needs a File
+        - an upload session younger than a day that hasn't been queued for
+          processing has its key, older ones are discarded by the worker
+        - a queued or running job has it as its payload's key, e.g. a staged
+          bundle waiting for the worker, however far behind it is
+        - it is already queued for deletion (then it's not counted at all)
+
+        The listing is streamed and checked a batch of keys at a time, with a
+        few set-based queries per batch, so memory use stays the same no
+        matter how many files there are.
+        Recent files are skipped, they may belong to an upload in progress.
+
+        usage: python manage.py reconcile_storage [--prefix user/] [--purge]
+                                                  [--min-age HOURS] [--batch-size N] [-v 2]
+    """
+
+    help = "Reports, or with --purge deletes, files in storage no model references"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="user/",
+                            help="only check keys starting with this, default: user/")
+        parser.add_argument("--purge", action="store_true",
+                            help="delete the orphaned files, instead of only reporting them")
+        parser.add_argument("--min-age", type=float, default=24,
+                            help="hours since a file was modified before it can be an orphan")
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="number of keys to check per batch of queries")
+
+    def handle(self, *args, **options):
+        storage = get_storage()
+        cutoff = timezone.now() - timedelta(hours=options["min_age"])
+        list_keys = options["verbosity"] >= 2
+
+        scanned = recent = orphans = orphan_bytes = purged = 0
+        listing = storage.list_objects(options["prefix"])
+
+        while batch := list(islice(listing, options["batch_size"])):
+            scanned += len(batch)
+
+            candidates = [obj for obj in batch if obj.last_modified < cutoff]
+            recent += len(batch) - len(candidates)
+
+            found = self._orphans(candidates)
+            orphans += len(found)
+            orphan_bytes += sum(obj.size for obj in found)
+
+            if list_keys:
+                for obj in found:
+                    self.stdout.write(f"orphan: {obj.key} ({obj.size} bytes)")
+
+            if options["purge"] and found:
+                errors = storage.delete_many([obj.key for obj in found])
+                purged += len(found) - len(errors)
+                for key, error in errors.items():
+                    print(f"reconcile_storage error: failed to delete {key}:", error)
+
+        summary = (f"reconcile_storage: {scanned} scanned, {recent} too recent to check, "
+                   f"{orphans} orphaned ({orphan_bytes} bytes)")
+        if options["purge"]:
+            summary += f", {purged} deleted"
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    def _orphans(self, objects: list[ListedObject]) -> list[ListedObject]:
+        """
+            Picks the objects of a batch that nothing references
+        """
+        if not objects:
+            return []
+
+        keys = [obj.key for obj in objects]
+
+        # bundle files of a game that still exists
+        game_folders = {match.groups() for match in map(_GAME_BUNDLE_KEY.match, keys) if match}
+        live_games = {(str(user_id), str(game_id)) for game_id, user_id in
+                      Game.objects.filter(id__in={int(game_id) for _, game_id in game_folders})
+                                  .values_list("id", "user_id")}
+
+        # keys referenced directly, and the images resized copies were made of
+        variant_of = {key: base for key in keys if (base := variant_base_key(key))}
+        referenced = set(File.objects.filter(key__in=keys + list(variant_of.values()))
+                                     .values_list("key", flat=True))
+        referenced.update(UploadSession.objects.filter(key__in=keys, status__in=_ACTIVE_UPLOAD_STATUSES,
+                                                       created_at__gte=timezone.now() - EXPIRES_AFTER)
+                                               .values_list("key", flat=True))
+        referenced.update(Job.objects.filter(payload__key__in=keys, status__in=_ACTIVE_JOB_STATUSES)
+                                     .values_list("payload__key", flat=True))
+        referenced.update(PendingDeletion.objects.filter(key__in=keys).values_list("key", flat=True))
+
+        orphans = []
+        for obj in objects:
+            match = _GAME_BUNDLE_KEY.match(obj.key)
+            if (obj.key in referenced or variant_of.get(obj.key) in referenced
+                    or (match and match.groups() in live_games)):
+                continue
+            orphans.append(obj)
+
+        return orphans
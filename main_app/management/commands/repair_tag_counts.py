@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from ...models import Tag
+from ...models.Tag import actual_published_count, published_counts_changed
+
+
+class Command(BaseCommand):
+    """
+        Recomputes Tag.published_count from the games, in case it drifted,
+        e.g. after games were published with a queryset update().
+        Tags are checked in batches by id, only wrong counts are written.
+
+        usage: python manage.py repair_tag_counts [--batch-size N]
+    """
+
+    help = "Recomputes the number of published games of each tag"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000,
+                            help="number of tags to check per query")
+
+    def handle(self, *args, **options):
+        checked = repaired = 0
+        last_id = 0
+        while True:
+            batch = list(Tag.objects.filter(id__gt=last_id).order_by("id")
+                                    .values_list("id", flat=True)[:options["batch_size"]])
+            if not batch:
+                break
+            last_id = batch[-1]
+            checked += len(batch)
+
+            wrong = list(Tag.objects.filter(id__in=batch)
+                                    .annotate(actual=actual_published_count())
+                                    .exclude(published_count=F("actual"))
+                                    .values_list("id", flat=True))
+            if wrong:
+                Tag.objects.filter(id__in=wrong).update(published_count=actual_published_count())
+                published_counts_changed.send(sender=Tag, tag_ids=wrong)
+                repaired += len(wrong)
+
+            self.stdout.write(f"repair_tag_counts: {checked} checked, {repaired} repaired")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"repair_tag_counts: done, {checked} checked, {repaired} repaired"))
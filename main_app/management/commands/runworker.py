@@ -0,0 +1,37 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from ... import jobs
+
+
+class Command(BaseCommand):
+    """
+        Runs background jobs queued with main_app.jobs.enqueue
+
+        usage: python manage.py runworker [--once] [--interval SECONDS]
+    """
+
+    help = "Runs queued background jobs, e.g. game bundle processing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="exit when there are no jobs left instead of waiting for more")
+        parser.add_argument("--interval", type=float, default=2,
+                            help="seconds to wait between checks for new jobs")
+
+    def handle(self, *args, **options):
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+            self.stdout.write("runworker: stopping after the current job...")
+
+        # heroku sends SIGTERM when restarting dynos
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write("runworker: waiting for jobs")
+        jobs.run_worker(poll_interval=options["interval"], once=options["once"],
+                        should_stop=lambda: stopping)
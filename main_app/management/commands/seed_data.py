@@ -0,0 +1,259 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from ... import search
+from ...models import Favorite, File, Game, Profile, Review, Screenshot, Tag
+from ...models.Game import update_search_vectors
+from ...models.Tag import actual_published_count
+from ...util.images import SCREENSHOT_WIDTHS, VARIANT_CONTENT_TYPE, variant_key
+
+# Usernames & file keys of generated data start with this, to find it again
+SEED_PREFIX = "seed"
+
+_ADJECTIVES = [
+    "ancient", "angry", "brave", "broken", "cosmic", "crimson", "cursed", "dark", "electric",
+    "endless", "forgotten", "frozen", "golden", "hidden", "hollow", "infinite", "iron", "last",
+    "little", "lost", "lucky", "neon", "pixel", "quantum", "rapid", "rogue", "secret", "silent",
+    "sleepy", "stellar", "super", "tiny", "wild",
+]
+_NOUNS = [
+    "adventure", "blade", "castle", "cave", "crystal", "dragon", "dungeon", "empire", "forest",
+    "galaxy", "garden", "ghost", "island", "jungle", "kingdom", "knight", "labyrinth", "legend",
+    "machine", "moon", "ninja", "ocean", "planet", "quest", "robot", "runner", "slime", "star",
+    "temple", "tower", "wizard", "world",
+]
+_GENRES = [
+    "action", "adventure", "arcade", "card-game", "casual", "clicker", "fighting", "horror",
+    "idle", "metroidvania", "platformer", "puzzle", "racing", "rhythm", "roguelike", "rpg",
+    "sandbox", "shooter", "simulation", "sports", "stealth", "strategy", "survival",
+    "tower-defense", "visual-novel",
+]
+_STYLES = [
+    "2d", "3d", "cute", "dark", "funny", "low-poly", "minimalist", "multiplayer", "pixel-art",
+    "relaxing", "retro", "singleplayer", "short", "story-rich", "top-down", "voxel",
+]
+
+
+class Command(BaseCommand):
+    """
+        Fills the database with generated users, games, tags, reviews, favorites
+        & screenshots, to develop & benchmark against a realistic catalogue,
+        see `manage.py benchmark`. Rows are made with bulk_create, a batch of
+        games at a time, then search documents & tag counts are computed in bulk.
+
+        Tags & views follow a long tail: a few tags & games are very popular.
+        Screenshot files only exist in the database, not in storage.
+        Runs are repeatable with the same --seed.
+
+        usage: python manage.py seed_data [--games N] [--users N] [--tags N]
+                                          [--batch-size N] [--seed N] [--delete]
+    """
+
+    help = "Generates users, games, tags, reviews, favorites & screenshots at scale"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--games", type=int, default=10_000,
+                            help="number of games to generate, default: 10000")
+        parser.add_argument("--users", type=int, default=None,
+                            help="number of users to generate, default: a tenth of the games")
+        parser.add_argument("--tags", type=int, default=1000,
+                            help="number of distinct tags to use, default: 1000")
+        parser.add_argument("--batch-size", type=int, default=2000,
+                            help="number of games generated per transaction")
+        parser.add_argument("--seed", type=int, default=0,
+                            help="random seed, the same seed generates the same data")
+        parser.add_argument("--delete", action="store_true",
+                            help="delete previously generated data instead")
+
+    def handle(self, *args, **options):
+        if options["delete"]:
+            return self._delete()
+
+        self.random = random.Random(options["seed"])
+        self.now = timezone.now()
+        game_count = options["games"]
+        user_count = max(1, options["users"] if options["users"] is not None else game_count // 10)
+
+        self.user_ids = self._create_users(user_count)
+        self.tag_ids = self._create_tags(options["tags"])
+
+        # popular tags & users come first, weigh them on a long tail
+        self.tag_weights = [1 / (rank + 1) for rank in range(len(self.tag_ids))]
+        self.user_weights = [1 / (rank + 1) ** .5 for rank in range(len(self.user_ids))]
+
+        # games are numbered after the existing ones, only new ones are indexed
+        last_id = Game.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        created = 0
+        while created < game_count:
+            size = min(options["batch_size"], game_count - created)
+            with transaction.atomic():
+                self._create_games(size)
+            created += size
+            self.stdout.write(f"seed_data: {created}/{game_count} games")
+
+        self.stdout.write("seed_data: computing search documents & tag counts")
+        while True:
+            batch = list(Game.objects.filter(id__gt=last_id).order_by("id")
+                                     .values_list("id", flat=True)[:options["batch_size"]])
+            if not batch:
+                break
+            last_id = batch[-1]
+            update_search_vectors(Game.objects.filter(id__in=batch))
+        Tag.objects.filter(id__in=self.tag_ids).update(published_count=actual_published_count())
+        search.invalidate_cache()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"seed_data: done, {len(self.user_ids)} users, {len(self.tag_ids)} tags, {game_count} games"))
+
+    def _title(self) -> str:
+        words = [self.random.choice(_ADJECTIVES), self.random.choice(_NOUNS)]
+        if self.random.random() < .3:
+            words.append(self.random.choice(["2", "3", "deluxe", "remastered", "online", "zero"]))
+        return " ".join(words).title()
+
+    def _sentence(self, words: int) -> str:
+        vocabulary = _ADJECTIVES + _NOUNS + _GENRES
+        return " ".join(self.random.choice(vocabulary) for _ in range(words)).capitalize() + "."
+
+    def _create_users(self, count: int) -> list[int]:
+        """
+            Creates users with profiles, in batches
+
+            Returns:
+                ids of the users
+        """
+        start = User.objects.filter(username__startswith=f"{SEED_PREFIX}-").count()
+        user_ids = []
+        for offset in range(0, count, 5000):
+            users = [User(username=f"{SEED_PREFIX}-{self.random.choice(_NOUNS)}{start + i}",
+                          password="!", date_joined=self.now)
+                     for i in range(offset, min(offset + 5000, count))]
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+                Profile.objects.bulk_create([Profile(user=user, display_name=user.username)
+                                             for user in users])
+            user_ids += [user.id for user in users]
+
+        self.stdout.write(f"seed_data: {count} users")
+        return user_ids
+
+    def _create_tags(self, count: int) -> list[int]:
+        """
+            Finds or creates the tags, genres & styles first, then combinations
+
+            Returns:
+                ids of the tags, most popular first
+        """
+        texts = _GENRES + _STYLES
+        combos = [f"{style}-{genre}" for style in _STYLES for genre in _GENRES]
+        self.random.shuffle(combos)
+        texts = (texts + combos)[:count]
+        texts += [f"tag-{i}" for i in range(count - len(texts))]
+
+        existing = dict(Tag.objects.filter(text__in=texts).values_list("text", "id"))
+        Tag.objects.bulk_create([Tag(text=text) for text in texts if text not in existing],
+                                batch_size=5000)
+        existing = dict(Tag.objects.filter(text__in=texts).values_list("text", "id"))
+
+        self.stdout.write(f"seed_data: {len(texts)} tags")
+        return [existing[text] for text in texts]
+
+    def _create_games(self, count: int) -> list[int]:
+        """
+            Creates a batch of games, with their tags, screenshots, reviews & favorites
+
+            Returns:
+                ids of the games
+        """
+        games = []
+        for _ in range(count):
+            created_at = self.now - timedelta(minutes=self.random.randrange(2 * 365 * 24 * 60))
+            games.append(Game(
+                title=self._title(),
+                description=self._sentence(self.random.randint(10, 60)),
+                user_id=self.random.choices(self.user_ids, self.user_weights)[0],
+                is_published=self.random.random() < .85,
+                times_viewed=int(self.random.paretovariate(1.2) * 10),
+                created_at=created_at,
+                updated_at=created_at,
+            ))
+        Game.objects.bulk_create(games)
+
+        # tags, a long tail of popular ones
+        Game.tags.through.objects.bulk_create([
+            Game.tags.through(game_id=game.id, tag_id=tag_id)
+            for game in games
+            for tag_id in set(self.random.choices(self.tag_ids, self.tag_weights, k=self.random.randint(1, 6)))
+        ])
+
+        # screenshots, with files that only exist in the database
+        files, screenshots = [], []
+        for game in games:
+            for order in range(self.random.randint(0, 5)):
+                key = f"{SEED_PREFIX}/games/{game.id}/screenshots/{order}.png"
+                files.append(File(key=key, filename=f"{order}.png", content_type="image/png",
+                                  size=self.random.randint(50_000, 2_000_000), width=1920, height=1080,
+                                  variants=[{"key": variant_key(key, width), "width": width,
+                                             "height": width * 9 // 16, "content_type": VARIANT_CONTENT_TYPE,
+                                             "size": width * 40}
+                                            for width in SCREENSHOT_WIDTHS]))
+                screenshots.append(Screenshot(game_id=game.id, order=order))
+        File.objects.bulk_create(files)
+        for screenshot, file in zip(screenshots, files):
+            screenshot.file_id = file.id
+        Screenshot.objects.bulk_create(screenshots)
+
+        game_ids = [game.id for game in games]
+        Game.objects.filter(id__in=game_ids).update(cover=Subquery(
+            Screenshot.objects.filter(game_id=OuterRef("pk")).order_by("order", "id").values("id")[:1]))
+
+        # reviews, one per user per game, & favorites
+        reviews, favorites = [], []
+        for game in games:
+            if not game.is_published:
+                continue
+            popularity = min(len(self.user_ids), int(game.times_viewed ** .5))
+            for user_id in self.random.sample(self.user_ids, self.random.randint(0, min(popularity, 20))):
+                reviews.append(Review(game_id=game.id, user_id=user_id, rating=self.random.randint(1, 5),
+                                      content=self._sentence(self.random.randint(5, 40)),
+                                      created_on=game.created_at))
+            for user_id in self.random.sample(self.user_ids, self.random.randint(0, min(popularity, 40))):
+                favorites.append(Favorite(game_id=game.id, user_id=user_id))
+        Review.objects.bulk_create(reviews)
+        Favorite.objects.bulk_create(favorites)
+
+        return game_ids
+
+    def _delete(self):
+        """
+            Deletes generated data: the generated users, with their games &
+            everything attached to them, and the generated screenshot files
+        """
+        users = User.objects.filter(username__startswith=f"{SEED_PREFIX}-")
+        deleted = 0
+        while True:
+            batch = list(users.order_by("id").values_list("id", flat=True)[:500])
+            if not batch:
+                break
+            with transaction.atomic():
+                User.objects.filter(id__in=batch).delete()
+            deleted += len(batch)
+            self.stdout.write(f"seed_data: {deleted} users deleted")
+
+        # screenshots were deleted with their games, their files are left
+        files = File.objects.filter(key__startswith=f"{SEED_PREFIX}/")
+        while True:
+            batch = list(files.order_by("id").values_list("id", flat=True)[:5000])
+            if not batch:
+                break
+            File.objects.filter(id__in=batch).delete()
+
+        Tag.objects.update(published_count=actual_published_count())
+        search.invalidate_cache()
+        self.stdout.write(self.style.SUCCESS(f"seed_data: done, {deleted} users deleted"))
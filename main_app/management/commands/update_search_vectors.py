@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from ...models import Game
+from ...models.Game import update_search_vectors
+
+
+class Command(BaseCommand):
+    """
+        Computes the full-text search documents of games, see Game.search_vector.
+        Games are kept up to date as they change, this fills in the games
+        saved before search documents existed, or rebuilds all of them with --all.
+        Games are updated in batches by id, one UPDATE per batch.
+
+        usage: python manage.py update_search_vectors [--all] [--batch-size N]
+    """
+
+    help = "Computes the full-text search documents of games, for SEARCH_BACKEND=fulltext"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true",
+                            help="rebuild every game's document, not only missing ones")
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="number of games to update per query")
+
+    def handle(self, *args, **options):
+        games = Game.objects.all() if options["all"] else Game.objects.filter(search_vector__isnull=True)
+
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(games.filter(id__gt=last_id).order_by("id")
+                              .values_list("id", flat=True)[:options["batch_size"]])
+            if not batch:
+                break
+            last_id = batch[-1]
+
+            updated += update_search_vectors(Game.objects.filter(id__in=batch))
+            self.stdout.write(f"update_search_vectors: {updated} updated")
+
+        self.stdout.write(self.style.SUCCESS(f"update_search_vectors: done, {updated} updated"))
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.3 on 2026-10-18 11:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0018_alter_favorite_game_alter_favorite_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BundleManifest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entries', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='manifest', to='main_app.game')),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.3 on 2026-10-18 11:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0021_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='chunk_size',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='parts',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='upload_id',
+            field=models.CharField(blank=True, default='', max_length=1024),
+        ),
+    ]
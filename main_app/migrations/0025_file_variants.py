@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0024_pendingdeletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='variants',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.3 on 2026-10-18 11:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def number_screenshots(apps, schema_editor):
+    """
+        Orders existing screenshots by upload, and makes each game's first one its cover
+    """
+    Game = apps.get_model("main_app", "Game")
+    Screenshot = apps.get_model("main_app", "Screenshot")
+
+    screenshots = list(Screenshot.objects.order_by("game_id", "created_on", "id"))
+    galleries = {}
+    for screenshot in screenshots:
+        gallery = galleries.setdefault(screenshot.game_id, [])
+        screenshot.order = len(gallery)
+        gallery.append(screenshot.id)
+    Screenshot.objects.bulk_update(screenshots, ["order"], batch_size=1000)
+
+    for game_id, screenshot_ids in galleries.items():
+        Game.objects.filter(id=game_id).update(cover_id=screenshot_ids[0])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0025_file_variants'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='screenshot',
+            options={'ordering': ['order', 'id']},
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='cover',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main_app.screenshot'),
+        ),
+        migrations.AddField(
+            model_name='screenshot',
+            name='order',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='screenshot',
+            index=models.Index(fields=['game', 'order'], name='main_app_sc_game_id_d52899_idx'),
+        ),
+        migrations.RunPython(number_screenshots, migrations.RunPython.noop),
+    ]
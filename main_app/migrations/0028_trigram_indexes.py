@@ -0,0 +1,29 @@
+# Generated by Django 4.2.3 on 2026-10-18 11:23
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0027_game_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='game',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='game_title_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['text'], name='tag_text_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        # fuzzy matching of usernames, auth's User has no index we could declare
+        migrations.RunSQL(
+            "CREATE INDEX auth_user_username_trgm ON auth_user USING gin (username gin_trgm_ops);",
+            "DROP INDEX IF EXISTS auth_user_username_trgm;",
+        ),
+    ]
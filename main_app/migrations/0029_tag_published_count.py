@@ -0,0 +1,40 @@
+# Generated by Django 4.2.3 on 2026-10-18 11:26
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_published(apps, schema_editor):
+    """
+        Counts the published games of existing tags
+    """
+    Game = apps.get_model("main_app", "Game")
+    Tag = apps.get_model("main_app", "Tag")
+
+    counts = (Game.tags.through.objects.filter(tag_id=OuterRef("pk"), game__is_published=True)
+                                       .order_by()
+                                       .values("tag_id")
+                                       .annotate(count=Count("*"))
+                                       .values("count"))
+    Tag.objects.update(published_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0028_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='published_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['-published_count'], name='tag_published_count'),
+        ),
+        migrations.RunPython(count_published, migrations.RunPython.noop),
+    ]
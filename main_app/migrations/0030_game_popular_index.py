@@ -0,0 +1,17 @@
+# Generated by Django 4.2.3 on 2026-10-18 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0029_tag_published_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['times_viewed', 'id'], name='game_popular'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+from django.db import models
+from django.utils import timezone
+
+from .Game import Game
+
+
+class BundleManifest(models.Model):
+    """
+        Content hashes of the files uploaded from a Game's zip bundle.
+        When a new zip is uploaded, it is compared against this manifest so
+        that only changed or added files get uploaded, and removed files
+        get deleted.
+    """
+
+    # ===== fields ============================================================
+
+
+    game = models.OneToOneField(Game, on_delete=models.CASCADE, related_name="manifest")
+    """
+        The Game whose files this manifest describes
+        Relationship: BundleManifest ---- Game
+    """
+
+
+    entries = models.JSONField(default=dict, blank=True)
+    """
+        Maps each file's path inside the bundle to the sha256 hex digest of
+        its contents, e.g. {"index.html": "9f86d0..."}
+    """
+
+
+    updated_at = models.DateTimeField(default=timezone.now)
+    """
+        Last time the bundle was uploaded
+    """
+
+
+    # ===== functions =========================================================
+
+
+    def diff(self, entries: dict[str, str]) -> tuple[list[str], list[str]]:
+        """
+            Compare the manifest against the entries of a new bundle
+
+            Args:
+                entries: path to sha256 digest of every file in the new bundle
+
+            Returns:
+                paths that need uploading (changed or added),
+                and paths that need deleting (no longer in the bundle)
+        """
+        changed = [path for path, digest in entries.items()
+                   if self.entries.get(path) != digest]
+        removed = [path for path in self.entries if path not in entries]
+
+        return changed, removed
+
+
+    def save(self, *args, **kwargs):
+        self.updated_at = timezone.now()
+
+        return super().save(*args, **kwargs)
+
+
+    def __repr__(self) -> str:
+        """human-readable string representation"""
+        return f"for {self.game.title}, {len(self.entries)} files"
+
+
+    def __str__(self) -> str:
+        return self.__repr__()
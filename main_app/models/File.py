@@ -1,19 +1,24 @@
 import typing
 from pathlib import PurePath
 
+from django.conf import settings
 from django.core.files.uploadedfile import UploadedFile
-from django.db import models
-from django.db.models.signals import pre_delete
+from django.db import models, transaction
+from django.db.models.signals import post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 
-from main_app.util.s3 import get_bucket_name, boto3_client, get_base_url, s3_client
+from main_app.util.images import image_dimensions, make_variants, variant_key, VARIANT_CONTENT_TYPE
+from main_app.util.storage import get_storage
+from main_app.util.upload import HashingReader
+from .PendingDeletion import PendingDeletion
 
 
 class File(models.Model):
     """
         This model represents a persistent file.
-        In the case of our app, Amazon S3 is the backend file host.
+        In the case of our app, Amazon S3 is the backend file host by default,
+        see util/storage.py for the others.
     """
 
     # ===== fields ============================================================
@@ -37,6 +42,43 @@ class File(models.Model):
     """
 
 
+    content_type = models.CharField(max_length=128, default="", blank=True)
+    """
+        mime type the file was uploaded with, blank if not known yet
+    """
+
+
+    size = models.BigIntegerField(null=True, blank=True, default=None)
+    """
+        size of the file in bytes, null if not known yet
+    """
+
+
+    sha256 = models.CharField(max_length=64, default="", blank=True)
+    """
+        sha256 hex digest of the file's contents, blank if not known yet
+    """
+
+
+    width = models.IntegerField(null=True, blank=True, default=None)
+    """
+        width in pixels, for images
+    """
+
+
+    height = models.IntegerField(null=True, blank=True, default=None)
+    """
+        height in pixels, for images
+    """
+
+
+    variants = models.JSONField(default=list, blank=True)
+    """
+        resized copies of an image, from narrowest to widest, see util/images.py:
+        [{"key": "...", "width": 320, "height": 240, "content_type": "image/webp", "size": 1234}, ...]
+    """
+
+
     # ===== functions =========================================================
 
 
@@ -54,85 +96,188 @@ class File(models.Model):
         """
             Constructs and gets the visitable url
         """
-        return f"{get_base_url()}{get_bucket_name()}/{self.key}"
+        return get_storage().url(self.key)
+
+    def srcset(self) -> str:
+        """
+            The resized copies of an image, for an <img> or <source> srcset attribute,
+            e.g. "https://.../shot.png.320w.webp 320w, https://.../shot.png.640w.webp 640w"
+        """
+        storage = get_storage()
+        return ", ".join(f"{storage.url(variant['key'])} {variant['width']}w"
+                         for variant in self.variants)
+
+    def variant_keys(self) -> list[str]:
+        return [variant["key"] for variant in self.variants]
 
     def mime_type(self):
         """
-            Checks s3 for file's mimetype
-            If used multiple times, best if cached
+            Gets the file's mimetype, recorded when it was uploaded.
+            Files uploaded before it was recorded check storage once, and keep the result.
         """
-        s3 = s3_client()
-        header = s3.head_object(Bucket=get_bucket_name(), Key=self.key)
-        return header["ContentType"]
+        if not self.content_type:
+            info = get_storage().head(self.key)
+            if info is None:
+                return "application/octet-stream"
+
+            self.content_type = info.content_type
+            self.size = info.size
+            if self.pk:
+                self.save(update_fields=["content_type", "size"])
+
+        return self.content_type
 
 
     class helpers:
         @staticmethod
-        def s3_upload(uploaded_file: typing.IO[bytes], key: str,
-                      bucket: str = get_bucket_name(), content_type="") -> None:
+        def upload(uploaded_file: typing.IO[bytes], key: str, content_type="",
+                   content_encoding="", cache_control="") -> None:
             """
-                Upload a file on Amazon S3, but do not return a File model object.
+                Upload a file to storage, but do not return a File model object.
                 Memory/file management is left to the user.
                 Please make sure to call delete when the object is no longer
                 needed and referencable.
 
                 Args:
-                    uploaded_file: file to upload to s3
+                    uploaded_file: file to upload
                     key: key to upload the file to, must be unique, indicates filepath:
                         e.g. "user/1/games/image.png"
-                    bucket: bucket to upload the file to, defaults to the main bucket set in the .env
                     content_type: manually set the content mime type, otherwise, it automatically sets
                         this value from its file extension; if none: "application/octet-stream"
+                    content_encoding: e.g. "gzip", if the file is compressed
+                    cache_control: e.g. IMMUTABLE_CACHE_CONTROL, for keys whose contents never change
 
             """
-            s3 = boto3_client("s3")
-
             if content_type == "":
                 content_type = derive_mime_type_from_ext(PurePath(uploaded_file.name).suffix)
 
-            s3.upload_fileobj(uploaded_file, bucket, key, ExtraArgs={"ContentType": content_type})
+            get_storage().upload(uploaded_file, key, content_type=content_type,
+                                 content_encoding=content_encoding, cache_control=cache_control)
 
 
         @staticmethod
-        def s3_delete(key: str, bucket=get_bucket_name()):
+        def delete(key: str):
             """
-                Delete a file on Amazon S3
+                Delete a file from storage
             """
             if not key: return
 
-            s3 = boto3_client("s3")
-
-            s3.delete_object(Bucket=bucket, Key=key)
+            get_storage().delete(key)
 
 
         @staticmethod
         def create_and_upload(uploaded_file: typing.BinaryIO, key: str,
-                              content_type="", bucket=get_bucket_name()) -> "File":
+                              content_type="", variant_widths: typing.Iterable[int] = (),
+                              square_variants=False, cache_control="") -> "File":
+            """
+                Uploads a file to storage, returning its file model object.
+                The file's content type, size, hash and image dimensions are
+                recorded on the model, so they can be read without asking storage.
+                See upload_unsaved for the arguments.
+                Returns:
+                    created File object
             """
-                Uploads a file on Amazon S3, returning its file model object
+            file = File.helpers.upload_unsaved(uploaded_file, key, content_type=content_type,
+                                               variant_widths=variant_widths,
+                                               square_variants=square_variants,
+                                               cache_control=cache_control)
+            file.save()
+            return file
+
+
+        @staticmethod
+        def upload_unsaved(uploaded_file: typing.BinaryIO, key: str,
+                           content_type="", variant_widths: typing.Iterable[int] = (),
+                           square_variants=False, cache_control="") -> "File":
+            """
+                Uploads a file to storage, returning its file model object
+                without saving it. Doesn't touch the database, so it can run on
+                a worker thread, and many files can be saved with one bulk_create.
                 Args:
                     uploaded_file: the file to upload, retrieved from `request.FILES`
-                    bucket: the bucket to upload to
                     key: the path to append to the base_url to upload the file to.
                         e.g. "users/1/games/17/screenshots/xyz_my_file.png"
                     content_type: adds specific mime type; left blank, it will be derived
                         from the file's extension
+                    variant_widths: for images, also upload resized copies this wide,
+                        see File.variants
+                    square_variants: crop the copies to squares, e.g. for avatars
+                    cache_control: Cache-Control of the file & its copies
                 Returns:
-                    created File object
+                    unsaved File object
             """
-            File.helpers.s3_upload(uploaded_file, key, bucket=bucket,
-                                    content_type=content_type)
+            if content_type == "":
+                content_type = derive_mime_type_from_ext(PurePath(uploaded_file.name).suffix)
 
-            return File.objects.create(key=key, filename=uploaded_file.name)
+            dimensions = None
+            if content_type.startswith("image/"):
+                dimensions = image_dimensions(uploaded_file)
 
+            # hash & measure the file as it is uploaded
+            reader = HashingReader(uploaded_file)
+            File.helpers.upload(reader, key, content_type=content_type, cache_control=cache_control)
 
+            variants = []
+            if dimensions and variant_widths:
+                uploaded_file.seek(0)
+                variants = File.helpers.upload_variants(uploaded_file, key, variant_widths,
+                                                        square=square_variants,
+                                                        cache_control=cache_control)
 
-@receiver(pre_delete, sender=File)
+            width, height = dimensions or (None, None)
+            return File(key=key, filename=uploaded_file.name,
+                        content_type=content_type, size=reader.size,
+                        sha256=reader.hexdigest(), width=width, height=height,
+                        variants=variants)
+
+
+        @staticmethod
+        def upload_variants(image_file: typing.BinaryIO, key: str, widths: typing.Iterable[int],
+                            square=False, cache_control="") -> list[dict]:
+            """
+                Uploads resized copies of an image next to it, see File.variants.
+                Failing to make them is not an error, the original is used instead.
+                Args:
+                    image_file: the original image
+                    key: key of the original, the copies' keys are derived from it:
+                        e.g. "users/1/games/17/screenshots/xyz_my_file.png.320w.webp"
+                    widths: widths in pixels to make copies at, if the image is wider
+                    square: crop the copies to squares, made at every width
+                    cache_control: Cache-Control of the copies
+                Returns:
+                    the uploaded copies, to store in File.variants
+            """
+            variants = []
+            for variant in make_variants(image_file, widths, square=square):
+                with variant.file:
+                    copy_key = variant_key(key, variant.width)
+                    reader = HashingReader(variant.file)
+                    File.helpers.upload(reader, copy_key, content_type=VARIANT_CONTENT_TYPE,
+                                        cache_control=cache_control)
+
+                variants.append({"key": copy_key, "width": variant.width, "height": variant.height,
+                                 "content_type": VARIANT_CONTENT_TYPE, "size": reader.size})
+            return variants
+
+
+
+@receiver(post_delete, sender=File)
 def _delete_file(sender, instance: File, **kwargs):
     """
-        This callback deletes the file from Amazon S3 right before its File Model gets destroyed
+        This callback queues the file's deletion from storage when its File Model gets destroyed.
+        The queue row is part of the same transaction as the delete, workers
+        then delete queued files in batches, see main_app/jobs.py flush_deletions.
     """
-    File.helpers.s3_delete(get_bucket_name(), instance.key)
+    if not instance.key:
+        return
+
+    PendingDeletion.objects.bulk_create([PendingDeletion(key=key)
+                                         for key in [instance.key] + instance.variant_keys()])
+
+    if settings.JOBS_EAGER:
+        # no worker running, delete once the transaction has committed
+        from main_app.jobs import flush_deletions
+        transaction.on_commit(flush_deletions)
 
 
 def derive_mime_type_from_ext(ext: str) -> str:
@@ -257,6 +402,8 @@ def derive_mime_type_from_ext(ext: str) -> str:
             content_type = "font/ttf"
         case ".txt":  # plain text (generally ASCII or ISO 8859-n)
             content_type = "text/plain"
+        case ".wasm": # WebAssembly module, must be exact for streaming compilation
+            content_type = "application/wasm"
         case ".vsd":  # Microsoft VISIO
             content_type = "application/vnd.visio"
         case ".wav":  # waveform audio format (RIFF)
@@ -1,9 +1,24 @@
 from django.contrib.auth.models import User
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from django.db.models import OuterRef, Subquery
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
 from django.utils import timezone
 
-from .Tag import Tag
-from ..util.s3 import get_base_url, get_bucket_name
+from .Tag import Tag, change_published_counts
+from ..util.storage import get_storage
+
+# Text search configuration game search documents & queries are parsed with
+SEARCH_CONFIG = "english"
+
+# Fields of a game that are part of its search document, besides its tags
+_DOCUMENT_FIELDS = {"title", "description", "user_id"}
+
+# Fields of a game that change which searches find it
+_SEARCHED_FIELDS = ("title", "description", "user_id", "is_published")
 
 
 class Game(models.Model):
@@ -11,6 +26,29 @@ class Game(models.Model):
         A model representing user-uploaded games
     """
 
+    class Status(models.TextChoices):
+        PROCESSING = "processing"
+        READY = "ready"
+        FAILED = "failed"
+
+
+    # ===== metadata ==========================================================
+
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"]),
+            GinIndex(fields=["title"], name="game_title_trgm", opclasses=["gin_trgm_ops"]),
+            models.Index(fields=["times_viewed", "id"], condition=models.Q(is_published=True),
+                         name="game_popular"),
+        ]
+        """
+            Full-text search over search_vector, and fuzzy matching of titles,
+            see main_app/search.py. Pages of popular games, read backwards from
+            a cursor, see main_app/listings.py
+        """
+
+
     # ===== fields ============================================================
 
     title = models.CharField(max_length=128, default="")
@@ -44,6 +82,13 @@ class Game(models.Model):
     """
 
 
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.READY)
+    """
+        state of the game's uploaded files: "processing" while a background job
+        is ingesting a new bundle, "failed" if the last bundle could not be ingested
+    """
+
+
     frame_width = models.IntegerField(default=640)
     """
         width of the iframe, a value of -1 will use the entire view width
@@ -66,6 +111,24 @@ class Game(models.Model):
     """
 
 
+    cover = models.ForeignKey("Screenshot", on_delete=models.SET_NULL, null=True, blank=True,
+                              related_name="+")
+    """
+        screenshot shown for the game in listings, one of its gallery's.
+        Listings load it with select_related("cover__file"), no query per game.
+        Relationship: Game ---- Screenshot
+    """
+
+
+    search_vector = SearchVectorField(null=True, editable=False)
+    """
+        full-text search document, weighted by significance:
+        tags (A), title (B), creator's username (C), description (D).
+        Kept up to date on save and when tags change, see update_search_vectors.
+        Null for games saved before it existed, until `manage.py update_search_vectors` runs.
+    """
+
+
     created_at = models.DateTimeField(default=timezone.now)
 
 
@@ -75,12 +138,47 @@ class Game(models.Model):
     # ===== functions =========================================================
 
     def url(self):
-        return f"{get_base_url()}{get_bucket_name()}/user/{self.user_id}/games/{self.id}/files/index.html"
+        return get_storage().url(f"user/{self.user_id}/games/{self.id}/files/index.html")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        game = super().from_db(db, field_names, values)
+        game._searched = game._searched_values()
+        return game
 
-    def save(self):
+    def _searched_values(self) -> dict:
+        """values of the searched fields, to tell if searches need updating"""
+        return {field: self.__dict__.get(field) for field in _SEARCHED_FIELDS}
+
+    def searched_fields_changed(self) -> set[str]:
+        """
+            searched fields changed since the game was loaded or last saved,
+            all of them for a new game
+        """
+        searched = getattr(self, "_searched", None)
+        if searched is None:
+            return set(_SEARCHED_FIELDS)
+
+        return {field for field, value in self._searched_values().items() if searched[field] != value}
+
+    def save(self, *args, **kwargs):
         self.updated_at = timezone.now()
 
-        return super().save()
+        # kept for post_save receivers, e.g. the search cache's
+        self.search_changed = self.searched_fields_changed()
+        adding = self._state.adding
+        result = super().save(*args, **kwargs)
+
+        if self.search_changed & _DOCUMENT_FIELDS:
+            update_search_vectors(Game.objects.filter(id=self.id))
+
+        # a new game has no tags yet, they are counted as they are added
+        if "is_published" in self.search_changed and not adding:
+            change_published_counts(self.tags.values_list("id", flat=True),
+                                    1 if self.is_published else -1)
+        self._searched = self._searched_values()
+
+        return result
 
     def __repr__(self) -> str:
         """human-readable string representation"""
@@ -88,3 +186,88 @@ class Game(models.Model):
 
     def __str__(self) -> str:
         return self.__repr__()
+
+
+def search_document() -> SearchVector:
+    """
+        Expression computing a game's search document in the database, from
+        its own fields, its tags and its creator, see Game.search_vector
+    """
+    tags = (Game.tags.through.objects.filter(game_id=OuterRef("pk"))
+                                     .values("game_id")
+                                     .annotate(text=StringAgg("tag__text", " "))
+                                     .values("text"))
+    username = User.objects.filter(id=OuterRef("user_id")).values("username")
+
+    return (SearchVector(Subquery(tags), weight="A", config=SEARCH_CONFIG)
+            + SearchVector("title", weight="B", config=SEARCH_CONFIG)
+            + SearchVector(Subquery(username), weight="C", config=SEARCH_CONFIG)
+            + SearchVector("description", weight="D", config=SEARCH_CONFIG))
+
+
+def update_search_vectors(games: models.QuerySet) -> int:
+    """
+        Recomputes the search documents of games, in one UPDATE
+
+        Returns:
+            number of games updated
+    """
+    return games.update(search_vector=search_document())
+
+
+@receiver(m2m_changed, sender=Game.tags.through)
+def _tags_changed(sender, instance, action: str, reverse: bool, pk_set: set | None, **kwargs):
+    """
+        Updates the search documents of games whose tags were added or removed,
+        and the published counts of the tags
+    """
+    sign = -1 if action in ("post_remove", "post_clear") else 1
+
+    if not reverse:
+        # game.tags.add(...): one game changed
+        if action == "pre_clear" and instance.is_published:
+            instance._cleared_tag_ids = list(instance.tags.values_list("id", flat=True))
+        elif action in ("post_add", "post_remove", "post_clear"):
+            update_search_vectors(Game.objects.filter(id=instance.id))
+            if instance.is_published:
+                tag_ids = getattr(instance, "_cleared_tag_ids", []) if action == "post_clear" else pk_set
+                change_published_counts(tag_ids, sign)
+        return
+
+    # tag.game_set.add(...): the games in pk_set changed, or all of the tag's on clear
+    if action == "pre_clear":
+        instance._cleared_game_ids = list(instance.game_set.values_list("id", flat=True))
+    elif action in ("post_add", "post_remove", "post_clear"):
+        game_ids = getattr(instance, "_cleared_game_ids", []) if action == "post_clear" else pk_set
+        update_search_vectors(Game.objects.filter(id__in=game_ids))
+        change_published_counts([instance.id],
+                                sign * Game.objects.filter(id__in=game_ids, is_published=True).count())
+
+
+@receiver(pre_delete, sender=Game)
+def _game_deleting(sender, instance: Game, **kwargs):
+    """
+        Uncounts a published game from its tags, its tag links are deleted without m2m_changed
+    """
+    if instance.is_published:
+        change_published_counts(instance.tags.values_list("id", flat=True), -1)
+
+
+@receiver(post_save, sender=Tag)
+def _tag_saved(sender, instance: Tag, created: bool, **kwargs):
+    """
+        Updates the search documents of a renamed tag's games
+    """
+    if not created:
+        update_search_vectors(Game.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=User)
+def _user_saved(sender, instance: User, created: bool, update_fields=None, **kwargs):
+    """
+        Updates the search documents of a user's games when their username may have changed
+    """
+    if created or (update_fields is not None and "username" not in update_fields):
+        return
+
+    update_search_vectors(Game.objects.filter(user=instance))
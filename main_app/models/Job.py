@@ -0,0 +1,98 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """
+        A unit of background work, e.g. processing an uploaded game bundle.
+        Jobs are stored in the database and run by `manage.py runworker`.
+        See main_app/jobs.py for enqueueing jobs and the available kinds.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued"
+        RUNNING = "running"
+        DONE = "done"
+        FAILED = "failed"
+
+
+    # ===== metadata ==========================================================
+
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_after"]),
+        ]
+        """
+            workers look up the next queued job that is due
+        """
+
+
+    # ===== fields ============================================================
+
+
+    kind = models.CharField(max_length=64)
+    """
+        name of the handler that runs this job, e.g. "process_bundle"
+    """
+
+
+    payload = models.JSONField(default=dict, blank=True)
+    """
+        keyword arguments passed to the handler
+    """
+
+
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.QUEUED)
+
+
+    attempts = models.IntegerField(default=0)
+    """
+        number of times a worker has started this job
+    """
+
+
+    max_attempts = models.IntegerField(default=3)
+    """
+        the job fails for good once it has been attempted this many times
+    """
+
+
+    error = models.TextField(default="", blank=True)
+    """
+        error from the last failed attempt
+    """
+
+
+    run_after = models.DateTimeField(default=timezone.now)
+    """
+        the job will not be picked up before this time, used to back off retries
+    """
+
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+
+    updated_at = models.DateTimeField(default=timezone.now)
+    """
+        last time the job changed status, used to detect jobs left running
+        by a worker that died
+    """
+
+
+    # ===== functions =========================================================
+
+
+    def save(self, *args, **kwargs):
+        self.updated_at = timezone.now()
+
+        return super().save(*args, **kwargs)
+
+
+    def __repr__(self) -> str:
+        """human-readable string representation"""
+        return f"{self.kind} #{self.id} ({self.status})"
+
+
+    def __str__(self) -> str:
+        return self.__repr__()
@@ -0,0 +1,66 @@
+from django.db import models
+from django.utils import timezone
+
+
+class PendingDeletion(models.Model):
+    """
+        A file in storage waiting to be deleted.
+        Rows are written in the same database transaction that deletes the
+        File model they belonged to, so a rolled back request never deletes
+        a file it still references, and a committed one always gets its file
+        deleted. Workers delete them from storage in batches, see
+        main_app/jobs.py flush_deletions.
+    """
+
+    # ===== metadata ==========================================================
+
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["run_after", "id"]),
+        ]
+        """
+            workers look up the oldest deletions that are due
+        """
+
+
+    # ===== fields ============================================================
+
+
+    key = models.CharField(max_length=1024)
+    """
+        key of the file in storage
+    """
+
+
+    attempts = models.IntegerField(default=0)
+    """
+        number of times deleting the file failed
+    """
+
+
+    error = models.TextField(default="", blank=True)
+    """
+        error from the last failed attempt
+    """
+
+
+    run_after = models.DateTimeField(default=timezone.now)
+    """
+        the deletion will not be attempted before this time, used to back off retries
+    """
+
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+
+    # ===== functions =========================================================
+
+
+    def __repr__(self) -> str:
+        """human-readable string representation"""
+        return f"{self.key} ({self.attempts} failed attempts)"
+
+
+    def __str__(self) -> str:
+        return self.__repr__()
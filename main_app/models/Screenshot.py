@@ -15,11 +15,11 @@ class Screenshot(models.Model):
 
 
     class Meta:
-        ordering = ["created_on"]
+        ordering = ["order", "id"]
         """
-            Order by date created.
-            Icebox feature: allow user to choose the Screenshot ordering 
+            Order chosen by the game's creator, then by upload
         """
+        indexes = [models.Index(fields=["game", "order"])]
 
 
     # ===== fields ============================================================
@@ -44,6 +44,13 @@ class Screenshot(models.Model):
     """
 
 
+    order = models.PositiveIntegerField(default=0)
+    """
+        position of the screenshot in its game's gallery, lowest first.
+        Reordering only rewrites this column, the files stay where they are.
+    """
+
+
     created_on = models.DateTimeField(default=timezone.now)
 
 
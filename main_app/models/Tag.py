@@ -1,16 +1,49 @@
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+
+published_counts_changed = Signal()
+"""
+    Sent after the published_count of tags changed, with the ids of the tags
+    in `tag_ids`. Sent inside the transaction making the change.
+"""
+
 
 class Tag(models.Model):
     """
         Hashtag for searching for games
     """
 
+    # ===== metadata ==========================================================
+
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["text"], name="tag_text_trgm", opclasses=["gin_trgm_ops"]),
+            models.Index(fields=["-published_count"], name="tag_published_count"),
+        ]
+        """
+            Fuzzy matching of tags, see main_app/search.py, and most-used tags first
+        """
+
+
     # ===== fields ============================================================
 
 
     text = models.CharField(64)
 
 
+    published_count = models.IntegerField(default=0)
+    """
+        number of published games with this tag. Kept up to date as tags are
+        added to & removed from games and games are published, unpublished
+        or deleted, see the receivers in Game.py.
+        `manage.py repair_tag_counts` recomputes it, if it ever drifts.
+    """
+
+
     # ===== functions =========================================================
 
 
@@ -19,3 +52,27 @@ class Tag(models.Model):
 
     def __str__(self):
         return self.__repr__()
+
+
+def change_published_counts(tag_ids: list[int], delta: int):
+    """
+        Adds to the published_count of tags, in one UPDATE
+    """
+    tag_ids = list(tag_ids)
+    if not tag_ids or not delta:
+        return
+
+    Tag.objects.filter(id__in=tag_ids).update(published_count=F("published_count") + delta)
+    published_counts_changed.send(sender=Tag, tag_ids=tag_ids)
+
+
+def actual_published_count():
+    """
+        Expression counting the published games of a tag, from the tags join table
+    """
+    counts = (Tag.game_set.through.objects.filter(tag_id=OuterRef("pk"), game__is_published=True)
+                                          .order_by()
+                                          .values("tag_id")
+                                          .annotate(count=Count("*"))
+                                          .values("count"))
+    return Coalesce(Subquery(counts), 0)
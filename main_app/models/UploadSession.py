@@ -0,0 +1,156 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import models, transaction
+from django.utils import timezone
+
+from .Game import Game
+from .PendingDeletion import PendingDeletion
+from ..util.storage import get_storage
+
+# Age after which a session that was never used is discarded, with its
+# unfinished upload & staged file, see jobs.expire_upload_sessions
+EXPIRES_AFTER = timedelta(days=1)
+
+
+class UploadSession(models.Model):
+    """
+        A file the browser uploads straight to s3, instead of through our server.
+        The browser asks for a session, uploads to the presigned target it
+        gets back, then marks the session complete. Once the file has landed
+        and the session belongs to a game, a job is queued to process it.
+
+        Large files can be uploaded in chunks through our server instead,
+        which are assembled in an s3 multipart upload. A dropped connection
+        only loses the chunk in flight, see views/api/uploads.py.
+    """
+
+    class Kind(models.TextChoices):
+        BUNDLE = "bundle"
+        SCREENSHOT = "screenshot"
+
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        ASSEMBLING = "assembling"
+        UPLOADED = "uploaded"
+        QUEUED = "queued"
+
+
+    # ===== fields ============================================================
+
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    """
+        User doing the upload, only they can complete or use the session
+    """
+
+
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, null=True, blank=True, default=None)
+    """
+        Game the file is for. Not known yet while a new game's form is being
+        filled out, in that case it is set when the form is submitted.
+    """
+
+
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+    """
+        What the file is, decides which job processes it
+    """
+
+
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+
+
+    key = models.CharField(max_length=256)
+    """
+        Staging key the file is uploaded to, deleted by the job once processed
+    """
+
+
+    filename = models.CharField(max_length=256, default="")
+    """
+        Name of the file on the user's computer
+    """
+
+
+    size = models.BigIntegerField(default=0)
+    """
+        Size of the uploaded file in bytes, known once uploaded.
+        For chunked uploads, the size announced when the session started.
+    """
+
+
+    upload_id = models.CharField(max_length=1024, default="", blank=True)
+    """
+        Id of the s3 multipart upload the chunks are assembled in.
+        Blank for sessions uploaded in one go with a presigned POST.
+    """
+
+
+    chunk_size = models.IntegerField(default=0)
+    """
+        Size in bytes of every chunk of a chunked upload, except the last one
+    """
+
+
+    parts = models.JSONField(default=dict, blank=True)
+    """
+        Chunks received so far in a chunked upload, by chunk index:
+        {"0": {"etag": "...", "sha256": "..."}, ...}
+    """
+
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+
+    # ===== functions =========================================================
+
+
+    @property
+    def is_chunked(self) -> bool:
+        return bool(self.upload_id)
+
+
+    @property
+    def chunk_count(self) -> int:
+        """Number of chunks the file is split into"""
+        if not self.chunk_size:
+            return 0
+        return max(1, -(-self.size // self.chunk_size))
+
+
+    def expected_chunk_size(self, index: int) -> int:
+        """Size in bytes the chunk at index must have, only the last one may be shorter"""
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+
+    def discard(self):
+        """
+            Deletes the session with what was uploaded for it: an unfinished
+            multipart upload is aborted, so its parts stop taking up space, and
+            the staged file is queued for deletion.
+            Not for queued sessions, their file belongs to the job processing it.
+        """
+        if self.status == self.Status.QUEUED:
+            raise ValueError(f"upload session {self.id} is queued for processing")
+
+        if self.is_chunked and self.status in (self.Status.PENDING, self.Status.ASSEMBLING):
+            get_storage().abort_multipart_upload(self.key, self.upload_id)
+
+        PendingDeletion.objects.create(key=self.key)
+        self.delete()
+
+        if settings.JOBS_EAGER:
+            # no worker running, delete once the transaction has committed
+            from main_app.jobs import flush_deletions
+            transaction.on_commit(flush_deletions)
+
+
+    def __repr__(self) -> str:
+        """human-readable string representation"""
+        return f"{self.kind} {self.filename} by {self.user.username} ({self.status})"
+
+
+    def __str__(self) -> str:
+        return self.__repr__()
@@ -1,14 +1,18 @@
 """
     Import all models in this package to make them visible via main_app.models
 """
+from .BundleManifest import BundleManifest
 from .Devlog import Devlog
 from .Favorite import Favorite
 from .File import File
 from .Game import Game
+from .Job import Job
+from .PendingDeletion import PendingDeletion
 from .Profile import Profile
 from .Review import Review
 from .Screenshot import Screenshot
 from .Tag import Tag
+from .UploadSession import UploadSession
 from django.contrib.auth.models import User
 
 from . import helpers
@@ -1,10 +1,23 @@
+import hashlib
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import PurePath
+from zipfile import BadZipFile
 
+from django.conf import settings
 from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.db.models import Max
 from django.utils.text import slugify
 
-from . import File, Screenshot, Game
+from . import BundleManifest, File, Screenshot, Game
+from .File import derive_mime_type_from_ext
+from ..util.compress import available_encodings, precompressed_encoding
+from ..util.images import AVATAR_SIZES, SCREENSHOT_WIDTHS, image_dimensions
+from ..util.storage import IMMUTABLE_CACHE_CONTROL, get_storage
+from ..util.upload import BatchUploader, HashingReader
+from ..util.zip import BgsZipfile
 
 def get_fileext(uploaded_file: UploadedFile) -> str:
     if uploaded_file.name:
@@ -35,92 +48,328 @@ def gen_filename(filename: str, prepend_hash=6) -> str:
     return filename
 
 
-#
-# TODO: VVV All code below needs to be refactored to allow multiple screenshot files & reordering VVV
-#
+def _hash_bundle(zip_file: BgsZipfile) -> dict[str, str]:
+    """
+        Computes the sha256 of every file in an open zip, one file at a time
 
-def create_screenshot(uploaded_file: UploadedFile, game_id: int) -> Screenshot | None:
+        Raises:
+            zipfile.BadZipFile: a file failed its CRC check
     """
-        Helper function to create a Screenshot from a file
-        Url will be "user/<int:user_id>/games/<int:game_id>/screenshots/<6-char hash><filename><ext>"
-        Args:
-            uploaded_file: the file to upload, retrieved from `request.FILES`
-            game_id: the game this screenshot is for
+    entries = {}
+    for info, member in zip(zip_file.files, zip_file.stream()):
+        reader = HashingReader(member)
+        while reader.read(64 * 1024):
+            pass
+        entries[str(BgsZipfile.member_path(info))] = reader.hexdigest()
+
+    return entries
+
+
+def _precompress_encoding() -> str:
+    """
+        Content-Encoding to precompress game files with, from the settings.
+        Blank if disabled.
+    """
+    encoding = settings.BUNDLE_PRECOMPRESS
+    if encoding in ("", "off"):
+        return ""
+
+    if encoding not in available_encodings():
+        print(f"upload_game_bundle: {encoding} precompression unavailable, using gzip")
+        return "gzip"
+
+    return encoding
+
+
+def upload_game_bundle(zip_upload: UploadedFile, game: Game) -> bool:
+    """
+        Uploads the files in a game's zip bundle to storage, along with the zip itself.
+        If None, do nothing.
+
+        Files are uploaded concurrently, straight out of the zip. Files that
+        compress well are precompressed, see BUNDLE_PRECOMPRESS in the settings.
+        If the game was uploaded before, only files whose contents changed or that were
+        added get uploaded, and files no longer in the zip get deleted.
+        If any file fails to upload, the rest are skipped and new files uploaded so far are
+        removed again. Files that replaced ones of the previous upload are kept, rather than
+        deleting the live game's files: the game is left part old, part new, and the manifest
+        records which, so the next upload sends only what is still out of date.
+
+        location of files: base_url + "user/<user_id>/games/<game_id>/files/"
+
         Returns:
-            Created Screenshot object on success, or None if game_id is invalid, or no filename
-            retrieved from the `uploaded_file`
+            False if the zip could not be opened or any file failed to upload
     """
 
-    # get game to find user_id
-    game = Game.objects.get(id=game_id)
-    if not game:
-        return None  # not a valid game
+    if not zip_upload:
+        return True
+
+    # open zip
+    zip_file = BgsZipfile()
+    if not zip_file.open(zip_upload):
+        return False
 
-    user_id = game.user_id
+    # folder key in storage to upload to
+    folder = f"user/{game.user_id}/games/{game.id}/"
 
-    # get filename
-    filename = gen_filename(uploaded_file.name)
-    if not filename:
-        return None  # not a valid filename
+    manifest, _ = BundleManifest.objects.get_or_create(game=game)
+
+    try:
+        # compare against the last upload, if there was one
+        if manifest.entries:
+            entries = _hash_bundle(zip_file)
+            changed, removed = manifest.diff(entries)
+        else:
+            entries = None
+            changed, removed = None, []
+
+        # files of the live game, which a failed upload must not delete
+        storage = get_storage()
+        existing_keys = {obj.key for obj in storage.list_objects(folder + "files/")}
+
+        # upload changed files
+        uploader = BatchUploader(storage=storage, precompress=_precompress_encoding(),
+                                 existing_keys=existing_keys)
+        for info in zip_file.files:
+            path = str(BgsZipfile.member_path(info))
+            if changed is not None and path not in changed:
+                continue
+
+            # files compressed before zipping, e.g. "game.wasm.br", keep their
+            # compression and get the content type of what's inside
+            encoding, type_path = precompressed_encoding(path) or ("", path)
+
+            uploader.submit(folder + "files/" + path,
+                            partial(zip_file.open_member, info),
+                            derive_mime_type_from_ext(PurePath(type_path).suffix),
+                            content_encoding=encoding)
+        result = uploader.wait()
+
+    except BadZipFile as e:
+        print(f"upload_game_bundle error: bad file in zip for game: {game.title}", e)
+        return False
+
+    finally:
+        zip_file.close()
+
+    if not result.ok:
+        print(f"upload_game_bundle error: failed to upload files for game: {game.title}, {result}")
+        for key, error in result.failed.items():
+            print(f"    {key}:", error)
+        for key, error in result.errors.items():
+            print(f"    {key}: failed to roll back:", error)
+
+        # files that were overwritten have their new contents, the others
+        # kept their old ones, record which so the manifest matches storage
+        if manifest.entries and result.overwritten:
+            for key in result.overwritten:
+                manifest.entries[key[len(folder + "files/"):]] = result.hashes[key]
+            manifest.save()
+        return False
+
+    if entries is None:
+        entries = {key[len(folder + "files/"):]: digest
+                   for key, digest in result.hashes.items()}
+
+    # clean up files that are no longer in the bundle
+    if removed:
+        errors = storage.delete_many([folder + "files/" + path for path in removed])
+        if errors:
+            print(f"upload_game_bundle error: failed to delete removed files for game: {game.title}", errors)
+
+    manifest.entries = entries
+    manifest.save()
+
+    zip_upload.seek(0)
+    File.helpers.upload(zip_upload, folder + "/compressed.zip")
+
+    return True
+
+
+def stage_upload(uploaded_file: UploadedFile, user_id: int) -> str:
+    """
+        Uploads a file to a temporary key in storage, for a background job to pick up.
+        The job is responsible for deleting it when done.
+
+        Url will be "user/<int:user_id>/uploads/<32-char hash><ext>"
+        Returns:
+            the key the file was uploaded to
+    """
+    key = f"user/{user_id}/uploads/{uuid.uuid4().hex}{PurePath(uploaded_file.name).suffix}"
+    File.helpers.upload(uploaded_file, key)
+
+    return key
+
+
+def create_avatar(uploaded_file: UploadedFile, user_id: int) -> File | None:
+    """
+        Uploads a profile picture, with square copies in the standard avatar
+        sizes, see AVATAR_SIZES.
+        The key contains a hash of the picture, so it changes whenever the
+        picture does, and the files are served to be cached forever.
+
+        Url will be "user/<int:user_id>/profile/avatar-<16-char hash><ext>"
+        Returns:
+            the avatar's File, or None if the upload is not an image
+    """
+    if image_dimensions(uploaded_file) is None:
+        return None
 
-    # get folder
-    folder = "user/" + str(user_id) + "/games/" + str(game_id) + "/screenshots/"
+    # hash first, the hash is part of the key
+    sha256 = hashlib.sha256()
+    uploaded_file.seek(0)
+    while data := uploaded_file.read(1024 * 1024):
+        sha256.update(data)
+    uploaded_file.seek(0)
 
-    # create file
-    file = File.helpers.create_and_upload(uploaded_file, folder + filename)
+    ext = PurePath(uploaded_file.name).suffix.lower()
+    key = f"user/{user_id}/profile/avatar-{sha256.hexdigest()[:16]}{ext}"
 
-    # attach file to new screenshot
-    return Screenshot.objects.create(file=file, game_id=game_id)
+    return File.helpers.create_and_upload(uploaded_file, key, variant_widths=AVATAR_SIZES,
+                                          square_variants=True,
+                                          cache_control=IMMUTABLE_CACHE_CONTROL)
 
 
-def update_screenshot(screenshot_id: int, uploaded_file: UploadedFile):
-    screenshot = Screenshot.objects.get(id=screenshot_id)
+# Number of screenshots of a gallery uploaded at the same time
+SCREENSHOT_UPLOAD_WORKERS = 4
 
-    if not screenshot:
-        print("updated_screenshot error: invalid screenshot_id")
-        return False  # not a valid screenshot
 
-    # get folder
-    folder = ("user/" + str(screenshot.game.user_id) + "/games/" +
-              str(screenshot.game_id) + "/screenshots/")
+def _upload_screenshot_file(uploaded_file: UploadedFile, folder: str) -> File:
+    """
+        Uploads one screenshot & its resized copies, runs on a worker thread
 
-    # get filename
+        Returns:
+            the screenshot's File, not saved yet
+    """
     filename = gen_filename(uploaded_file.name)
     if not filename:
-        print("update_screenshot error: failed to get name from uploaded file")
-        return False  # not a valid filename
-
-    # create file
-    file = File.helpers.create_and_upload(uploaded_file, folder + filename)
-    if not file:
-        print("update_screenshot error: File failed to create")
-        return False  # file failed to create
-
-    # done -- replace file & commit
-    screenshot.file.delete()
-    screenshot.file = file
-    screenshot.save()
+        raise ValueError("no name for uploaded file")
+
+    return File.helpers.upload_unsaved(uploaded_file, folder + filename,
+                                       variant_widths=SCREENSHOT_WIDTHS)
+
+
+def add_screenshots(uploaded_files: list[UploadedFile], game: Game) -> list[Screenshot]:
+    """
+        Adds screenshots to the end of a game's gallery. The files are uploaded
+        concurrently, then saved with a few queries however many there are.
+        Files that fail to upload are skipped. If the game has no cover yet,
+        the first screenshot becomes its cover.
+
+        Url will be "user/<int:user_id>/games/<int:game_id>/screenshots/<hash><filename><ext>"
+        Args:
+            uploaded_files: images to add, in gallery order, e.g. from `request.FILES.getlist`
+            game: the game the screenshots are for
+        Returns:
+            the created Screenshots, in gallery order
+    """
+    folder = f"user/{game.user_id}/games/{game.id}/screenshots/"
+
+    files = []
+    with ThreadPoolExecutor(max_workers=SCREENSHOT_UPLOAD_WORKERS) as executor:
+        futures = [executor.submit(_upload_screenshot_file, uploaded_file, folder)
+                   for uploaded_file in uploaded_files]
+        for uploaded_file, future in zip(uploaded_files, futures):
+            try:
+                files.append(future.result())
+            except Exception as e:
+                print(f"add_screenshots error: failed to upload {uploaded_file.name} for game: {game.id}", e)
+
+    if not files:
+        return []
+
+    with transaction.atomic():
+        # lock the game, so concurrent uploads don't get the same positions
+        game = Game.objects.select_for_update().get(id=game.id)
+        last = game.screenshot_set.aggregate(last=Max("order"))["last"]
+        start = 0 if last is None else last + 1
+
+        File.objects.bulk_create(files)
+        screenshots = Screenshot.objects.bulk_create(
+            [Screenshot(file=file, game=game, order=start + i) for i, file in enumerate(files)])
+
+        if game.cover_id is None:
+            Game.objects.filter(id=game.id).update(cover=screenshots[0])
+
+    return screenshots
+
+
+def reorder_screenshots(game: Game, screenshot_ids: list[int]) -> bool:
+    """
+        Puts a game's gallery in a new order, without touching the files
+
+        Args:
+            game: the game whose gallery to reorder
+            screenshot_ids: ids of all of the game's screenshots, in their new order
+        Returns:
+            False if the ids aren't exactly the game's screenshots
+    """
+    with transaction.atomic():
+        screenshots = {screenshot.id: screenshot
+                       for screenshot in game.screenshot_set.select_for_update()}
+        if len(screenshot_ids) != len(screenshots) or set(screenshot_ids) != screenshots.keys():
+            print(f"reorder_screenshots error: ids don't match the screenshots of game: {game.id}")
+            return False
+
+        for order, screenshot_id in enumerate(screenshot_ids):
+            screenshots[screenshot_id].order = order
+        Screenshot.objects.bulk_update(screenshots.values(), ["order"])
+
     return True
 
 
-def create_or_update_single_screenshot(uploaded_file: UploadedFile, game_id: int):
+def set_cover_screenshot(game: Game, screenshot_id: int) -> bool:
     """
-        Create or update a Game's single screenshot
+        Makes one of a game's screenshots the one shown in listings
+
+        Returns:
+            False if the screenshot isn't the game's
     """
+    if not game.screenshot_set.filter(id=screenshot_id).exists():
+        print(f"set_cover_screenshot error: screenshot {screenshot_id} is not in game: {game.id}")
+        return False
+
+    Game.objects.filter(id=game.id).update(cover_id=screenshot_id)
+    game.cover_id = screenshot_id
+    return True
+
 
-    game = Game.objects.get(id=game_id)
+def delete_screenshot(screenshot: Screenshot):
+    """
+        Deletes a screenshot & its files. If it was its game's cover,
+        the next screenshot in the gallery becomes the cover.
+    """
+    game_id = screenshot.game_id
+
+    with transaction.atomic():
+        screenshot.delete()  # sets the cover to null, if it was
+
+        Game.objects.filter(id=game_id, cover__isnull=True).update(
+            cover=Screenshot.objects.filter(game_id=game_id).order_by("order", "id").values("id")[:1])
+
+
+def replace_cover_screenshot(uploaded_file: UploadedFile, game_id: int) -> bool:
+    """
+        Replaces a game's cover with a new screenshot, taking the old cover's
+        place in the gallery. Adds it as the cover if the game had none.
+        This is what the game form's screenshot field does.
+    """
+    game = Game.objects.filter(id=game_id).first()
     if not game:
-        print("create_or_update_single_screenshot error: invalid game_id")
+        print("replace_cover_screenshot error: invalid game_id")
         return False
 
-    if game.screenshot_set.count() > 0:
-        screenshot = game.screenshot_set.first()
-        screenshot.delete()
-
-    screenshot = create_screenshot(uploaded_file, game_id)
-    if not screenshot:
-        print("create_or_update_single_screenshot error: failed to create_screenshot")
+    old_cover = game.cover
+    screenshots = add_screenshots([uploaded_file], game)
+    if not screenshots:
+        print("replace_cover_screenshot error: failed to add screenshot")
         return False
-    game.screenshot_set.add(screenshot)
 
-    return True
\ No newline at end of file
+    screenshot = screenshots[0]
+    if old_cover:
+        with transaction.atomic():
+            Screenshot.objects.filter(id=screenshot.id).update(order=old_cover.order)
+            Game.objects.filter(id=game.id).update(cover=screenshot)
+            old_cover.delete()
+
+    return True
@@ -0,0 +1,512 @@
+"""
+    Game & tag search, called in-process by the html views and the json api
+    main_app / search.py
+
+    search_games    - published games matching a query, most relevant first, a page at a time
+    search_game_ids - same, ids only
+    search_game_scores - same, ids & scores, the last score & id make the next page's cursor
+    top_tags        - tags matching the last word of a query, most-used first
+    tokenize        - splits a query into the slugs searched for
+    invalidate_cache - makes cached results stale, done as games & tags change
+
+    Games are searched one of three ways, see SEARCH_BACKEND in the settings:
+        substring - words found anywhere in tags, titles & usernames, scored by
+                    where they were found. Every search scans the games.
+        fulltext  - ranked full-text search over the games' search documents,
+                    see Game.search_vector, backed by a GIN index
+        fuzzy     - words similar to a word of a tag, title or username, so
+                    typos still match, e.g. "platfromer". Backed by trigram indexes.
+"""
+import hashlib
+import threading
+import time
+import typing
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, Count, ExpressionWrapper, F, FloatField, Q, QuerySet, Value, When
+from django.db.models.functions import Cast, Greatest
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils.text import slugify
+
+from .models import Game, Tag
+from .models.Tag import published_counts_changed
+from .models.Game import SEARCH_CONFIG
+from .util.prefix_index import PrefixIndex
+
+# Points a game scores for each word of the query found in its...
+TAG_WEIGHT = 1
+TITLE_WEIGHT = .5
+USERNAME_WEIGHT = .15
+
+# Most games a search returns
+SEARCH_LIMIT = 100
+
+# How similar, from 0 to 1, a word must be to part of a tag, title or username
+# to match it with the fuzzy backend: the share of their trigrams in common
+FUZZY_THRESHOLD = 0.4
+
+# Seconds before the tag autocomplete index is reloaded from the database,
+# to pick up changes made by other processes
+TAG_INDEX_TTL = 300
+
+# With more tags than this, autocomplete queries the database instead of
+# keeping the tags in memory
+TAG_INDEX_MAX_TAGS = 500_000
+
+# Cache key of the version of cached search results, see invalidate_cache
+_CACHE_VERSION_KEY = "search:version"
+
+# Tag autocomplete index of this process, see _get_tag_index
+_tag_index: PrefixIndex | None = None
+_tag_index_loaded_at = 0.0
+_tag_index_lock = threading.Lock()
+
+
+def tokenize(q: str) -> list[str]:
+    """
+        Splits a query into lowercase slugs, skipping blank ones
+    """
+    return [token for token in (slugify(word.lower()) for word in q.split()) if token]
+
+
+def _scored_games(tokens: list[str]) -> QuerySet:
+    """
+        Published games matching any of the tokens, annotated with their score
+        and ordered by it, highest first, searched by SEARCH_BACKEND
+    """
+    if settings.SEARCH_BACKEND == "fulltext":
+        return _fulltext_games(tokens)
+    if settings.SEARCH_BACKEND == "fuzzy":
+        return _fuzzy_games(tokens)
+
+    return _substring_games(tokens)
+
+
+def _fulltext_games(tokens: list[str]) -> QuerySet:
+    """
+        Games whose search document matches any of the tokens, scored by
+        their rank. Tags weigh most, then titles, usernames & descriptions.
+    """
+    query = None
+    for token in tokens:
+        # words of a slug, e.g. "tower-defense", must all match
+        token_query = SearchQuery(token.replace("-", " "), config=SEARCH_CONFIG)
+        query = token_query if query is None else query | token_query
+
+    # ranks are single precision, cast so they make it to cursors & back exactly
+    return (Game.objects.filter(is_published=True, search_vector=query)
+                        .annotate(score=Cast(SearchRank(F("search_vector"), query), FloatField()))
+                        .order_by("-score", "id"))
+
+
+@contextmanager
+def _fuzzy_threshold():
+    """
+        Sets the similarity the trigram operators match at, for the queries
+        run inside the block. The operators are what the trigram indexes serve.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)",
+                       [str(FUZZY_THRESHOLD)])
+        yield
+
+
+def _fuzzy_match(words: list[str], field: str) -> Q:
+    """
+        Matches rows with a field similar to part of any of the words
+    """
+    match = Q()
+    for word in words:
+        match |= Q(**{f"{field}__trigram_word_similar": word})
+    return match
+
+
+def _fuzzy_similarity(words: list[str], field: str):
+    """
+        Expression for the similarity of a field to the most similar of the words
+    """
+    similarities = [TrigramWordSimilarity(word, field) for word in words]
+    return Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+
+
+def _fuzzy_games(tokens: list[str]) -> QuerySet:
+    """
+        Games with a tag, title or creator's username similar to any of the
+        tokens. Matching tags & users are found with their trigram indexes
+        first, then scored like _substring_games, with title & username
+        matches weighted by how similar they are.
+        Must be evaluated inside _fuzzy_threshold.
+    """
+    words = [token.replace("-", " ") for token in tokens]
+
+    tag_ids = Tag.objects.filter(_fuzzy_match(words, "text")).values("id")
+    user_ids = User.objects.filter(_fuzzy_match(words, "username")).values("id")
+    tagged_ids = Game.tags.through.objects.filter(tag_id__in=tag_ids).values("game_id")
+    title_match = _fuzzy_match(words, "title")
+
+    score = ExpressionWrapper(
+        Count("tags", filter=Q(tags__in=tag_ids), distinct=True) * TAG_WEIGHT
+        + Case(When(title_match, then=_fuzzy_similarity(words, "title")), default=Value(0.0))
+        * TITLE_WEIGHT
+        + Case(When(user_id__in=user_ids, then=_fuzzy_similarity(words, "user__username")),
+               default=Value(0.0))
+        * USERNAME_WEIGHT,
+        output_field=FloatField())
+
+    return (Game.objects.filter(Q(id__in=tagged_ids) | title_match | Q(user_id__in=user_ids),
+                                is_published=True)
+                        .annotate(score=score)
+                        .order_by("-score", "id"))
+
+
+def _substring_games(tokens: list[str]) -> QuerySet:
+    """
+        Games with any of the tokens in their tags, title or creator's username.
+        Scored in one query: matching tags are counted in a join, title &
+        username matches add a constant each.
+    """
+    tag_match, title_match, username_match = Q(), Q(), Q()
+    for token in tokens:
+        tag_match |= Q(tags__text__icontains=token)
+        title_match |= Q(title__icontains=token)
+        username_match |= Q(user__username__icontains=token)
+
+    score = ExpressionWrapper(
+        Count("tags", filter=tag_match, distinct=True) * TAG_WEIGHT
+        + Case(When(title_match, then=Value(TITLE_WEIGHT)), default=Value(0.0))
+        + Case(When(username_match, then=Value(USERNAME_WEIGHT)), default=Value(0.0)),
+        output_field=FloatField())
+
+    return (Game.objects.filter(is_published=True)
+                        .annotate(score=score)
+                        .filter(score__gt=0)
+                        .order_by("-score", "id"))
+
+
+def search_game_scores(q: str, limit: int = SEARCH_LIMIT,
+                       after: tuple[float, int] | None = None) -> list[tuple[int, float]]:
+    """
+        Finds published games from a query, based on a point system:
+        Level of significance from most to least:
+            - game tags, per matching tag
+            - game title
+            - creator's username
+
+        Results are ordered by score, then id, so they can be paged through
+        with a cursor: pass the score & id of the last game of a page as
+        `after` to get the next one.
+
+        Returns:
+            (id, score) of the best matching games, highest score first
+    """
+    tokens = tokenize(q)
+    if not tokens:
+        return []
+
+    def find() -> list[tuple[int, float]]:
+        games = _scored_games(tokens)
+        if after is not None:
+            score, game_id = after
+            games = games.filter(Q(score__lt=score) | Q(score=score, id__gt=game_id))
+
+        with _fuzzy_threshold() if settings.SEARCH_BACKEND == "fuzzy" else nullcontext():
+            return list(games.values_list("id", "score")[:limit])
+
+    return _cached("games", tokens, limit, find, after)
+
+
+def search_game_ids(q: str, limit: int = SEARCH_LIMIT, after: tuple[float, int] | None = None) -> list[int]:
+    """
+        Finds published games from a query, see search_game_scores
+
+        Returns:
+            ids of the best matching games, highest score first
+    """
+    return [game_id for game_id, _ in search_game_scores(q, limit, after)]
+
+
+def search_games(q: str, limit: int = SEARCH_LIMIT, after: tuple[float, int] | None = None) -> list[Game]:
+    """
+        Finds published games from a query, see search_game_scores
+
+        Returns:
+            the best matching games, highest score first, each with its
+            `search_score`, and with what listings show of them loaded.
+            Only the ids are cached, so the games are always fetched fresh,
+            in one query by primary key, plus one for their tags.
+    """
+    scores = search_game_scores(q, limit, after)
+    if not scores:
+        return []
+
+    # cached ids may include games unpublished since
+    games = (Game.objects.filter(is_published=True)
+                         .select_related("user", "cover__file").prefetch_related("tags")
+                         .defer("search_vector").in_bulk([game_id for game_id, _ in scores]))
+    results = []
+    for game_id, score in scores:
+        if game_id in games:
+            games[game_id].search_score = score
+            results.append(games[game_id])
+
+    return results
+
+
+# ===== result cache ==========================================================
+
+
+def _cache_version() -> int:
+    """
+        Current version of cached search results, part of their keys
+    """
+    version = cache.get(_CACHE_VERSION_KEY)
+    if version is None:
+        # start from the time, so results cached before the version was
+        # evicted from the cache can't be mistaken for current ones
+        cache.add(_CACHE_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(_CACHE_VERSION_KEY, 0)
+
+    return version
+
+
+def invalidate_cache():
+    """
+        Makes every cached search result stale, by bumping the version in
+        their keys. Stale results are left for the cache to evict.
+    """
+    try:
+        cache.incr(_CACHE_VERSION_KEY)
+    except ValueError:
+        # not in the cache, the next search starts a new version
+        pass
+
+
+def _cached(kind: str, tokens: list[str], limit: int, find: typing.Callable[[], list],
+            after: tuple | None = None) -> list:
+    """
+        Returns a search's results from the cache, or finds & caches them.
+        Searches for the same set of tokens share results, whatever their
+        order or repetition, since scores don't depend on either.
+
+        Args:
+            kind: what is searched for, e.g. "games"
+            tokens: the query, tokenized
+            limit: most results returned
+            find: runs the search
+            after: cursor of the page, if not the first
+    """
+    timeout = settings.SEARCH_CACHE_TIMEOUT
+    if not timeout:
+        return find()
+
+    query = " ".join(sorted(set(tokens)))
+    digest = hashlib.sha256(f"{settings.SEARCH_BACKEND}:{limit}:{after}:{query}".encode()).hexdigest()
+    key = f"search:{_cache_version()}:{kind}:{digest}"
+
+    results = cache.get(key)
+    if results is None:
+        results = find()
+        cache.set(key, results, timeout)
+
+    return results
+
+
+def _load_tag_index() -> PrefixIndex | None:
+    """
+        Builds the tag autocomplete index from the database, in one query
+
+        Returns:
+            the index, or None if there are too many tags to keep in memory
+    """
+    counts = dict(Tag.objects.values_list("text", "published_count")[:TAG_INDEX_MAX_TAGS + 1])
+    if len(counts) > TAG_INDEX_MAX_TAGS:
+        print(f"search: more than {TAG_INDEX_MAX_TAGS} tags, autocompleting from the database")
+        return None
+
+    return PrefixIndex(counts)
+
+
+def _get_tag_index() -> PrefixIndex | None:
+    """
+        This process's tag autocomplete index, loaded on first use and
+        reloaded every TAG_INDEX_TTL seconds. In between, it is updated as
+        tags & games change in this process, see the receivers below;
+        reloading picks up changes made by other processes.
+
+        Returns:
+            the index, or None if it can't be used
+    """
+    global _tag_index, _tag_index_loaded_at
+
+    if _tag_index is not None and time.monotonic() - _tag_index_loaded_at < TAG_INDEX_TTL:
+        return _tag_index
+
+    with _tag_index_lock:
+        if _tag_index is None or time.monotonic() - _tag_index_loaded_at >= TAG_INDEX_TTL:
+            try:
+                _tag_index = _load_tag_index()
+            except Exception as e:
+                print("search error: failed to load tag index", e)
+                _tag_index = None
+            _tag_index_loaded_at = time.monotonic()
+
+    return _tag_index
+
+
+def _update_tag_index(change: typing.Callable[[PrefixIndex], None]):
+    """
+        Applies a change to the loaded tag index once the transaction making
+        it commits. Nothing to do if the index isn't loaded.
+    """
+    def apply():
+        if _tag_index is not None:
+            change(_tag_index)
+
+    transaction.on_commit(apply)
+
+
+def _db_top_tags(token: str, limit: int) -> list[str]:
+    """
+        top_tags answered by the database, when the index can't answer.
+        Results are cached like game searches.
+    """
+    return _cached("tags", [token], limit, lambda: _find_top_tags(token, limit))
+
+
+def _find_top_tags(token: str, limit: int) -> list[str]:
+    tags = Tag.objects.filter(published_count__gt=0)
+
+    if settings.SEARCH_BACKEND == "fuzzy" and token:
+        word = token.replace("-", " ")
+        tags = (tags.filter(Q(text__icontains=token) | Q(text__trigram_word_similar=word))
+                    .annotate(similarity=TrigramWordSimilarity(word, "text"))
+                    .order_by("-similarity", "-published_count"))
+        with _fuzzy_threshold():
+            return list(tags.values_list("text", flat=True)[:limit])
+
+    tags = tags.filter(text__icontains=token).order_by("-published_count")
+    return list(tags.values_list("text", flat=True)[:limit])
+
+
+def top_tags(q: str, limit: int = 8) -> list[str]:
+    """
+        Finds tags with a word starting with the last word of a query, from
+        most-used to least-used, e.g. to suggest tags as the query is typed.
+        Answered from this process's in-memory tag index, without a query.
+        Tags are counted by their published games, see Tag.published_count.
+        Tags no published game uses are left out.
+
+        Falls back to the database, matching anywhere in tags, if the index
+        can't be used. With the fuzzy backend, it also falls back when the
+        index finds nothing, to find similar tags, most similar first.
+    """
+    tokens = tokenize(q)
+    token = tokens[-1] if tokens else ""
+
+    index = _get_tag_index()
+    if index is not None:
+        tags = index.search(token, limit)
+        if tags or settings.SEARCH_BACKEND != "fuzzy":
+            return tags
+
+    return _db_top_tags(token, limit)
+
+
+# ===== tag index upkeep ======================================================
+
+
+@receiver(published_counts_changed, sender=Tag)
+def _tag_counts_changed(sender, tag_ids: list[int], **kwargs):
+    """
+        Copies the new published counts of tags into the index, once committed
+    """
+    if _tag_index is None:
+        return
+
+    def apply():
+        if _tag_index is not None:
+            for text, count in Tag.objects.filter(id__in=tag_ids).values_list("text", "published_count"):
+                _tag_index.set(text, count)
+
+    transaction.on_commit(apply)
+
+
+@receiver(pre_save, sender=Tag)
+def _tag_saving(sender, instance: Tag, **kwargs):
+    """
+        Remembers a tag's text before it is renamed
+    """
+    if _tag_index is None:
+        return
+
+    instance._tag_index_text = (Tag.objects.filter(id=instance.id).values_list("text", flat=True).first()
+                                if instance.id else None)
+
+
+@receiver(post_save, sender=Tag)
+def _tag_saved(sender, instance: Tag, created: bool, **kwargs):
+    if _tag_index is None:
+        return
+
+    old, new = getattr(instance, "_tag_index_text", None), instance.text
+    if created or old is None:
+        _update_tag_index(lambda index: index.add(new, 0))
+    elif old != new:
+        _update_tag_index(lambda index: index.rename(old, new))
+
+
+@receiver(post_delete, sender=Tag)
+def _tag_deleted(sender, instance: Tag, **kwargs):
+    text = instance.text
+    _update_tag_index(lambda index: index.remove(text))
+
+
+# ===== result cache invalidation =============================================
+
+
+def _invalidate_on_commit():
+    transaction.on_commit(invalidate_cache)
+
+
+@receiver(post_save, sender=Game)
+def _game_saved_cache(sender, instance: Game, **kwargs):
+    """
+        Invalidates cached results when a game's title, description, creator
+        or publish state changed, not when e.g. its view count did
+    """
+    if getattr(instance, "search_changed", True):
+        _invalidate_on_commit()
+
+
+@receiver(post_delete, sender=Game)
+def _game_deleted_cache(sender, instance: Game, **kwargs):
+    _invalidate_on_commit()
+
+
+@receiver(m2m_changed, sender=Game.tags.through)
+def _game_tags_changed_cache(sender, action: str, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        _invalidate_on_commit()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def _tag_changed_cache(sender, **kwargs):
+    _invalidate_on_commit()
+
+
+@receiver(post_save, sender=User)
+def _user_saved_cache(sender, instance: User, created: bool, update_fields=None, **kwargs):
+    """
+        Invalidates cached results when a username may have changed
+    """
+    if created or (update_fields is not None and "username" not in update_fields):
+        return
+
+    _invalidate_on_commit()
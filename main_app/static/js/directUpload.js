@@ -0,0 +1,235 @@
+/**
+ * Uploads the files chosen in a form straight to s3 before the form is
+ * submitted, so they don't pass through our server. The form is then
+ * submitted with the upload session ids instead of the files.
+ * If anything goes wrong, the files are uploaded with the form as usual.
+ *
+ * Large files are sent in checksummed chunks through our server instead.
+ * If the connection drops, submitting the form again resumes the upload
+ * from the chunks that were already received.
+ *
+ * Requirements:
+ * - form with attributes:
+ *     data-direct-upload
+ *     data-create-url:   url of the "uploads_create" api
+ *     data-chunked-url:  url of the "uploads_create_chunked" api
+ *     data-session-url:  url of the "uploads_status" api, with 0 in place of the session id
+ *     data-game-id:      (optional) id of the game being edited
+ * - file inputs with attributes:
+ *     data-upload-kind:    "bundle" or "screenshot"
+ *     data-upload-session: name of the hidden input to put the session id in
+ */
+
+// encapsulate in module for clean global namespace
+(function() {
+
+    // files larger than this are uploaded in chunks
+    const CHUNKED_THRESHOLD = 32 * 1024 * 1024;
+
+    // number of chunks sent at the same time
+    const CHUNK_CONCURRENCY = 3;
+
+    // number of times to try sending a chunk before giving up
+    const CHUNK_ATTEMPTS = 4;
+
+    // driver code
+    window.addEventListener("load", evt => {
+        document.querySelectorAll("form[data-direct-upload]").forEach(form => {
+            form.addEventListener("submit", async evt => {
+                const inputs = [...form.querySelectorAll("input[type='file'][data-upload-kind]")]
+                    .filter(input => input.files.length);
+                if (!inputs.length) return;
+
+                evt.preventDefault();
+
+                try {
+                    for (const input of inputs) {
+                        const file = input.files[0];
+                        const sessionId = file.size > CHUNKED_THRESHOLD ?
+                            await uploadFileChunked(form, file, input.dataset.uploadKind) :
+                            await uploadFile(form, file, input.dataset.uploadKind);
+
+                        form.querySelector(`input[name='${input.dataset.uploadSession}']`).value = sessionId;
+                        input.value = "";
+                    }
+                } catch (err) {
+                    if (err.resumable) {
+                        // too large to send with the form, let the user resume instead
+                        console.error("chunked upload interrupted:", err);
+                        alert("The upload was interrupted. Submit the form again to resume it.");
+                        return;
+                    }
+                    console.error("direct upload failed, uploading with the form instead:", err);
+                }
+
+                // does not fire the submit event again
+                form.submit();
+            });
+        });
+    });
+
+    /**
+     * Uploads a file to s3 through an upload session
+     * @param form {HTMLFormElement} form with the data-* attributes described above
+     * @param file {File}            file to upload
+     * @param kind {string}          "bundle" or "screenshot"
+     * @returns {Promise<string>}    id of the completed session
+     */
+    async function uploadFile(form, file, kind) {
+        const csrfToken = form.querySelector("input[name='csrfmiddlewaretoken']").value;
+
+        // start session
+        const session = await postJson(form.dataset.createUrl, sessionForm(form, file, kind), csrfToken);
+
+        // upload to s3, the file must be the last field
+        const upload = new FormData();
+        Object.entries(session.fields).forEach(([key, value]) => upload.append(key, value));
+        upload.append("file", file);
+
+        const res = await fetch(session.url, {method: "POST", body: upload});
+        if (!res.ok)
+            throw new Error(`upload to storage failed with status ${res.status}`);
+
+        // let the server know it landed
+        await postJson(sessionUrl(form, session.id) + "complete/", new FormData(), csrfToken);
+
+        return session.id;
+    }
+
+    /**
+     * Uploads a file in chunks through an upload session, resuming a
+     * previous attempt at uploading the same file if there was one
+     * @param form {HTMLFormElement} form with the data-* attributes described above
+     * @param file {File}            file to upload
+     * @param kind {string}          "bundle" or "screenshot"
+     * @returns {Promise<string>}    id of the completed session
+     */
+    async function uploadFileChunked(form, file, kind) {
+        const csrfToken = form.querySelector("input[name='csrfmiddlewaretoken']").value;
+        const storageKey = `bgs-upload:${kind}:${file.name}:${file.size}:${file.lastModified}`;
+
+        // resume previous session for this file, or start a new one
+        let session = null;
+        let received = [];
+        const previousId = localStorage.getItem(storageKey);
+        if (previousId) {
+            const res = await fetch(sessionUrl(form, previousId), {credentials: "same-origin"});
+            if (res.ok) {
+                const status = await res.json();
+                if (status.status === "pending") {
+                    session = status;
+                    received = status.received;
+                } else {
+                    // every chunk was received, completing is all that's left
+                    try {
+                        await postJson(sessionUrl(form, previousId) + "complete/", new FormData(), csrfToken);
+                    } catch (err) {
+                        err.resumable = true;
+                        throw err;
+                    }
+                    localStorage.removeItem(storageKey);
+                    return previousId;
+                }
+            }
+        }
+
+        if (!session) {
+            const body = sessionForm(form, file, kind);
+            body.append("size", file.size);
+            session = await postJson(form.dataset.chunkedUrl, body, csrfToken);
+            localStorage.setItem(storageKey, session.id);
+        }
+
+        // send the missing chunks, a few at a time
+        const missing = [];
+        for (let i = 0; i < session.chunk_count; ++i) {
+            if (!received.includes(i)) missing.push(i);
+        }
+
+        const sendNext = async () => {
+            while (missing.length) {
+                const index = missing.shift();
+                const start = index * session.chunk_size;
+                await sendChunk(sessionUrl(form, session.id) + `chunks/${index}/`,
+                    file.slice(start, start + session.chunk_size), csrfToken);
+            }
+        };
+        try {
+            await Promise.all(Array.from({length: CHUNK_CONCURRENCY}, sendNext));
+
+            // assemble the chunks
+            await postJson(sessionUrl(form, session.id) + "complete/", new FormData(), csrfToken);
+        } catch (err) {
+            err.resumable = true;
+            throw err;
+        }
+        localStorage.removeItem(storageKey);
+
+        return session.id;
+    }
+
+    /**
+     * Sends one chunk with its checksum, retrying with a backoff if it fails
+     */
+    async function sendChunk(url, blob, csrfToken) {
+        const digest = await crypto.subtle.digest("SHA-256", await blob.arrayBuffer());
+        const sha256 = [...new Uint8Array(digest)].map(b => b.toString(16).padStart(2, "0")).join("");
+
+        for (let attempt = 1; ; ++attempt) {
+            try {
+                const res = await fetch(url, {
+                    method: "PUT",
+                    body: blob,
+                    headers: {"X-CSRFToken": csrfToken, "X-Chunk-SHA256": sha256},
+                    credentials: "same-origin",
+                });
+                if (res.ok) return;
+                if (attempt >= CHUNK_ATTEMPTS)
+                    throw new Error(`chunk upload failed with status ${res.status}`);
+            } catch (err) {
+                if (attempt >= CHUNK_ATTEMPTS) throw err;
+            }
+
+            await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** attempt));
+        }
+    }
+
+    /**
+     * Form data to start an upload session with
+     */
+    function sessionForm(form, file, kind) {
+        const body = new FormData();
+        body.append("kind", kind);
+        body.append("filename", file.name);
+        if (form.dataset.gameId)
+            body.append("game_id", form.dataset.gameId);
+
+        return body;
+    }
+
+    /**
+     * Url of an upload session's api, ends with a slash
+     */
+    function sessionUrl(form, sessionId) {
+        return form.dataset.sessionUrl.replace(/\/0\/$/, `/${sessionId}/`);
+    }
+
+    /**
+     * Posts form data to our api
+     * @returns {Promise<Object>} parsed json response
+     */
+    async function postJson(url, body, csrfToken) {
+        const res = await fetch(url, {
+            method: "POST",
+            body: body,
+            headers: {"X-CSRFToken": csrfToken},
+            credentials: "same-origin",
+        });
+
+        const json = await res.json();
+        if (!res.ok || json.error)
+            throw new Error(json.error || `request failed with status ${res.status}`);
+
+        return json;
+    }
+})();
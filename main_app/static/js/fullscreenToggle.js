@@ -22,6 +22,7 @@
         // get elements
         const iframe = document.querySelector("iframe");
         const fullscreenEl = document.getElementById("fullscreen-btn");
+        if (!iframe || !fullscreenEl) return; // game not playable yet, or button disabled
 
         // add listener
         fullscreenEl.addEventListener("click", () =>
@@ -0,0 +1,34 @@
+from unittest import TestCase
+
+from main_app.util.bench import percentile, summarize
+
+
+class TestPercentile(TestCase):
+    def test_exact_ranks(self):
+        values = [5, 1, 4, 2, 3]
+        self.assertEqual(percentile(values, 0), 1)
+        self.assertEqual(percentile(values, 50), 3)
+        self.assertEqual(percentile(values, 100), 5)
+
+    def test_interpolates(self):
+        self.assertEqual(percentile([1, 2], 50), 1.5)
+        self.assertAlmostEqual(percentile(list(range(1, 11)), 90), 9.1)
+
+    def test_single_value(self):
+        self.assertEqual(percentile([7], 99), 7)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            percentile([], 50)
+        with self.assertRaises(ValueError):
+            percentile([1], 101)
+
+
+class TestSummarize(TestCase):
+    def test_summarize(self):
+        summary = summarize([float(i) for i in range(1, 101)])
+        self.assertEqual(summary["count"], 100)
+        self.assertEqual(summary["mean"], 50.5)
+        self.assertEqual(summary["p50"], 50.5)
+        self.assertAlmostEqual(summary["p99"], 99.01)
+        self.assertEqual(summary["max"], 100)
@@ -0,0 +1,43 @@
+import gzip
+import io
+from unittest import TestCase
+from main_app.util.compress import precompress, precompressed_encoding, should_precompress
+
+class TestPrecompress(TestCase):
+
+    def test_compresses_text(self):
+        data = b"function main() { return 1; }\n" * 1000
+
+        body, encoding = precompress(io.BytesIO(data), "gzip")
+        with body:
+            compressed = body.read()
+
+        self.assertEqual(encoding, "gzip")
+        self.assertLess(len(compressed), len(data))
+        self.assertEqual(gzip.decompress(compressed), data)
+
+    def test_skips_files_that_dont_shrink(self):
+        data = bytes(range(256)) * 4
+        data = gzip.compress(data)  # already compressed
+
+        body, encoding = precompress(io.BytesIO(data), "gzip")
+        with body:
+            self.assertEqual(body.read(), data)
+
+        self.assertIsNone(encoding)
+
+    def test_should_precompress(self):
+        self.assertTrue(should_precompress("user/1/games/2/files/Build/game.wasm"))
+        self.assertTrue(should_precompress("index.HTML"))
+        self.assertFalse(should_precompress("image.png"))
+
+    def test_precompressed_encoding(self):
+        self.assertEqual(precompressed_encoding("Build/game.wasm.br"), ("br", "Build/game.wasm"))
+        self.assertEqual(precompressed_encoding("Build/game.data.gz"), ("gzip", "Build/game.data"))
+        self.assertEqual(precompressed_encoding("Build/game.framework.JS.gz"), ("gzip", "Build/game.framework.JS"))
+        self.assertIsNone(precompressed_encoding("archive.gz"))
+        # decompressed by the games themselves
+        self.assertIsNone(precompressed_encoding("levels.tar.gz"))
+        self.assertIsNone(precompressed_encoding("save.json.gz"))
+        self.assertIsNone(precompressed_encoding("assets/music.ogg.br"))
+        self.assertIsNone(precompressed_encoding("index.js"))
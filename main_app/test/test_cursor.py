@@ -0,0 +1,24 @@
+from unittest import TestCase
+
+from main_app.util.cursor import decode_cursor, encode_cursor
+
+
+class TestCursor(TestCase):
+    def test_round_trip(self):
+        cursor = encode_cursor((1520, 42))
+        self.assertNotIn("=", cursor)
+        self.assertEqual(decode_cursor(cursor, (int, int)), (1520, 42))
+
+        score = 0.1 + 0.2
+        self.assertEqual(decode_cursor(encode_cursor((score, 7)), (float, int)), (score, 7))
+
+    def test_accepts_int_for_float(self):
+        self.assertEqual(decode_cursor(encode_cursor((1, 7)), (float, int)), (1, 7))
+
+    def test_malformed(self):
+        self.assertIsNone(decode_cursor("", (int, int)))
+        self.assertIsNone(decode_cursor("not a cursor!", (int, int)))
+        self.assertIsNone(decode_cursor(encode_cursor((1,)), (int, int)))
+        self.assertIsNone(decode_cursor(encode_cursor((1.5, 2)), (int, int)))
+        self.assertIsNone(decode_cursor(encode_cursor((True, 2)), (int, int)))
+        self.assertIsNone(decode_cursor(encode_cursor(("1", 2)), (int, int)))
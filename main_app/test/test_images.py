@@ -0,0 +1,57 @@
+import io
+from unittest import TestCase
+
+from PIL import Image
+
+from main_app.util.images import image_dimensions, make_variants, variant_base_key, variant_key
+
+
+class TestImageDimensions(TestCase):
+    def test_reads_dimensions(self):
+        file = io.BytesIO()
+        Image.new("RGB", (32, 16)).save(file, "PNG")
+        file.seek(0)
+
+        self.assertEqual(image_dimensions(file), (32, 16))
+        self.assertEqual(file.tell(), 0)
+
+    def test_not_an_image(self):
+        file = io.BytesIO(b"not an image")
+        file.seek(4)
+
+        self.assertIsNone(image_dimensions(file))
+        self.assertEqual(file.tell(), 4)
+
+
+class TestMakeVariants(TestCase):
+    def test_resizes_to_smaller_widths(self):
+        file = io.BytesIO()
+        Image.new("RGB", (1000, 500)).save(file, "PNG")
+        file.seek(0)
+
+        variants = make_variants(file, (320, 640, 1280))
+
+        self.assertEqual([(v.width, v.height) for v in variants], [(320, 160), (640, 320)])
+        with Image.open(variants[0].file) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (320, 160)))
+        self.assertEqual(file.tell(), 0)
+
+    def test_square_crops_every_size(self):
+        file = io.BytesIO()
+        Image.new("RGB", (100, 60)).save(file, "PNG")
+        file.seek(0)
+
+        variants = make_variants(file, (64, 128), square=True)
+
+        self.assertEqual([(v.width, v.height) for v in variants], [(64, 64), (128, 128)])
+
+    def test_not_an_image(self):
+        self.assertEqual(make_variants(io.BytesIO(b"not an image"), (320,)), [])
+
+
+class TestVariantKey(TestCase):
+    def test_round_trip(self):
+        key = variant_key("user/1/profile/avatar-abc.png", 64)
+
+        self.assertEqual(variant_base_key(key), "user/1/profile/avatar-abc.png")
+        self.assertIsNone(variant_base_key("user/1/profile/avatar-abc.png"))
@@ -0,0 +1,61 @@
+import unittest
+from datetime import timedelta
+
+from django.apps import apps
+
+if not apps.ready:
+    raise unittest.SkipTest("needs the database, run with `python manage.py test`")
+
+from django.test import TestCase
+from django.utils import timezone
+
+from main_app import jobs
+from main_app.models import Job
+
+_failures = []
+
+
+@jobs.handler("test_job", on_failure=lambda **payload: _failures.append(payload))
+def _test_job(**payload):
+    pass
+
+
+class TestClaimNext(TestCase):
+    def setUp(self):
+        _failures.clear()
+
+    def _abandoned_job(self, attempts: int) -> Job:
+        """a job left running by a worker that died"""
+        job = Job.objects.create(kind="test_job", payload={"n": attempts},
+                                 status=Job.Status.RUNNING, attempts=attempts, max_attempts=3)
+        Job.objects.filter(id=job.id).update(
+            updated_at=timezone.now() - timedelta(seconds=jobs._RUNNING_TIMEOUT + 1))
+        return job
+
+    def test_reclaims_abandoned_job(self):
+        job = self._abandoned_job(attempts=1)
+
+        claimed = jobs.claim_next()
+
+        self.assertEqual(claimed.id, job.id)
+        self.assertEqual((claimed.status, claimed.attempts), (Job.Status.RUNNING, 2))
+        self.assertEqual(_failures, [])
+
+    def test_fails_abandoned_job_on_its_last_attempt(self):
+        job = self._abandoned_job(attempts=3)
+        queued = Job.objects.create(kind="test_job", payload={"n": 0})
+
+        claimed = jobs.claim_next()
+
+        self.assertEqual(claimed.id, queued.id)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.FAILED, 3))
+        self.assertIn("worker stopped responding", job.error)
+        self.assertEqual(_failures, [{"n": 3}])
+        self.assertIsNone(jobs.claim_next())
+
+    def test_leaves_running_jobs(self):
+        Job.objects.create(kind="test_job", status=Job.Status.RUNNING, attempts=3, max_attempts=3)
+
+        self.assertIsNone(jobs.claim_next())
+        self.assertEqual(_failures, [])
@@ -0,0 +1,64 @@
+import random
+from unittest import TestCase
+
+from main_app.util.prefix_index import PrefixIndex
+
+
+class TestPrefixIndex(TestCase):
+    def setUp(self):
+        self.index = PrefixIndex({"platformer": 5, "puzzle": 9, "tower-defense": 3, "unused": 0})
+
+    def test_most_counted_first(self):
+        self.assertEqual(self.index.search("p", 8), ["puzzle", "platformer"])
+        self.assertEqual(self.index.search("p", 1), ["puzzle"])
+        self.assertEqual(self.index.search("", 8), ["puzzle", "platformer", "tower-defense"])
+
+    def test_matches_any_word(self):
+        self.assertEqual(self.index.search("def", 8), ["tower-defense"])
+        self.assertEqual(self.index.search("efense", 8), [])
+
+    def test_skips_uncounted(self):
+        self.assertEqual(self.index.search("un", 8), [])
+        self.index.add("unused")
+        self.assertEqual(self.index.search("un", 8), ["unused"])
+
+    def test_updates(self):
+        self.index.add("platformer", 10)
+        self.index.add("pixel-art", 1)
+        self.assertEqual(self.index.search("p", 8), ["platformer", "puzzle", "pixel-art"])
+
+        self.index.set("puzzle", 20)
+        self.assertEqual(self.index.search("p", 1), ["puzzle"])
+
+        self.index.rename("pixel-art", "pixel")
+        self.index.remove("puzzle")
+        self.assertEqual(self.index.search("p", 8), ["platformer", "pixel"])
+        self.assertEqual(self.index.search("art", 8), [])
+
+    def test_top_lists_follow_changes(self):
+        rng = random.Random(0)
+        words = ["pa", "pb", "pc-qa", "qb", "pd-pe", "r", "pf", "q-pg", "ph", "pi"]
+        index = PrefixIndex(top_size=3)
+        counts = {}
+
+        for _ in range(500):
+            text = rng.choice(words)
+            action = rng.random()
+            if action < .5:
+                delta = rng.randint(-3, 3)
+                index.add(text, delta)
+                counts[text] = counts.get(text, 0) + delta
+            elif action < .8:
+                count = rng.randint(-1, 5)
+                index.set(text, count)
+                counts[text] = count
+            else:
+                index.remove(text)
+                counts.pop(text, None)
+
+            for prefix in ("", "p", "q", "pe", "pc", "r"):
+                for limit in (1, 3, 5):
+                    expected = sorted((text for text, count in counts.items() if count > 0 and any(
+                                       word.startswith(prefix) for word in text.split("-"))),
+                                      key=lambda text: (-counts[text], text))[:limit]
+                    self.assertEqual(index.search(prefix, limit), expected, (prefix, limit))
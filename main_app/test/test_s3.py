@@ -0,0 +1,86 @@
+import os
+from unittest import TestCase, mock
+
+from botocore.stub import Stubber
+
+from main_app.util.s3 import ClientManager, delete_folder_contents
+
+_ENV = {"AWS_ACCESS_KEY_ID": "x", "AWS_SECRET_ACCESS_KEY": "x", "AWS_DEFAULT_REGION": "us-east-1"}
+
+
+@mock.patch.dict(os.environ, _ENV)
+class TestClientManager(TestCase):
+    def test_shares_client(self):
+        clients = ClientManager()
+        self.assertIs(clients.get("s3"), clients.get("s3"))
+
+    def test_recreates_client_after_fork(self):
+        clients = ClientManager()
+        client = clients.get("s3")
+
+        clients._pid = -1  # as seen from a forked child
+        self.assertIsNot(clients.get("s3"), client)
+
+    def test_counts_calls(self):
+        clients = ClientManager()
+        s3 = clients.get("s3")
+
+        with Stubber(s3) as stubber:
+            stubber.add_response("head_object", {"ContentLength": 1})
+            stubber.add_client_error("head_object", "404")
+
+            s3.head_object(Bucket="bucket", Key="a")
+            with self.assertRaises(s3.exceptions.ClientError):
+                s3.head_object(Bucket="bucket", Key="b")
+
+        stats = clients.stats.snapshot()["HeadObject"]
+        self.assertEqual(stats["calls"], 2)
+        self.assertEqual(stats["errors"], 1)
+
+
+class _FakeS3:
+    """
+        Stands in for a client with a bucket full of keys
+    """
+
+    def __init__(self, keys: list[str], fail: set[str] = frozenset()):
+        self.keys = keys
+        self.fail = fail
+        self.deleted = []
+        self.requests = 0
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self, Bucket, Prefix, PaginationConfig):
+        keys = [key for key in self.keys if key.startswith(Prefix)]
+        size = PaginationConfig["PageSize"]
+        for i in range(0, len(keys), size):
+            yield {"Contents": [{"Key": key, "Size": 2} for key in keys[i:i + size]]}
+
+    def delete_objects(self, Bucket, Delete):
+        self.requests += 1
+        keys = [obj["Key"] for obj in Delete["Objects"]]
+        self.deleted += [key for key in keys if key not in self.fail]
+        return {"Errors": [{"Key": key, "Code": "AccessDenied", "Message": "no"}
+                           for key in keys if key in self.fail]}
+
+
+class TestDeleteFolderContents(TestCase):
+    def test_deletes_every_page(self):
+        keys = [f"user/1/games/2/files/{i}" for i in range(2500)]
+        s3 = _FakeS3(keys + ["user/1/games/22/other"])
+
+        deleted, size, errors = delete_folder_contents(s3, "bucket", "user/1/games/2/")
+
+        self.assertEqual((deleted, size, errors), (2500, 5000, {}))
+        self.assertEqual(sorted(s3.deleted), sorted(keys))
+        self.assertEqual(s3.requests, 3)
+
+    def test_reports_failures(self):
+        s3 = _FakeS3(["a/1", "a/2"], fail={"a/2"})
+
+        deleted, size, errors = delete_folder_contents(s3, "bucket", "a/")
+
+        self.assertEqual(deleted, 1)
+        self.assertEqual(list(errors), ["a/2"])
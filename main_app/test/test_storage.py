@@ -0,0 +1,94 @@
+import io
+import tempfile
+from unittest import TestCase
+
+from main_app.util.storage import LocalStorage, MemoryStorage
+
+
+class StorageTests:
+    """
+        Behavior every storage backend must have, mixed into a TestCase per backend
+    """
+
+    def test_upload_and_open(self):
+        self.storage.upload(io.BytesIO(b"hello"), "user/1/a.txt", "text/plain", "gzip")
+
+        info = self.storage.head("user/1/a.txt")
+        self.assertEqual((info.size, info.content_type, info.content_encoding), (5, "text/plain", "gzip"))
+        with self.storage.open("user/1/a.txt") as file:
+            self.assertEqual(file.read(), b"hello")
+        self.assertEqual(self.storage.read_range("user/1/a.txt", 1, 3), b"ell")
+
+    def test_missing(self):
+        self.assertIsNone(self.storage.head("user/1/missing.txt"))
+        with self.assertRaises(FileNotFoundError):
+            self.storage.open("user/1/missing.txt")
+
+    def test_delete_prefix(self):
+        for key in ("user/1/games/2/a", "user/1/games/2/files/b", "user/1/games/22/c"):
+            self.storage.upload(io.BytesIO(b"x"), key)
+
+        report = self.storage.delete_prefix("user/1/games/2/")
+
+        self.assertEqual((report.deleted, report.size, report.failed), (2, 2, {}))
+        self.assertIsNone(self.storage.head("user/1/games/2/a"))
+        self.assertIsNone(self.storage.head("user/1/games/2/files/b"))
+        self.assertIsNotNone(self.storage.head("user/1/games/22/c"))
+
+    def test_list_objects(self):
+        for key in ("user/1/a", "user/1/sub/b", "user/10/c", "user/2/d"):
+            self.storage.upload(io.BytesIO(b"xy"), key)
+
+        listed = sorted((obj.key, obj.size) for obj in self.storage.list_objects("user/1/"))
+
+        self.assertEqual(listed, [("user/1/a", 2), ("user/1/sub/b", 2)])
+        self.assertEqual(len(list(self.storage.list_objects("user/1"))), 3)
+
+    def test_delete_many(self):
+        self.storage.upload(io.BytesIO(b"x"), "a")
+        self.storage.upload(io.BytesIO(b"x"), "b")
+
+        self.storage.delete_many(["a", "b", "never-uploaded"])
+
+        self.assertIsNone(self.storage.head("a"))
+        self.assertIsNone(self.storage.head("b"))
+
+    def test_multipart_upload(self):
+        upload_id = self.storage.create_multipart_upload("big")
+        etags = [None, None]
+        etags[1] = self.storage.upload_part("big", upload_id, 2, io.BytesIO(b"world"), "")
+        etags[0] = self.storage.upload_part("big", upload_id, 1, io.BytesIO(b"hello "), "")
+
+        self.storage.complete_multipart_upload("big", upload_id, etags)
+
+        with self.storage.open("big") as file:
+            self.assertEqual(file.read(), b"hello world")
+
+    def test_abort_multipart_upload(self):
+        upload_id = self.storage.create_multipart_upload("big")
+        etag = self.storage.upload_part("big", upload_id, 1, io.BytesIO(b"hello"), "")
+
+        self.storage.abort_multipart_upload("big", upload_id)
+        self.storage.abort_multipart_upload("big", upload_id)
+
+        with self.assertRaises(Exception):
+            self.storage.complete_multipart_upload("big", upload_id, [etag])
+        self.assertIsNone(self.storage.head("big"))
+
+
+class TestMemoryStorage(StorageTests, TestCase):
+    def setUp(self):
+        self.storage = MemoryStorage()
+
+
+class TestLocalStorage(StorageTests, TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.storage = LocalStorage(self.root.name)
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def test_refuses_keys_outside_root(self):
+        with self.assertRaises(ValueError):
+            self.storage.upload(io.BytesIO(b"x"), "../outside.txt")
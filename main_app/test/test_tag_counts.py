@@ -0,0 +1,94 @@
+import unittest
+
+from django.apps import apps
+
+if not apps.ready:
+    raise unittest.SkipTest("needs the database, run with `python manage.py test`")
+
+from django.test import TestCase
+
+from main_app.models import Game, Tag, User
+from main_app.models.Tag import actual_published_count
+
+
+class TestPublishedCount(TestCase):
+    """
+        Tag.published_count stays equal to the published games of each tag,
+        through every way a game's tags or publish state change
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user("creator", password="password")
+        self.tags = [Tag.objects.create(text=text) for text in ("puzzle", "platformer", "retro")]
+        self.published = Game.objects.create(title="Published", user=self.user, is_published=True)
+        self.draft = Game.objects.create(title="Draft", user=self.user)
+
+    def assertCounts(self, expected: dict[str, int]):
+        tags = Tag.objects.annotate(actual=actual_published_count()).order_by("text")
+        self.assertEqual({tag.text: tag.published_count for tag in tags},
+                         {tag.text: tag.actual for tag in tags})
+        self.assertEqual({tag.text: tag.published_count for tag in tags}, expected)
+
+    def test_game_tags_add_remove(self):
+        self.published.tags.add(*self.tags[:2])
+        self.draft.tags.add(*self.tags)
+        self.assertCounts({"platformer": 1, "puzzle": 1, "retro": 0})
+
+        self.published.tags.remove(self.tags[0])
+        self.draft.tags.remove(self.tags[1])
+        self.assertCounts({"platformer": 1, "puzzle": 0, "retro": 0})
+
+    def test_game_tags_set(self):
+        self.published.tags.set(self.tags[:2])
+        self.published.tags.set(self.tags[1:])
+        self.assertCounts({"platformer": 1, "puzzle": 0, "retro": 1})
+
+    def test_game_tags_clear(self):
+        self.published.tags.add(*self.tags)
+        self.draft.tags.add(*self.tags)
+
+        self.published.tags.clear()
+        self.draft.tags.clear()
+        self.assertCounts({"platformer": 0, "puzzle": 0, "retro": 0})
+
+    def test_tag_games_add_remove(self):
+        self.tags[0].game_set.add(self.published, self.draft)
+        self.assertCounts({"platformer": 0, "puzzle": 1, "retro": 0})
+
+        self.tags[0].game_set.remove(self.draft)
+        self.assertCounts({"platformer": 0, "puzzle": 1, "retro": 0})
+
+        self.tags[0].game_set.remove(self.published)
+        self.assertCounts({"platformer": 0, "puzzle": 0, "retro": 0})
+
+    def test_tag_games_clear(self):
+        other = Game.objects.create(title="Other", user=self.user, is_published=True)
+        for tag in self.tags[:2]:
+            tag.game_set.add(self.published, self.draft, other)
+
+        self.tags[0].game_set.clear()
+        self.assertCounts({"platformer": 2, "puzzle": 0, "retro": 0})
+
+    def test_publish_toggle(self):
+        self.draft.tags.add(*self.tags[:2])
+
+        self.draft.is_published = True
+        self.draft.save()
+        self.assertCounts({"platformer": 1, "puzzle": 1, "retro": 0})
+
+        self.draft.is_published = False
+        self.draft.save()
+        self.assertCounts({"platformer": 0, "puzzle": 0, "retro": 0})
+
+        # saving without a change of publish state counts nothing
+        self.draft.title = "Renamed"
+        self.draft.save()
+        self.assertCounts({"platformer": 0, "puzzle": 0, "retro": 0})
+
+    def test_delete_game(self):
+        self.published.tags.add(*self.tags[:2])
+        self.draft.tags.add(*self.tags)
+
+        self.published.delete()
+        self.draft.delete()
+        self.assertCounts({"platformer": 0, "puzzle": 0, "retro": 0})
@@ -0,0 +1,136 @@
+import io
+import threading
+import time
+from unittest import TestCase
+
+from main_app.util.storage import MemoryStorage
+from main_app.util.upload import BatchUploader
+
+
+class FakeStorage(MemoryStorage):
+    """
+        MemoryStorage that can fail the Nth upload, hold uploads until
+        released, and fail deletes, counting uploads in flight
+    """
+
+    def __init__(self, fail_on: int = 0, delete_error: str = ""):
+        super().__init__()
+        self.fail_on = fail_on
+        self.delete_error = delete_error
+        self.release = threading.Event()
+        self.release.set()
+        self.attempts = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._count_lock = threading.Lock()
+
+    def upload(self, file, key, *args, **kwargs):
+        with self._count_lock:
+            self.attempts += 1
+            attempt = self.attempts
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            self.release.wait()
+            if attempt == self.fail_on:
+                raise OSError(f"upload {attempt} failed")
+            super().upload(file, key, *args, **kwargs)
+        finally:
+            with self._count_lock:
+                self.in_flight -= 1
+
+    def delete_many(self, keys):
+        if self.delete_error:
+            return {key: self.delete_error for key in keys}
+        return super().delete_many(keys)
+
+
+def _opener(data: bytes):
+    return lambda: io.BytesIO(data)
+
+
+class TestBatchUploader(TestCase):
+    def test_uploads_all(self):
+        storage = FakeStorage()
+        uploader = BatchUploader(max_workers=4, storage=storage)
+        for i in range(20):
+            uploader.submit(f"files/{i}", _opener(b"x" * i))
+        result = uploader.wait()
+
+        self.assertTrue(result.ok)
+        self.assertEqual(sorted(result.uploaded), sorted(f"files/{i}" for i in range(20)))
+        self.assertEqual(len(storage.keys()), 20)
+        self.assertEqual(len(result.hashes), 20)
+        self.assertLessEqual(storage.max_in_flight, 4)
+
+    def test_bounds_waiting_files(self):
+        storage = FakeStorage()
+        storage.release.clear()
+        uploader = BatchUploader(max_workers=2, storage=storage)
+        submitted = []
+
+        def submit_all():
+            for i in range(10):
+                uploader.submit(f"files/{i}", _opener(b"x"))
+                submitted.append(i)
+
+        thread = threading.Thread(target=submit_all)
+        thread.start()
+        time.sleep(.2)
+
+        # 2 uploading & 2 waiting, submit blocks on the fifth
+        self.assertEqual(len(submitted), 4)
+        self.assertEqual(storage.in_flight, 2)
+
+        storage.release.set()
+        thread.join(5)
+        result = uploader.wait()
+
+        self.assertEqual(len(submitted), 10)
+        self.assertTrue(result.ok)
+        self.assertLessEqual(storage.max_in_flight, 2)
+
+    def test_rolls_back_on_failure(self):
+        storage = FakeStorage(fail_on=3)
+        uploader = BatchUploader(max_workers=1, storage=storage)
+        for i in range(6):
+            uploader.submit(f"files/{i}", _opener(b"x"))
+        result = uploader.wait()
+
+        self.assertFalse(result.ok)
+        self.assertEqual(list(result.failed), ["files/2"])
+        self.assertEqual(result.uploaded, ["files/0", "files/1"])
+        self.assertTrue(result.rolled_back)
+        self.assertEqual(result.errors, {})
+        self.assertEqual(storage.keys(), [])
+        # later uploads were skipped
+        self.assertEqual(storage.attempts, 3)
+
+    def test_reports_rollback_errors(self):
+        storage = FakeStorage(fail_on=2, delete_error="access denied")
+        uploader = BatchUploader(max_workers=1, storage=storage)
+        for i in range(3):
+            uploader.submit(f"files/{i}", _opener(b"x"))
+        result = uploader.wait()
+
+        self.assertFalse(result.rolled_back)
+        self.assertEqual(result.errors, {"files/0": "access denied"})
+        self.assertEqual(storage.keys(), ["files/0"])
+
+    def test_rollback_keeps_existing_keys(self):
+        storage = FakeStorage(fail_on=4)
+        for i in range(3):
+            storage.upload(io.BytesIO(b"old"), f"files/{i}")
+        storage.attempts = 0
+
+        uploader = BatchUploader(max_workers=1, storage=storage, existing_keys=storage.keys())
+        for i in (0, 3, 1, 2):
+            uploader.submit(f"files/{i}", _opener(b"new"))
+        result = uploader.wait()
+
+        self.assertEqual(result.uploaded, ["files/0", "files/3", "files/1"])
+        self.assertEqual(result.overwritten, ["files/0", "files/1"])
+        self.assertTrue(result.rolled_back)
+        # the new key is gone, overwritten keys keep their new contents, the rest their old
+        self.assertEqual(storage.keys(), ["files/0", "files/1", "files/2"])
+        self.assertEqual([storage.open(f"files/{i}").read() for i in range(3)], [b"new", b"new", b"old"])
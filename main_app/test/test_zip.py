@@ -1,6 +1,8 @@
 import os
+import tempfile
 from pathlib import Path
 from unittest import TestCase
+from zipfile import ZipFile, ZipInfo, ZIP_STORED, BadZipFile
 from main_app.util.zip import BgsZipfile
 
 class TestZipFile(TestCase):
@@ -33,3 +35,66 @@ class TestZipFile(TestCase):
         self.assertEqual(file.file, None)
         self.assertEqual(len(file.files), 0)
         self.assertTrue(not file.is_open())
+
+
+class TestZipFileStream(TestCase):
+    file: BgsZipfile
+    tmpdir: tempfile.TemporaryDirectory
+
+    def setUp(self):
+        self.file = BgsZipfile()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.file.close()
+        self.tmpdir.cleanup()
+
+    def make_zip(self, members: dict[str, bytes]) -> str:
+        path = os.path.join(self.tmpdir.name, "streamtest.zip")
+        with ZipFile(path, "w", compression=ZIP_STORED) as zf:
+            for name, data in members.items():
+                zf.writestr(name, data)
+        return path
+
+    def test_open_does_not_open_members(self):
+        path = self.make_zip({
+            "streamtest/index.html": b"<html></html>",
+            "streamtest/.DS_Store": b"ignored",
+            "streamtest/js/main.js": b"console.log(1)",
+        })
+
+        self.assertTrue(self.file.open(path))
+        self.assertEqual(len(self.file.files), 2)
+        self.assertTrue(all(isinstance(info, ZipInfo) for info in self.file.files))
+
+    def test_stream_yields_members_in_order(self):
+        path = self.make_zip({
+            "streamtest/index.html": b"<html></html>",
+            "streamtest/js/main.js": b"console.log(1)",
+        })
+        self.file.open(path)
+
+        names = []
+        for member in self.file.stream():
+            names.append(member.name)
+            if member.name.endswith(".html"):
+                self.assertEqual(member.read(), b"<html></html>")
+
+        self.assertEqual(names, ["streamtest/index.html", "streamtest/js/main.js"])
+        self.assertEqual(str(BgsZipfile.member_path(self.file.files[1])), "js/main.js")
+
+    def test_stream_detects_bad_crc(self):
+        payload = b"A" * 1024
+        path = self.make_zip({"streamtest/data.bin": payload})
+
+        # corrupt the stored member's data, but not its header
+        with open(path, "rb") as f:
+            data = bytearray(f.read())
+        data[data.index(payload) + 10] ^= 0xFF
+        with open(path, "wb") as f:
+            f.write(data)
+
+        self.assertTrue(self.file.open(path))
+        with self.assertRaises(BadZipFile):
+            for _ in self.file.stream():
+                pass  # consumer reads nothing, stream drains it
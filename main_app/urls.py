@@ -42,12 +42,32 @@ urlpatterns: list[partial] = [
     # registration
     path("accounts/signup/", views.accounts.signup, name="signup"),
 
+    # files in local & memory storage
+    path("storage/<path:key>", views.storage.serve, name="storage_serve"),
+
     # api
     # - color-mode
     path("api/color-mode/<str:mode>/", views.api.color_mode.set, name="profile_color_mode_set"),
     path("api/color-mode/", views.api.color_mode.get, name="profile_color_mode_get"),
+    # - game listing, for infinite scrolling
+    path("api/games/", views.api.games.page, name="games_api_page"),
     # - search
     path("api/search/games/", views.api.search.search_games, name="search_games"),
     path("api/search/top-tags/", views.api.search.top_tags, name="search_top_tags"),
+    # - direct uploads
+    path("api/uploads/", views.api.uploads.create, name="uploads_create"),
+    path("api/uploads/chunked/", views.api.uploads.create_chunked, name="uploads_create_chunked"),
+    path("api/uploads/<int:session_id>/", views.api.uploads.status, name="uploads_status"),
+    path("api/uploads/<int:session_id>/chunks/<int:index>/", views.api.uploads.upload_chunk, name="uploads_chunk"),
+    path("api/uploads/<int:session_id>/complete/", views.api.uploads.complete, name="uploads_complete"),
+    path("api/uploads/<int:session_id>/cancel/", views.api.uploads.cancel, name="uploads_cancel"),
+    # - screenshot galleries
+    path("api/games/<int:game_id>/screenshots/", views.api.screenshots.add, name="screenshots_api_add"),
+    path("api/games/<int:game_id>/screenshots/order/", views.api.screenshots.reorder,
+         name="screenshots_api_reorder"),
+    path("api/games/<int:game_id>/screenshots/<int:screenshot_id>/cover/", views.api.screenshots.cover,
+         name="screenshots_api_cover"),
+    path("api/games/<int:game_id>/screenshots/<int:screenshot_id>/delete/", views.api.screenshots.delete,
+         name="screenshots_api_delete"),
 
 ]
@@ -0,0 +1,51 @@
+"""
+    Latency statistics for benchmarks
+    main_app / util / bench.py
+
+    percentile - a percentile of some timings, interpolated between the closest two
+    summarize  - count, mean, p50, p90, p99 & max of some timings
+"""
+import math
+import statistics
+
+# Percentiles reported by summarize
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values: list[float], p: float) -> float:
+    """
+        The p-th percentile of some values, linearly interpolated between the
+        two closest ranks, like numpy's default
+
+        Args:
+            values: not empty, in any order
+            p: from 0 to 100
+    """
+    if not values:
+        raise ValueError("no values")
+    if not 0 <= p <= 100:
+        raise ValueError(f"percentile out of range: {p}")
+
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low, high = math.floor(rank), math.ceil(rank)
+
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    """
+        Statistics of some timings, e.g. in milliseconds
+
+        Returns:
+            {"count", "mean", "p50", "p90", "p99", "max"}
+    """
+    if not values:
+        raise ValueError("no values")
+
+    return {
+        "count": len(values),
+        "mean": statistics.fmean(values),
+        **{f"p{p}": percentile(values, p) for p in PERCENTILES},
+        "max": max(values),
+    }
@@ -0,0 +1,148 @@
+"""
+    Precompression of game files at upload time, so players download them
+    compressed without s3 having to compress anything
+    main_app / util / compress.py
+
+    precompress            - compresses a file if it is worth it
+    should_precompress     - whether a file's type compresses well
+    precompressed_encoding - encoding of files that were compressed before upload,
+                             e.g. Unity's "Build/game.wasm.br"
+"""
+import tempfile
+import typing
+import zlib
+from pathlib import PurePath
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# File extensions that compress well
+COMPRESSIBLE_EXTS = {
+    ".css", ".csv", ".data", ".htm", ".html", ".js", ".json", ".mem", ".mjs",
+    ".svg", ".symbols", ".tsv", ".txt", ".wasm", ".xhtml", ".xml",
+}
+
+# Content-Encoding of files that were compressed before they were zipped
+_PRECOMPRESSED_EXTS = {
+    ".br": "br",
+    ".gz": "gzip",
+}
+
+# Extensions of compressed build files that engines expect the browser to
+# decompress, e.g. Unity's "Build/game.wasm.br". Other compressed files, e.g.
+# "levels.tar.gz" or "save.json.gz", are fetched & decompressed by games themselves.
+_PRECOMPRESSED_BUILD_EXTS = {".data", ".js", ".wasm"}
+
+# Files compressed to more than this fraction of their size are stored as-is
+_MIN_SAVINGS = 0.9
+
+# Size of reads while compressing
+_CHUNK_SIZE = 64 * 1024
+
+# Compressed files are buffered in memory up to this size, then spooled to disk
+_SPOOL_SIZE = 8 * 1024 * 1024
+
+
+def available_encodings() -> list[str]:
+    """
+        Content-Encodings that can be used to precompress with
+    """
+    return ["gzip", "br"] if brotli else ["gzip"]
+
+
+def should_precompress(path: str) -> bool:
+    """
+        Whether a file's type is worth compressing
+    """
+    return PurePath(path).suffix.lower() in COMPRESSIBLE_EXTS
+
+
+def precompressed_encoding(path: str) -> tuple[str, str] | None:
+    """
+        Checks for build files compressed before they were zipped, e.g. Unity's
+        "Build/game.wasm.br", which need to be served with a Content-Encoding
+        to be decompressed by the browser. Other compressed files are served
+        as they are, see _PRECOMPRESSED_BUILD_EXTS.
+
+        Returns:
+            the Content-Encoding, and the path without the compression extension
+            to derive a content type from, or None if the file isn't compressed
+    """
+    path = PurePath(path)
+    encoding = _PRECOMPRESSED_EXTS.get(path.suffix.lower())
+    if encoding is None or PurePath(path.stem).suffix.lower() not in _PRECOMPRESSED_BUILD_EXTS:
+        return None
+
+    return encoding, str(path.with_suffix(""))
+
+
+class _BrotliCompressor:
+    """
+        Gives brotli's compressor the same interface as zlib's
+    """
+
+    def __init__(self):
+        self.compressor = brotli.Compressor(quality=11)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.finish()
+
+
+def _compressor(encoding: str):
+    """
+        Object with compress(bytes) & flush() for an encoding
+    """
+    if encoding == "gzip":
+        return zlib.compressobj(9, zlib.DEFLATED, 31)  # 31: gzip header
+
+    if encoding == "br":
+        if brotli is None:
+            raise ValueError("brotli encoding requires the brotli package")
+
+        return _BrotliCompressor()
+
+    raise ValueError(f"unsupported encoding: {encoding}")
+
+
+def precompress(file: typing.BinaryIO, encoding: str = "gzip") -> tuple[typing.BinaryIO, str | None]:
+    """
+        Compresses a file, reading it a chunk at a time. Memory use is bounded,
+        large files are spooled to disk.
+
+        Args:
+            file: file to compress, read to the end
+            encoding: "gzip", or "br" if the brotli package is installed
+
+        Returns:
+            a file to upload, rewound, and the Content-Encoding to upload it with.
+            If compressing didn't shrink the file enough, the original contents
+            and None are returned instead.
+            The caller is responsible for closing the returned file.
+    """
+    compressor = _compressor(encoding)
+    original = tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE)
+    compressed = tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE)
+
+    try:
+        while data := file.read(_CHUNK_SIZE):
+            original.write(data)
+            compressed.write(compressor.compress(data))
+        compressed.write(compressor.flush())
+    except Exception:
+        original.close()
+        compressed.close()
+        raise
+
+    if compressed.tell() > original.tell() * _MIN_SAVINGS:
+        compressed.close()
+        original.seek(0)
+        return original, None
+
+    original.close()
+    compressed.seek(0)
+    return compressed, encoding
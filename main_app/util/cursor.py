@@ -0,0 +1,48 @@
+"""
+    Opaque cursors for keyset pagination
+    main_app / util / cursor.py
+
+    encode_cursor - packs the sort values of the last item of a page into a url-safe string
+    decode_cursor - unpacks them, checking their types
+"""
+import base64
+import binascii
+import json
+
+
+def encode_cursor(values: tuple) -> str:
+    """
+        Packs sort values, e.g. (times_viewed, id) of the last game of a page,
+        into a url-safe string to pass back for the next page
+    """
+    data = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, types: tuple[type, ...]) -> tuple | None:
+    """
+        Unpacks a cursor made by encode_cursor
+
+        Args:
+            cursor: from a request
+            types: expected type of each value, ints are accepted for floats
+
+        Returns:
+            the values, or None if the cursor is malformed
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(data)
+    except (binascii.Error, ValueError):
+        return None
+
+    if not isinstance(values, list) or len(values) != len(types):
+        return None
+
+    for value, value_type in zip(values, types):
+        accepted = (int, float) if value_type is float else value_type
+        # bools are ints to isinstance, but never valid sort values here
+        if isinstance(value, bool) or not isinstance(value, accepted):
+            return None
+
+    return tuple(values)
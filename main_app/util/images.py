@@ -0,0 +1,135 @@
+"""
+    Image helpers, using Pillow
+    main_app / util / images.py
+
+    image_dimensions - reads the width & height of an image from its header
+    make_variants    - resizes an image to smaller copies in a modern format, for srcset
+    variant_key, variant_base_key - keys of the copies, next to the original
+"""
+import re
+import tempfile
+import typing
+from dataclasses import dataclass
+
+from PIL import Image, ImageOps
+
+# Widths in pixels of the resized copies made of screenshots
+SCREENSHOT_WIDTHS = (320, 640, 1280)
+
+# Sizes in pixels of the square copies made of avatars
+AVATAR_SIZES = (64, 128, 256)
+
+# Format, content type & file extension of resized copies
+VARIANT_FORMAT = "WEBP"
+VARIANT_CONTENT_TYPE = "image/webp"
+VARIANT_EXT = ".webp"
+
+# Quality of resized copies, 0-100
+_VARIANT_QUALITY = 80
+
+# Images with more pixels than this are refused, to guard against decompression bombs
+_MAX_PIXELS = 64 * 1024 * 1024
+
+# Matches the key of a copy, capturing the original's key
+_VARIANT_KEY = re.compile(r"^(.+)\.\d+w\.webp$")
+
+
+@dataclass
+class Variant:
+    """
+        A resized copy of an image, made by make_variants
+    """
+    width: int
+    height: int
+    file: typing.BinaryIO
+    """encoded image, rewound, the caller is responsible for closing it"""
+
+
+def image_dimensions(file: typing.BinaryIO) -> tuple[int, int] | None:
+    """
+        Reads the width and height of an image. Only the image's header is
+        read, and the file is rewound to where it was afterward.
+
+        Returns:
+            (width, height), or None if the file is not an image Pillow can read
+    """
+    pos = file.tell()
+    try:
+        with Image.open(file) as image:
+            return image.size
+    except Exception:
+        return None
+    finally:
+        file.seek(pos)
+
+
+def variant_key(key: str, width: int) -> str:
+    """
+        Key of a copy of the image at key, e.g. "shot.png" -> "shot.png.320w.webp"
+    """
+    return f"{key}.{width}w{VARIANT_EXT}"
+
+
+def variant_base_key(key: str) -> str | None:
+    """
+        Key of the image a copy was made of, or None if the key is not a copy's
+    """
+    match = _VARIANT_KEY.match(key)
+    return match.group(1) if match else None
+
+
+def make_variants(file: typing.BinaryIO, widths: typing.Iterable[int],
+                  square: bool = False) -> list[Variant]:
+    """
+        Resizes an image to each width, keeping its aspect ratio, and encodes
+        the copies as WebP. Widths that are not smaller than the image are
+        skipped, the original serves those. The file is rewound afterward.
+
+        Animated images are not resized, a still copy would lose the animation.
+
+        Args:
+            file: the image
+            widths: widths in pixels to make copies at
+            square: crop the copies to a centered square, e.g. for avatars.
+                Every width is made, even if the image is smaller.
+
+        Returns:
+            the variants, from narrowest to widest; empty if the file is not
+            an image Pillow can read
+    """
+    pos = file.tell()
+    variants = []
+    try:
+        with Image.open(file) as image:
+            if getattr(image, "is_animated", False) or image.width * image.height > _MAX_PIXELS:
+                return []
+
+            # apply the camera's orientation, it is lost when re-encoding
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info
+                                      else "RGB")
+
+            for width in sorted(set(widths)):
+                if square:
+                    height = width
+                    resized = ImageOps.fit(image, (width, width), Image.Resampling.LANCZOS)
+                elif width < image.width:
+                    height = max(1, round(image.height * width / image.width))
+                    resized = image.resize((width, height), Image.Resampling.LANCZOS)
+                else:
+                    break
+
+                out = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+                resized.save(out, VARIANT_FORMAT, quality=_VARIANT_QUALITY, method=4)
+                out.seek(0)
+                variants.append(Variant(width, height, out))
+    except Exception as e:
+        print("make_variants error: failed to resize image:", e)
+        for variant in variants:
+            variant.file.close()
+        return []
+    finally:
+        file.seek(pos)
+
+    return variants
@@ -0,0 +1,207 @@
+"""
+    In-memory index of counted strings, searched by prefix, e.g. for autocomplete
+    main_app / util / prefix_index.py
+
+    PrefixIndex - strings with counts, found by the start of any of their words
+"""
+import bisect
+import heapq
+import threading
+
+# Number of recent searches whose results are kept, cleared on any change
+_CACHE_SIZE = 1024
+
+# Prefixes up to this long have their most counted strings kept up to date,
+# they match too many strings to walk through on every search
+SHORT_PREFIX_LENGTH = 2
+
+# Number of most counted strings kept per short prefix
+TOP_SIZE = 100
+
+
+class PrefixIndex:
+    """
+        Strings with a count each, e.g. tags & the number of games using them.
+        Searching returns the most counted strings with a word starting with
+        a prefix: "def" finds "tower-defense". Strings with a count of 0 or
+        less are kept but never returned.
+
+        Words are kept in a sorted array, so a search is a binary search plus
+        a walk over the matches. Short prefixes, e.g. "" or "p", match most
+        strings, so the top_size most counted strings of each are kept in a
+        list instead, updated as counts change, and searches up to that
+        limit read the list. Safe to use from several threads.
+    """
+
+    def __init__(self, counts: dict[str, int] | None = None, separator: str = "-",
+                 top_size: int = TOP_SIZE):
+        self.separator = separator
+        self.top_size = top_size
+        self._counts: dict[str, int] = dict(counts or {})
+        self._words = sorted(entry for text in self._counts for entry in self._entries(text))
+        """
+            (word onwards, string) for each word start of each string,
+            e.g. ("defense", "tower-defense")
+        """
+        self._top: dict[str, list[str]] = {}
+        """
+            most counted strings with a word starting with each short prefix,
+            at most top_size, most counted first. Shorter lists hold every
+            match. Filled in by searches, dropped when they can't be updated.
+        """
+        self._cache: dict[tuple[str, int], list[str]] = {}
+        self._lock = threading.Lock()
+
+
+    def _entries(self, text: str) -> list[tuple[str, str]]:
+        """
+            Sorted array entries of a string, one per word
+        """
+        starts = [0] + [i + 1 for i, char in enumerate(text) if char == self.separator]
+        return [(text[start:], text) for start in starts if start < len(text)]
+
+
+    def _short_prefixes(self, text: str) -> set[str]:
+        """
+            Short prefixes a string is found by
+        """
+        return {word[:length] for word, _ in self._entries(text)
+                for length in range(SHORT_PREFIX_LENGTH + 1)} | {""}
+
+
+    def _sort_key(self, text: str) -> tuple[int, str]:
+        return -self._counts.get(text, 0), text
+
+
+    def _update_top(self, text: str):
+        """
+            Moves a string to its place in the top lists of its short prefixes,
+            after its count changed or it was removed. The lock must be held.
+        """
+        count = self._counts.get(text, 0)
+        for prefix in self._short_prefixes(text):
+            top = self._top.get(prefix)
+            if top is None:
+                continue
+
+            complete = len(top) < self.top_size
+            if text in top:
+                top.remove(text)
+
+            if count > 0 and (complete or (top and self._sort_key(text) < self._sort_key(top[-1]))):
+                bisect.insort(top, text, key=self._sort_key)
+                del top[self.top_size:]
+            elif len(top) < self.top_size and not complete:
+                # left a full list, which string comes next is unknown
+                del self._top[prefix]
+
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+
+    def __contains__(self, text: str) -> bool:
+        return text in self._counts
+
+
+    def count(self, text: str) -> int:
+        return self._counts.get(text, 0)
+
+
+    def add(self, text: str, delta: int = 1):
+        """
+            Changes the count of a string, adding it if it's new
+        """
+        with self._lock:
+            self._insert(text)
+            self._counts[text] += delta
+            self._update_top(text)
+            self._cache.clear()
+
+
+    def set(self, text: str, count: int):
+        """
+            Sets the count of a string, adding it if it's new
+        """
+        with self._lock:
+            self._insert(text)
+            self._counts[text] = count
+            self._update_top(text)
+            self._cache.clear()
+
+
+    def _insert(self, text: str):
+        """
+            Adds a string with a count of 0 if it's new, the lock must be held
+        """
+        if text not in self._counts:
+            self._counts[text] = 0
+            for entry in self._entries(text):
+                bisect.insort(self._words, entry)
+
+
+    def remove(self, text: str):
+        """
+            Removes a string, if it is there
+        """
+        with self._lock:
+            if self._counts.pop(text, None) is None:
+                return
+            for entry in self._entries(text):
+                i = bisect.bisect_left(self._words, entry)
+                if i < len(self._words) and self._words[i] == entry:
+                    del self._words[i]
+            self._update_top(text)
+            self._cache.clear()
+
+
+    def rename(self, old: str, new: str):
+        """
+            Moves a string's count to a new string
+        """
+        if old == new:
+            return
+        count = self.count(old)
+        self.remove(old)
+        self.add(new, count)
+
+
+    def search(self, prefix: str, limit: int) -> list[str]:
+        """
+            Finds the strings with a word starting with a prefix
+
+            Returns:
+                up to `limit` strings, most counted first, then alphabetically
+        """
+        key = (prefix, limit)
+        with self._lock:
+            if key in self._cache:
+                return list(self._cache[key])
+
+            if len(prefix) <= SHORT_PREFIX_LENGTH and limit <= self.top_size:
+                if prefix not in self._top:
+                    self._top[prefix] = self._walk(prefix, self.top_size)
+                results = self._top[prefix][:limit]
+            else:
+                results = self._walk(prefix, limit)
+
+            if len(self._cache) >= _CACHE_SIZE:
+                self._cache.clear()
+            self._cache[key] = results
+            return list(results)
+
+
+    def _walk(self, prefix: str, limit: int) -> list[str]:
+        """
+            Finds the most counted strings with a word starting with a prefix,
+            going through every match. The lock must be held.
+        """
+        matches = set()
+        i = bisect.bisect_left(self._words, (prefix,))
+        while i < len(self._words) and self._words[i][0].startswith(prefix):
+            text = self._words[i][1]
+            if self._counts[text] > 0:
+                matches.add(text)
+            i += 1
+
+        return heapq.nsmallest(limit, matches, key=self._sort_key)
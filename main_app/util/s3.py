@@ -1,20 +1,177 @@
 import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
 import boto3
+import boto3.session
 from botocore.client import BaseClient
+from botocore.config import Config
 
 from mypy_boto3_s3 import Client
 
-def boto3_client(service_name: str) -> BaseClient | Client:
+# Defaults of the shared clients, can be set in the environment
+_MAX_POOL_CONNECTIONS = int(os.environ.get("S3_MAX_POOL_CONNECTIONS", 32))
+_RETRY_MODE = os.environ.get("S3_RETRY_MODE", "standard")
+_MAX_ATTEMPTS = int(os.environ.get("S3_MAX_ATTEMPTS", 5))
+_CONNECT_TIMEOUT = float(os.environ.get("S3_CONNECT_TIMEOUT", 5))
+_READ_TIMEOUT = float(os.environ.get("S3_READ_TIMEOUT", 60))
+
+
+def default_config() -> Config:
+    """
+        Connection pool size, retries & timeouts every client is created with
+    """
+    return Config(max_pool_connections=_MAX_POOL_CONNECTIONS,
+                  retries={"mode": _RETRY_MODE, "max_attempts": _MAX_ATTEMPTS},
+                  connect_timeout=_CONNECT_TIMEOUT,
+                  read_timeout=_READ_TIMEOUT)
+
+
+class ClientStats:
+    """
+        Counts the calls made by clients, and how long they took, by operation
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ops: dict[str, dict[str, float]] = {}
+
+    def _start(self, context: dict, **kwargs):
+        context["bgs_started"] = time.perf_counter()
+
+    def _record(self, context: dict, event_name: str, failed: bool):
+        started = context.pop("bgs_started", None)
+        if started is None:
+            return
+
+        elapsed = time.perf_counter() - started
+        operation = event_name.rsplit(".", 1)[-1]
+        with self._lock:
+            op = self._ops.setdefault(operation, {"calls": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0})
+            op["calls"] += 1
+            op["errors"] += failed
+            op["seconds"] += elapsed
+            op["max_seconds"] = max(op["max_seconds"], elapsed)
+
+    def _done(self, context: dict, event_name: str, http_response, **kwargs):
+        self._record(context, event_name, failed=http_response.status_code >= 300)
+
+    def _failed(self, context: dict, event_name: str, **kwargs):
+        self._record(context, event_name, failed=True)
+
+    def instrument(self, client: BaseClient):
+        """
+            Counts the calls made by a client from now on
+        """
+        events = client.meta.events
+        events.register("before-call.*.*", self._start)
+        events.register("after-call.*.*", self._done)
+        events.register("after-call-error.*.*", self._failed)
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        """
+            Counters by operation name, e.g.:
+            {"PutObject": {"calls": 12, "errors": 0, "seconds": 0.8, "max_seconds": 0.2}}
+            Errors are calls that raised, retries are included in the time
+            of the call they belong to.
+        """
+        with self._lock:
+            return {operation: dict(op) for operation, op in self._ops.items()}
+
+    def reset(self):
+        with self._lock:
+            self._ops.clear()
+
+
+class ClientManager:
+    """
+        Creates one client per service for the whole process, the first time
+        it is needed. Creating a client resolves credentials and loads service
+        models, which takes milliseconds, while clients are thread-safe and
+        reuse their pooled connections when shared.
+
+        Clients are recreated in forked processes, e.g. gunicorn workers, so
+        they never share connections with their parent.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: dict[str, BaseClient] = {}
+        self._pid = os.getpid()
+        self.stats = ClientStats()
+
+    def get(self, service_name: str) -> BaseClient:
+        """
+            Get the shared client for a service
+        """
+        if self._pid != os.getpid():
+            self._after_fork()
+
+        client = self._clients.get(service_name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(service_name)
+                if client is None:
+                    client = self.create(service_name, default_config())
+                    self._clients[service_name] = client
+
+        return client
+
+    def create(self, service_name: str, config: Config) -> BaseClient:
+        """
+            Create a new client, instrumented by stats.
+            Sessions aren't thread-safe, so each client gets its own.
+        """
+        client = boto3.session.Session().client(
+            service_name,
+            aws_access_key_id=os.environ["AWS_ACCESS_KEY_ID"],
+            aws_secret_access_key=os.environ["AWS_SECRET_ACCESS_KEY"],
+            endpoint_url=os.environ.get("S3_ENDPOINT_URL") or None,
+            config=config)
+        self.stats.instrument(client)
+        return client
+
+    def _after_fork(self):
+        """
+            Drops clients inherited from the parent process, and the lock,
+            which may have been held while forking
+        """
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._pid = os.getpid()
+
+
+_clients = ClientManager()
+os.register_at_fork(after_in_child=_clients._after_fork)
+
+
+def boto3_client(service_name: str, config: Config | None = None) -> BaseClient | Client:
     """
         Get boto3 client with keys from the environment automatically added
+        Set S3_ENDPOINT_URL in the environment to use an s3-compatible
+        stand-in, e.g. a local minio server
+
+        Args:
+            service_name: e.g. "s3"
+            config: optional client configuration, merged over the defaults.
+                Without it, the process-wide shared client is returned, which
+                should be preferred: a new client is created on every call with it.
     """
-    return boto3.client(service_name,
-                        aws_access_key_id=os.environ["AWS_ACCESS_KEY_ID"],
-                        aws_secret_access_key=os.environ["AWS_SECRET_ACCESS_KEY"])
+    if config is None:
+        return _clients.get(service_name)
+
+    return _clients.create(service_name, default_config().merge(config))
 
 def s3_client() -> Client:
     return boto3_client("s3")
 
+def client_stats() -> dict[str, dict[str, float]]:
+    """
+        Calls made by all clients in this process so far, see ClientStats.snapshot
+    """
+    return _clients.stats.snapshot()
+
 _base_url: str = ""
 
 def get_base_url() -> str:
@@ -29,4 +186,92 @@ def get_bucket_name() -> str:
     global _bucket
     if not _bucket:
         _bucket = os.environ["S3_BUCKET"]
-    return _bucket
\ No newline at end of file
+    return _bucket
+
+# Maximum keys per s3 delete_objects request
+DELETE_BATCH_SIZE = 1000
+
+# Number of delete_objects requests in flight at once when deleting a folder
+DELETE_CONCURRENCY = 4
+
+def _delete_batch(s3: Client, bucket: str, keys: list[str]) -> dict[str, str]:
+    """
+        Delete up to DELETE_BATCH_SIZE keys in one request
+
+        Returns:
+            error message by key, for keys that could not be deleted
+    """
+    res = s3.delete_objects(Bucket=bucket, Delete={
+        "Objects": [{"Key": key} for key in keys],
+        "Quiet": True,  # only report errors
+    })
+    return {error["Key"]: f"{error.get('Code')}: {error.get('Message')}"
+            for error in res.get("Errors", [])}
+
+def delete_keys(s3: Client, bucket: str, keys: list[str]) -> dict[str, str]:
+    """
+        Delete many keys, using as few delete_objects requests as possible
+
+        Returns:
+            error message by key, for keys that could not be deleted
+    """
+    errors = {}
+    for i in range(0, len(keys), DELETE_BATCH_SIZE):
+        errors.update(_delete_batch(s3, bucket, keys[i:i + DELETE_BATCH_SIZE]))
+    return errors
+
+def delete_folder_contents(s3: Client, bucket: str, folder_key: str,
+                           delete_folder=True) -> tuple[int, int, dict[str, str]]:
+    """
+        Delete every object under a folder key, however many there are.
+        Pages of the listing are deleted as they arrive, a few pages at a time,
+        each with a single delete_objects request.
+
+        Args:
+            s3: client to delete with
+            bucket: bucket the folder is in
+            folder_key: e.g. "user/1/games/2/"
+            delete_folder: also delete the folder key itself
+
+        Returns:
+            number of objects deleted, their total size in bytes, and the error
+            message by key of objects that could not be deleted
+    """
+    deleted = size = 0
+    errors: dict[str, str] = {}
+    pending: list[tuple[Future, list[dict]]] = []
+
+    def collect(future: Future, batch: list[dict]):
+        nonlocal deleted, size
+        try:
+            failed = future.result()
+        except Exception as e:
+            failed = {obj["Key"]: str(e) for obj in batch}
+
+        errors.update(failed)
+        for obj in batch:
+            if obj["Key"] not in failed:
+                deleted += 1
+                size += obj.get("Size", 0)
+
+    with ThreadPoolExecutor(max_workers=DELETE_CONCURRENCY, thread_name_prefix="delete_folder") as executor:
+        pages = s3.get_paginator("list_objects_v2").paginate(
+            Bucket=bucket, Prefix=folder_key, PaginationConfig={"PageSize": DELETE_BATCH_SIZE})
+
+        for page in pages:
+            batch = [obj for obj in page.get("Contents", [])
+                     if delete_folder or obj["Key"] != folder_key]
+            if not batch:
+                continue
+
+            # bound the batches in flight, so memory use doesn't grow with the folder
+            if len(pending) >= DELETE_CONCURRENCY * 2:
+                collect(*pending.pop(0))
+
+            future = executor.submit(_delete_batch, s3, bucket, [obj["Key"] for obj in batch])
+            pending.append((future, batch))
+
+        for future, batch in pending:
+            collect(future, batch)
+
+    return deleted, size, errors
@@ -0,0 +1,635 @@
+"""
+    Storage backends for uploaded files, selected with the STORAGE_BACKEND setting
+    main_app / util / storage.py
+
+    get_storage    - the backend in use
+    S3Storage      - Amazon S3, or an s3-compatible stand-in (default)
+    LocalStorage   - a folder on the server's disk, served by our own views
+    MemoryStorage  - a dict in memory, for tests & benchmarks without network i/o
+
+    Keys are paths like "user/1/games/2/files/index.html", the same on every backend.
+"""
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import typing
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+import botocore.exceptions
+from django.conf import settings
+
+from .s3 import s3_client, get_base_url, get_bucket_name, delete_keys, delete_folder_contents
+
+# Size of reads when copying files
+_CHUNK_SIZE = 1024 * 1024
+
+# Name prefix of files LocalStorage is still writing
+_TMP_PREFIX = ".uploading-"
+
+# Cache-Control of files whose key changes whenever their contents do,
+# browsers & CDNs can keep them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@dataclass
+class DeleteReport:
+    """
+        What a prefix deletion removed
+    """
+    deleted: int = 0
+    """number of files deleted"""
+    size: int = 0
+    """total size of the deleted files in bytes"""
+    failed: dict[str, str] = field(default_factory=dict)
+    """error message by key, for files that could not be deleted"""
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+    def __repr__(self) -> str:
+        return f"{self.deleted} deleted ({self.size} bytes), {len(self.failed)} failed"
+
+
+@dataclass
+class ListedObject:
+    """
+        A file found by listing a prefix
+    """
+    key: str
+    size: int
+    last_modified: datetime
+
+
+@dataclass
+class ObjectInfo:
+    """
+        What a backend knows about a stored file
+    """
+    size: int
+    content_type: str = "application/octet-stream"
+    content_encoding: str = ""
+    cache_control: str = ""
+
+
+class Storage:
+    """
+        Interface of a storage backend. Implementations must be safe to use
+        from many threads at once.
+    """
+
+    def url(self, key: str) -> str:
+        """
+            Url the file can be downloaded from by browsers
+        """
+        raise NotImplementedError
+
+    def upload(self, file: typing.BinaryIO, key: str,
+               content_type: str = "application/octet-stream", content_encoding: str = "",
+               cache_control: str = ""):
+        """
+            Stores a file, read to the end, replacing any file at the key
+
+            Args:
+                file: readable file, only read() is used
+                key: key to store the file at
+                content_type: mime type to serve the file with
+                content_encoding: e.g. "gzip" if the file is compressed
+                cache_control: Cache-Control to serve the file with, e.g. IMMUTABLE_CACHE_CONTROL
+        """
+        raise NotImplementedError
+
+    def download(self, key: str, file: typing.BinaryIO):
+        """
+            Writes a stored file's contents into a writable file
+        """
+        with self.open(key) as stored:
+            shutil.copyfileobj(stored, file, _CHUNK_SIZE)
+
+    def open(self, key: str) -> typing.BinaryIO:
+        """
+            Opens a stored file for reading. Raises FileNotFoundError if missing.
+        """
+        raise NotImplementedError
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        """
+            Reads part of a stored file, e.g. an image's header
+        """
+        with self.open(key) as stored:
+            stored.seek(start)
+            return stored.read(length)
+
+    def head(self, key: str) -> ObjectInfo | None:
+        """
+            Info of a stored file, or None if it does not exist
+        """
+        raise NotImplementedError
+
+    def list_objects(self, prefix: str) -> typing.Iterator[ListedObject]:
+        """
+            Lists every file whose key starts with prefix.
+            Files are fetched a page at a time as the iterator is consumed,
+            so any number of files can be listed in bounded memory.
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        """
+            Deletes a file, does nothing if it doesn't exist
+        """
+        self.delete_many([key])
+
+    def delete_many(self, keys: list[str]) -> dict[str, str]:
+        """
+            Deletes many files, in as few requests as the backend allows.
+            Keys that don't exist are ignored.
+
+            Returns:
+                error message by key, for files that could not be deleted
+        """
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix: str) -> DeleteReport:
+        """
+            Deletes every file whose key starts with prefix, e.g. a folder
+            key like "user/1/games/2/", however many there are
+        """
+        raise NotImplementedError
+
+    # ----- direct & chunked uploads, see views/api/uploads.py -----
+
+    def presigned_post(self, key: str, max_size: int, expires_in: int = 3600) -> dict:
+        """
+            Creates a target the browser can upload a file to directly with a
+            multipart/form-data POST, without it passing through our server.
+            Raises NotImplementedError if the backend can't receive uploads itself.
+
+            Returns:
+                {"url": ..., "fields": {...}}, the fields must be posted along with
+                the file, which must be the last field in the form
+        """
+        raise NotImplementedError("this storage backend does not support direct uploads")
+
+    def create_multipart_upload(self, key: str) -> str:
+        """
+            Starts assembling a file from parts uploaded separately
+
+            Returns:
+                the upload id
+        """
+        raise NotImplementedError
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, body: typing.BinaryIO,
+                    content_md5: str) -> str:
+        """
+            Stores one part of a multipart upload
+
+            Args:
+                key: key of the file being assembled
+                upload_id: id from create_multipart_upload
+                part_number: 1 to 10000, parts are assembled in this order
+                body: contents of the part
+                content_md5: base64 md5 of the body, checked by backends that can
+
+            Returns:
+                the part's etag, needed to complete the upload
+        """
+        raise NotImplementedError
+
+    def complete_multipart_upload(self, key: str, upload_id: str, etags: list[str]):
+        """
+            Assembles the uploaded parts into the file
+
+            Args:
+                etags: etag of each part, in order
+        """
+        raise NotImplementedError
+
+    def abort_multipart_upload(self, key: str, upload_id: str):
+        """
+            Discards an unfinished multipart upload and the parts stored for it,
+            which would otherwise be kept, and billed on s3, without ever
+            showing up in list_objects. Does nothing if the upload is already gone.
+        """
+        raise NotImplementedError
+
+
+class S3Storage(Storage):
+    """
+        Files stored on Amazon S3, served straight from the bucket
+    """
+
+    def __init__(self, bucket: str = "", base_url: str = ""):
+        self.bucket = bucket or get_bucket_name()
+        self.base_url = base_url or get_base_url()
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}{self.bucket}/{key}"
+
+    def upload(self, file: typing.BinaryIO, key: str,
+               content_type: str = "application/octet-stream", content_encoding: str = "",
+               cache_control: str = ""):
+        extra_args = {"ContentType": content_type}
+        if content_encoding:
+            extra_args["ContentEncoding"] = content_encoding
+        if cache_control:
+            extra_args["CacheControl"] = cache_control
+
+        s3_client().upload_fileobj(file, self.bucket, key, ExtraArgs=extra_args)
+
+    def download(self, key: str, file: typing.BinaryIO):
+        s3_client().download_fileobj(self.bucket, key, file)
+
+    def open(self, key: str) -> typing.BinaryIO:
+        try:
+            return s3_client().get_object(Bucket=self.bucket, Key=key)["Body"]
+        except botocore.exceptions.ClientError as e:
+            if _is_not_found(e):
+                raise FileNotFoundError(key) from e
+            raise
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        res = s3_client().get_object(Bucket=self.bucket, Key=key,
+                                     Range=f"bytes={start}-{start + length - 1}")
+        return res["Body"].read()
+
+    def head(self, key: str) -> ObjectInfo | None:
+        try:
+            header = s3_client().head_object(Bucket=self.bucket, Key=key)
+        except botocore.exceptions.ClientError as e:
+            if _is_not_found(e):
+                return None
+            raise
+
+        return ObjectInfo(size=header["ContentLength"],
+                          content_type=header.get("ContentType", "application/octet-stream"),
+                          content_encoding=header.get("ContentEncoding", ""),
+                          cache_control=header.get("CacheControl", ""))
+
+    def list_objects(self, prefix: str) -> typing.Iterator[ListedObject]:
+        pages = s3_client().get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=prefix)
+        for page in pages:
+            for obj in page.get("Contents", []):
+                yield ListedObject(obj["Key"], obj["Size"], obj["LastModified"])
+
+    def delete(self, key: str):
+        s3_client().delete_object(Bucket=self.bucket, Key=key)
+
+    def delete_many(self, keys: list[str]) -> dict[str, str]:
+        return delete_keys(s3_client(), self.bucket, keys)
+
+    def delete_prefix(self, prefix: str) -> DeleteReport:
+        deleted, size, failed = delete_folder_contents(s3_client(), self.bucket, prefix)
+        return DeleteReport(deleted, size, failed)
+
+    def presigned_post(self, key: str, max_size: int, expires_in: int = 3600) -> dict:
+        return s3_client().generate_presigned_post(
+            self.bucket, key,
+            Conditions=[["content-length-range", 1, max_size]],
+            ExpiresIn=expires_in)
+
+    def create_multipart_upload(self, key: str) -> str:
+        return s3_client().create_multipart_upload(Bucket=self.bucket, Key=key)["UploadId"]
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, body: typing.BinaryIO,
+                    content_md5: str) -> str:
+        return s3_client().upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                       PartNumber=part_number, Body=body,
+                                       ContentMD5=content_md5)["ETag"]
+
+    def complete_multipart_upload(self, key: str, upload_id: str, etags: list[str]):
+        s3_client().complete_multipart_upload(
+            Bucket=self.bucket, Key=key, UploadId=upload_id,
+            MultipartUpload={"Parts": [{"PartNumber": i + 1, "ETag": etag}
+                                       for i, etag in enumerate(etags)]})
+
+    def abort_multipart_upload(self, key: str, upload_id: str):
+        try:
+            s3_client().abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+        except botocore.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "NoSuchUpload":
+                raise
+
+
+def _is_not_found(e: botocore.exceptions.ClientError) -> bool:
+    return e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+
+class MemoryStorage(Storage):
+    """
+        Files kept in a dict, lost when the process exits.
+        Served by views/storage.py, like LocalStorage.
+    """
+
+    def __init__(self, base_url: str = "/storage/"):
+        self.base_url = base_url
+        self._lock = threading.Lock()
+        self._files: dict[str, tuple[bytes, ObjectInfo, datetime]] = {}
+        self._uploads: dict[str, dict[int, bytes]] = {}
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}{key}"
+
+    def upload(self, file: typing.BinaryIO, key: str,
+               content_type: str = "application/octet-stream", content_encoding: str = "",
+               cache_control: str = ""):
+        data = file.read()
+        with self._lock:
+            self._files[key] = (data, ObjectInfo(len(data), content_type, content_encoding, cache_control),
+                                datetime.now(timezone.utc))
+
+    def open(self, key: str) -> typing.BinaryIO:
+        with self._lock:
+            if key not in self._files:
+                raise FileNotFoundError(key)
+            return io.BytesIO(self._files[key][0])
+
+    def head(self, key: str) -> ObjectInfo | None:
+        with self._lock:
+            stored = self._files.get(key)
+        return stored[1] if stored else None
+
+    def list_objects(self, prefix: str) -> typing.Iterator[ListedObject]:
+        with self._lock:
+            listed = [ListedObject(key, info.size, modified)
+                      for key, (_, info, modified) in self._files.items() if key.startswith(prefix)]
+        return iter(sorted(listed, key=lambda obj: obj.key))
+
+    def delete_many(self, keys: list[str]) -> dict[str, str]:
+        with self._lock:
+            for key in keys:
+                self._files.pop(key, None)
+        return {}
+
+    def delete_prefix(self, prefix: str) -> DeleteReport:
+        report = DeleteReport()
+        with self._lock:
+            for key in [key for key in self._files if key.startswith(prefix)]:
+                report.deleted += 1
+                report.size += self._files.pop(key)[1].size
+        return report
+
+    def keys(self) -> list[str]:
+        """
+            Every stored key, sorted
+        """
+        with self._lock:
+            return sorted(self._files)
+
+    def create_multipart_upload(self, key: str) -> str:
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = {}
+        return upload_id
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, body: typing.BinaryIO,
+                    content_md5: str) -> str:
+        data = body.read()
+        with self._lock:
+            self._uploads[upload_id][part_number] = data
+        return str(part_number)
+
+    def complete_multipart_upload(self, key: str, upload_id: str, etags: list[str]):
+        with self._lock:
+            parts = self._uploads.pop(upload_id)
+        data = b"".join(parts[i + 1] for i in range(len(etags)))
+        with self._lock:
+            self._files[key] = (data, ObjectInfo(len(data)), datetime.now(timezone.utc))
+
+    def abort_multipart_upload(self, key: str, upload_id: str):
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+
+
+class LocalStorage(Storage):
+    """
+        Files stored in a folder on the server's disk, served by views/storage.py.
+        For development, load tests, and small deployments on a single server.
+
+        Layout of the root folder:
+            files/<key>                  contents
+            meta/<key>.json              content type, encoding & cache control
+            uploads/<upload id>/<part>   parts of unfinished multipart uploads
+    """
+
+    def __init__(self, root: str | Path, base_url: str = "/storage/"):
+        self.root = Path(root).resolve()
+        self.base_url = base_url
+
+    def _path(self, folder: str, key: str, suffix: str = "") -> Path:
+        """
+            Path of a key inside one of the root's folders, refusing keys that
+            would escape it, e.g. "../settings.py"
+        """
+        base = self.root / folder
+        path = (base / (key + suffix)).resolve()
+        if not path.is_relative_to(base):
+            raise ValueError(f"invalid storage key: {key}")
+        return path
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}{key}"
+
+    def upload(self, file: typing.BinaryIO, key: str,
+               content_type: str = "application/octet-stream", content_encoding: str = "",
+               cache_control: str = ""):
+        if key.endswith("/"):
+            return  # folder keys only exist implicitly on disk
+
+        path = self._path("files", key)
+        meta = self._path("meta", key, ".json")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta.parent.mkdir(parents=True, exist_ok=True)
+
+        # write next to the destination, then swap it in, so readers never see a partial file
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=_TMP_PREFIX, delete=False) as tmp:
+            try:
+                shutil.copyfileobj(file, tmp, _CHUNK_SIZE)
+            except Exception:
+                os.unlink(tmp.name)
+                raise
+        meta.write_text(json.dumps({"content_type": content_type,
+                                    "content_encoding": content_encoding,
+                                    "cache_control": cache_control}))
+        os.replace(tmp.name, path)
+
+    def open(self, key: str) -> typing.BinaryIO:
+        return open(self._path("files", key), "rb")
+
+    def head(self, key: str) -> ObjectInfo | None:
+        path = self._path("files", key)
+        try:
+            size = path.stat().st_size
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        if not path.is_file():
+            return None
+
+        try:
+            meta = json.loads(self._path("meta", key, ".json").read_text())
+        except FileNotFoundError:
+            meta = {}
+
+        return ObjectInfo(size=size, **meta)
+
+    def list_objects(self, prefix: str) -> typing.Iterator[ListedObject]:
+        base = self.root / "files"
+        folder = self._path("files", prefix)
+        if not prefix.endswith("/"):
+            folder = folder.parent
+
+        def walk(path: Path):
+            # one folder at a time, so memory use depends on the widest folder only
+            try:
+                entries = sorted(path.iterdir(), key=lambda entry: entry.name)
+            except (FileNotFoundError, NotADirectoryError):
+                return
+            for entry in entries:
+                if entry.is_dir():
+                    yield from walk(entry)
+                elif entry.is_file() and not entry.name.startswith(_TMP_PREFIX):
+                    key = entry.relative_to(base).as_posix()
+                    if key.startswith(prefix):
+                        stat = entry.stat()
+                        yield ListedObject(key, stat.st_size,
+                                           datetime.fromtimestamp(stat.st_mtime, timezone.utc))
+
+        return walk(folder)
+
+    def delete_many(self, keys: list[str]) -> dict[str, str]:
+        errors = {}
+        for key in keys:
+            try:
+                for path in (self._path("files", key), self._path("meta", key, ".json")):
+                    if path.is_file():
+                        path.unlink(missing_ok=True)
+            except (OSError, ValueError) as e:
+                errors[key] = str(e)
+        return errors
+
+    def delete_prefix(self, prefix: str) -> DeleteReport:
+        report = DeleteReport()
+        base = self.root / "files"
+
+        # only walk the folder the prefix is in
+        folder = self._path("files", prefix)
+        if not prefix.endswith("/"):
+            folder = folder.parent
+        if not folder.is_dir():
+            return report
+
+        for path in list(folder.rglob("*")):
+            key = path.relative_to(base).as_posix()
+            if not path.is_file() or not key.startswith(prefix):
+                continue
+
+            size = path.stat().st_size
+            failed = self.delete_many([key])
+            if failed:
+                report.failed.update(failed)
+            else:
+                report.deleted += 1
+                report.size += size
+
+        if prefix.endswith("/") and report.ok:
+            # drop the emptied folders
+            shutil.rmtree(folder, ignore_errors=True)
+            shutil.rmtree(self._path("meta", prefix), ignore_errors=True)
+
+        return report
+
+    def create_multipart_upload(self, key: str) -> str:
+        upload_id = uuid.uuid4().hex
+        self._path("uploads", upload_id).mkdir(parents=True)
+        return upload_id
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, body: typing.BinaryIO,
+                    content_md5: str) -> str:
+        folder = self._path("uploads", upload_id)
+        if not folder.is_dir():
+            raise FileNotFoundError(f"no multipart upload: {upload_id}")
+
+        with tempfile.NamedTemporaryFile(dir=folder, delete=False) as tmp:
+            shutil.copyfileobj(body, tmp, _CHUNK_SIZE)
+        os.replace(tmp.name, folder / str(part_number))
+        return str(part_number)
+
+    def complete_multipart_upload(self, key: str, upload_id: str, etags: list[str]):
+        folder = self._path("uploads", upload_id)
+
+        class _Parts(io.RawIOBase):
+            """Reads the parts one after the other, as a single file"""
+            def __init__(self):
+                self.parts = iter(folder / str(i + 1) for i in range(len(etags)))
+                self.current = None
+
+            def readable(self):
+                return True
+
+            def readinto(self, buffer):
+                while True:
+                    if self.current is None:
+                        path = next(self.parts, None)
+                        if path is None:
+                            return 0
+                        self.current = open(path, "rb")
+                    n = self.current.readinto(buffer)
+                    if n:
+                        return n
+                    self.current.close()
+                    self.current = None
+
+        self.upload(io.BufferedReader(_Parts(), _CHUNK_SIZE), key)
+        shutil.rmtree(folder, ignore_errors=True)
+
+    def abort_multipart_upload(self, key: str, upload_id: str):
+        shutil.rmtree(self._path("uploads", upload_id), ignore_errors=True)
+
+
+_storage: Storage | None = None
+_storage_lock = threading.Lock()
+
+
+def create_storage(backend: str) -> Storage:
+    """
+        Creates a storage backend by name: "s3", "local" or "memory"
+    """
+    match backend:
+        case "s3":
+            return S3Storage()
+        case "local":
+            return LocalStorage(settings.STORAGE_ROOT, settings.STORAGE_URL)
+        case "memory":
+            return MemoryStorage(settings.STORAGE_URL)
+        case _:
+            raise ValueError(f"unknown STORAGE_BACKEND: {backend}")
+
+
+def get_storage() -> Storage:
+    """
+        The storage backend selected by the STORAGE_BACKEND setting,
+        created the first time it is needed and shared by the whole process
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage(settings.STORAGE_BACKEND)
+    return _storage
+
+
+def set_storage(storage: Storage | None):
+    """
+        Replaces the storage backend in use, e.g. with a MemoryStorage in tests.
+        None goes back to the one selected by settings.
+    """
+    global _storage
+    with _storage_lock:
+        _storage = storage
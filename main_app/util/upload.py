@@ -0,0 +1,224 @@
+"""
+    Concurrent uploading of many files to storage
+    main_app / util / upload.py
+
+    BatchUploader - uploads files on a bounded thread pool, stopping at the first failure
+"""
+import hashlib
+import threading
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from .compress import precompress, should_precompress
+from .storage import Storage, get_storage
+
+
+class HashingReader:
+    """
+        Wraps a readable file, computing the sha256 & size of everything read through it
+    """
+
+    def __init__(self, file: typing.BinaryIO):
+        self.file = file
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        """
+            number of bytes read so far
+        """
+
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.file.read(size)
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+
+    def hexdigest(self) -> str:
+        return self.sha256.hexdigest()
+
+
+class UploadResult:
+    """
+        Outcome of a batch of uploads
+    """
+
+    def __init__(self):
+        self.uploaded: list[str] = []
+        """
+            keys that were uploaded successfully
+        """
+
+        self.hashes: dict[str, str] = {}
+        """
+            sha256 hex digest of the contents of each uploaded key
+        """
+
+        self.failed: dict[str, Exception] = {}
+        """
+            keys that failed to upload, with the error for each one
+        """
+
+        self.overwritten: list[str] = []
+        """
+            uploaded keys that existed before the batch, kept on rollback
+            with their new contents
+        """
+
+        self.rolled_back = False
+        """
+            whether keys new to storage were deleted again because of a failure
+        """
+
+        self.errors: dict[str, str] = {}
+        """
+            keys that could not be deleted when rolling back, with the error
+            message for each one. They are left in storage.
+        """
+
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+
+    def __repr__(self) -> str:
+        return (f"{len(self.uploaded)} uploaded, {len(self.failed)} failed" +
+                (", rolled back" if self.rolled_back else "") +
+                (f", {len(self.errors)} not rolled back" if self.errors else ""))
+
+
+class BatchUploader:
+    """
+        Uploads many files to storage concurrently.
+
+        On s3, all uploads share the process-wide client and its connection
+        pool, keep max_workers within S3_MAX_POOL_CONNECTIONS. The number of
+        files opened or waiting to be uploaded is bounded, so `submit` blocks
+        when the workers fall behind.
+
+        Once an upload fails, files still waiting are skipped, and `wait`
+        deletes the keys this batch added to storage. Keys that existed before
+        the batch, see `existing_keys`, are never deleted: the ones already
+        overwritten keep their new contents, listed in the result's
+        `overwritten`, and the others keep their old contents.
+
+        Usage:
+            uploader = BatchUploader()
+            for key, info in ...:
+                uploader.submit(key, partial(open_file, info), content_type)
+            result = uploader.wait()
+    """
+
+    def __init__(self, max_workers: int = 8, storage: Storage | None = None, precompress: str = "",
+                 existing_keys: typing.Collection[str] = ()):
+        """
+            Args:
+                max_workers: number of uploads to run at the same time
+                storage: storage to upload to, defaults to the one selected in the settings
+                precompress: Content-Encoding to compress files that compress well
+                    with, "gzip" or "br"; left blank, files are uploaded as-is
+                existing_keys: keys already in storage, never deleted on rollback
+        """
+        self.storage = storage or get_storage()
+        self.precompress = precompress
+        self.existing_keys = set(existing_keys)
+        self.result = UploadResult()
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="BatchUploader")
+        self._slots = threading.BoundedSemaphore(max_workers * 2)
+        self._lock = threading.Lock()
+        self._futures = []
+
+
+    def submit(self, key: str, open_file: typing.Callable[[], typing.BinaryIO],
+               content_type: str = "application/octet-stream", content_encoding: str = ""):
+        """
+            Queue a file for upload. Blocks while too many files are waiting.
+
+            Args:
+                key: key to upload the file to
+                open_file: opens the file to upload; called on a worker thread
+                    right before uploading, and the file is closed afterward
+                content_type: mime type to store with the file
+                content_encoding: set if the file is already compressed, it
+                    won't be precompressed again
+        """
+        if self.result.failed:
+            return  # batch has already failed, don't bother
+
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._upload, key, open_file, content_type,
+                                           content_encoding)
+        except Exception:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+
+    def wait(self) -> UploadResult:
+        """
+            Wait for all uploads to finish. If any failed, delete the ones
+            that succeeded, except for keys that existed before the batch.
+
+            Returns:
+                the result of the batch
+        """
+        for future in self._futures:
+            future.result()
+        self._executor.shutdown()
+
+        if self.result.failed and self.result.uploaded:
+            self._rollback()
+
+        return self.result
+
+
+    def _upload(self, key: str, open_file: typing.Callable[[], typing.BinaryIO],
+                content_type: str, content_encoding: str):
+        """
+            Runs on a worker thread, records the outcome instead of raising
+        """
+        if self.result.failed:
+            return  # skip, batch has already failed
+
+        try:
+            with ExitStack() as stack:
+                # hash the original contents, before any compression
+                reader = HashingReader(stack.enter_context(open_file()))
+                body = reader
+
+                if not content_encoding and self.precompress and should_precompress(key):
+                    body, content_encoding = precompress(reader, self.precompress)
+                    stack.enter_context(body)
+
+                self.storage.upload(body, key, content_type=content_type,
+                                    content_encoding=content_encoding or "")
+        except Exception as e:
+            with self._lock:
+                self.result.failed[key] = e
+        else:
+            with self._lock:
+                self.result.uploaded.append(key)
+                self.result.hashes[key] = reader.hexdigest()
+
+
+    def _rollback(self):
+        """
+            Delete the keys this batch added to storage, deleting overwritten
+            ones would lose their previous contents too. Keys that could not be
+            deleted are recorded in the result's errors, for the caller to report.
+        """
+        self.result.overwritten = [key for key in self.result.uploaded if key in self.existing_keys]
+        added = [key for key in self.result.uploaded if key not in self.existing_keys]
+        try:
+            self.result.errors = self.storage.delete_many(added) if added else {}
+        except Exception as e:
+            self.result.errors = {key: str(e) for key in added}
+
+        self.result.rolled_back = not self.result.errors
@@ -1,24 +1,35 @@
 import typing
-from zipfile import ZipFile
+from zipfile import ZipFile, ZipInfo
 from pathlib import PurePath
 import re
 
 # Regex pattern-matching for undesired files in zip
 _IGNORE_LIST = [
-    ".*\.DS_Store",
-    "Thumbs.db",
-    "ehthumbs.*\.db",
+    r".*\.DS_Store",
+    r"Thumbs.db",
+    r"ehthumbs.*\.db",
 ]
 
+# Size of reads when draining a member to finish its CRC check
+_CHUNK_SIZE = 64 * 1024
+
 class BgsZipfile:
     """
         Zip file utility class
+
+        Members are not decompressed or opened when the archive is opened.
+        Use `stream()` to visit them one at a time; each member's CRC is
+        verified as its bytes are read, so only one decompressor is alive
+        at any moment, no matter how many files are in the bundle.
     """
 
 
     def __init__(self, bytes_or_path=None):
         self.file: ZipFile|None = None
-        self.files: list[typing.BinaryIO] = []
+        self.files: list[ZipInfo] = []
+        """
+            entries for the files to ingest: no folders or system files
+        """
 
         if bytes_or_path:
             self.open(bytes_or_path)
@@ -33,7 +44,8 @@ class BgsZipfile:
 
     def open(self, bytes_or_path):
         """
-            Open a zipfile
+            Open a zipfile. Only reads the central directory, member contents
+            are checked later while streaming.
 
             Args:
                 bytes_or_path: a buffer or path to a file
@@ -52,18 +64,13 @@ class BgsZipfile:
 
 
         try:
-            # test for bad files
-            result = file.testzip()
-            if result is not None:
-                print(f"BgsZipFile: bad file in zip: {result}")
-                file.close()
-                return False
+            # get file entries inside zip
+            files = self.__get_files(file)
 
             # clean up old file, if any
             self.close()
 
-            # get files inside zip
-            self.files = self.__get_files(file)
+            self.files = files
             self.file = file
 
         except Exception as e:
@@ -91,8 +98,6 @@ class BgsZipfile:
         # handle & report all exceptions, should not throw
         try:
             if self.is_open():
-                for file in self.files:
-                    file.close()
                 self.files.clear()
 
                 self.file.close()
@@ -101,17 +106,57 @@ class BgsZipfile:
         except Exception as e:
             print("BgsZipfile: exception occured during close(): ", e)
 
+
+    def stream(self) -> typing.Iterator[typing.BinaryIO]:
+        """
+            Yields each file in the zip one at a time, opened for reading.
+            The previous file is closed before the next one is opened.
+
+            Whatever the consumer leaves unread is drained when it asks for
+            the next file, so every member gets its CRC checked exactly once.
+
+            Raises:
+                zipfile.BadZipFile: a member failed its CRC check
+        """
+        for info in self.files:
+            with self.file.open(info, "r") as member:
+                yield member
+
+                # finish reading so the CRC check runs at end of stream
+                while member.read(_CHUNK_SIZE):
+                    pass
+
+
+    def open_member(self, info: ZipInfo) -> typing.BinaryIO:
+        """
+            Opens a single file in the zip for reading.
+            The CRC is checked once the returned file is read to the end.
+            Safe to call from multiple threads, the archive's file handle
+            is shared behind a lock by `ZipFile`.
+        """
+        return self.file.open(info, "r")
+
+
+    @staticmethod
+    def member_path(info: ZipInfo) -> PurePath:
+        """
+            Path of a file relative to the zip's root folder
+        """
+        path = PurePath(info.filename)
+        return PurePath(*path.parts[1:])
+
+
     @staticmethod
-    def __get_files(zip_file: ZipFile):
+    def __get_files(zip_file: ZipFile) -> list[ZipInfo]:
         """
-            Get the individual files from a zip_file
+            Get the entries for the individual files from a zip_file
 
-            Returns: array of file objects
+            Returns: array of zip entries
         """
         path = PurePath(zip_file.filename)
         files = []
 
-        for info in zip_file.filelist:
+        for info in zip_file.infolist():
             filepath = PurePath(info.filename)
 
             # get correct files: no folders or system files
@@ -121,6 +166,6 @@ class BgsZipfile:
                 for match in _IGNORE_LIST
                 if re.search(match, info.filename)
             ]):
-                files.append(zip_file.open(info.filename, "r"))
+                files.append(info)
 
         return files
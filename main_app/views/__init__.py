@@ -4,4 +4,5 @@ from . import profile
 from . import accounts
 from . import reviews
 from . import screenshots
+from . import storage
 from . import api
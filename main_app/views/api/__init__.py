@@ -1,3 +1,6 @@
 from . import color_mode
 from . import favorite
+from . import games
+from . import screenshots
 from . import search
+from . import uploads
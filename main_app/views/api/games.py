@@ -0,0 +1,40 @@
+"""
+    Game listing api views. All functions return JSON data.
+    The listing itself is done in main_app/listings.py, shared with the html views.
+
+    page - a page of popular games or search results, for infinite scrolling
+"""
+from django.http import HttpRequest, JsonResponse
+from django.template.loader import render_to_string
+
+from ... import listings
+from ...math import clamp
+
+
+def page(request: HttpRequest) -> JsonResponse:
+    """
+        Finds the next page of the games listing, after a cursor, see listings.game_page
+        Returns the games' ids, their cards rendered like on the listing page,
+        and the cursor of the page after, null on the last page
+
+        url:   api/games/
+        query: q=search+terms+here, cursor=<from the previous page>, limit=<1-100>
+        name:  "games_api_page"
+    """
+    q = request.GET.get("q", "")
+    cursor = request.GET.get("cursor", None)
+    try:
+        limit = clamp(int(request.GET.get("limit", listings.PAGE_SIZE)), 1, listings.MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({"error": "invalid limit"}, status=400)
+
+    try:
+        games, next_cursor = listings.game_page(q, cursor, limit)
+    except ValueError:
+        return JsonResponse({"error": "invalid cursor"}, status=400)
+
+    return JsonResponse({
+        "games": [game.id for game in games],
+        "html": render_to_string("games/include/game_list.html", {"games": games}, request),
+        "next": next_cursor,
+    })
@@ -0,0 +1,139 @@
+"""
+    Screenshot gallery api views, for a game's creator to manage its
+    screenshots. All functions return JSON data.
+
+    add     - uploads any number of screenshots to the end of the gallery
+    reorder - puts the gallery in a new order, without re-uploading anything
+    cover   - picks the screenshot shown for the game in listings
+    delete  - deletes a screenshot
+"""
+from django.contrib.auth.decorators import login_required
+from django.http import HttpRequest, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_POST
+
+from ...models import Game, Screenshot, UploadSession
+from ...models.helpers import (add_screenshots, delete_screenshot, reorder_screenshots,
+                               set_cover_screenshot)
+from .uploads import MAX_SIZES
+
+# Most screenshots accepted in one request
+MAX_SCREENSHOTS = 20
+
+
+def _get_own_game(request: HttpRequest, game_id: int) -> Game | JsonResponse:
+    """
+        The game of the url, if the user may edit it
+
+        Returns:
+            the game, or an error response
+    """
+    game = get_object_or_404(Game, id=game_id)
+    if game.user_id != request.user.id and not request.user.is_staff:
+        return JsonResponse({"error": "not allowed"}, status=403)
+
+    return game
+
+
+def _gallery(game: Game) -> dict:
+    """
+        JSON description of a game's gallery, in order
+    """
+    game.refresh_from_db(fields=["cover"])
+    return {
+        "cover": game.cover_id,
+        "screenshots": [{"id": screenshot.id, "order": screenshot.order, "url": screenshot.file.url()}
+                        for screenshot in game.screenshot_set.select_related("file")],
+    }
+
+
+@login_required
+@require_POST
+def add(request: HttpRequest, game_id: int) -> JsonResponse:
+    """
+        Uploads screenshots to the end of a game's gallery, all at once
+
+        url:   api/games/<int:game_id>/screenshots/
+        form:  screenshots=<image files>, in gallery order
+        name:  "screenshots_api_add"
+    """
+    game = _get_own_game(request, game_id)
+    if isinstance(game, JsonResponse):
+        return game
+
+    uploaded_files = request.FILES.getlist("screenshots")
+    if not uploaded_files:
+        return JsonResponse({"error": "missing screenshots"}, status=400)
+    if len(uploaded_files) > MAX_SCREENSHOTS:
+        return JsonResponse({"error": f"at most {MAX_SCREENSHOTS} screenshots at a time"}, status=400)
+    if any(uploaded_file.size > MAX_SIZES[UploadSession.Kind.SCREENSHOT] for uploaded_file in uploaded_files):
+        return JsonResponse({"error": "screenshot too large"}, status=400)
+
+    screenshots = add_screenshots(uploaded_files, game)
+    if len(screenshots) < len(uploaded_files):
+        return JsonResponse({"error": "some screenshots failed to upload", **_gallery(game)}, status=500)
+
+    return JsonResponse(_gallery(game))
+
+
+@login_required
+@require_POST
+def reorder(request: HttpRequest, game_id: int) -> JsonResponse:
+    """
+        Puts a game's gallery in a new order
+
+        url:   api/games/<int:game_id>/screenshots/order/
+        form:  ids=<comma-separated ids of all the game's screenshots, in their new order>
+        name:  "screenshots_api_reorder"
+    """
+    game = _get_own_game(request, game_id)
+    if isinstance(game, JsonResponse):
+        return game
+
+    try:
+        screenshot_ids = [int(screenshot_id) for screenshot_id in request.POST.get("ids", "").split(",")]
+    except ValueError:
+        return JsonResponse({"error": "invalid ids"}, status=400)
+
+    if not reorder_screenshots(game, screenshot_ids):
+        return JsonResponse({"error": "ids must be all of the game's screenshots"}, status=400)
+
+    return JsonResponse(_gallery(game))
+
+
+@login_required
+@require_POST
+def cover(request: HttpRequest, game_id: int, screenshot_id: int) -> JsonResponse:
+    """
+        Makes a screenshot its game's cover
+
+        url:   api/games/<int:game_id>/screenshots/<int:screenshot_id>/cover/
+        name:  "screenshots_api_cover"
+    """
+    game = _get_own_game(request, game_id)
+    if isinstance(game, JsonResponse):
+        return game
+
+    if not set_cover_screenshot(game, screenshot_id):
+        return JsonResponse({"error": "not a screenshot of this game"}, status=404)
+
+    return JsonResponse(_gallery(game))
+
+
+@login_required
+@require_POST
+def delete(request: HttpRequest, game_id: int, screenshot_id: int) -> JsonResponse:
+    """
+        Deletes a screenshot from a game's gallery
+
+        url:   api/games/<int:game_id>/screenshots/<int:screenshot_id>/delete/
+        name:  "screenshots_api_delete"
+    """
+    game = _get_own_game(request, game_id)
+    if isinstance(game, JsonResponse):
+        return game
+
+    screenshot = get_object_or_404(Screenshot, id=screenshot_id, game=game)
+    delete_screenshot(screenshot)
+
+    return JsonResponse(_gallery(game))
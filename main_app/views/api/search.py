@@ -1,76 +1,55 @@
 """
     Search api views for games and tags. All functions return JSON data.
+    The searching itself is done in main_app/search.py, shared with the html views.
 
     top_tags     - find tags in order of most-used to least-used
     search_games - find games taking tags, game title, username into account
 """
-from django.contrib.auth.models import User
-from django.db.models import Count
 from django.http import HttpRequest, HttpResponse, JsonResponse
-from django.utils.text import slugify
 
+from ... import search
 from ...math import clamp
-from ...models import Game, Tag
+from ...util.cursor import decode_cursor, encode_cursor
 
 def top_tags(request: HttpRequest) -> HttpResponse:
     """
         Finds tags from a query, from most-used to least-used
-        Currently grabs the top 8
+        Grabs the top 8 by default
+
+        query: q=search+terms+here, limit=<1-500>
     """
     q = request.GET.get("q", "")
-    limit = clamp(request.GET.get("limit", 8), 1, 500)
-
-    tokens: list[str] = [slugify(token.lower()) for token in q.split(" ")]
-
-    token = tokens[-1]
-
-    tags = [tag["text"] for tag in Tag.objects.filter(text__icontains=token).annotate(count=Count("game")).order_by("-count")[:limit].values() if tag["count"] > 0]
+    try:
+        limit = clamp(int(request.GET.get("limit", 8)), 1, 500)
+    except ValueError:
+        return JsonResponse({"error": "invalid limit"}, status=400)
 
-    return JsonResponse({"tags": tags})
+    return JsonResponse({"tags": search.top_tags(q, limit)})
 
 def search_games(request: HttpRequest) -> HttpResponse:
     """
-        Finds games from a query, based on a point system:
-        Level of significance from most to least:
-            - game tags
-            - game title
-            - creator's username
-    """
-    params = request.GET
-    q = params.get("q", "")
-
-    tokens: list[str] = [slugify(token.lower()) for token in q.split(" ")]
-
-    filtered_tags = Tag.objects.none()
-    filtered_games = Game.objects.none()
-    filtered_users = User.objects.none()
+        Finds games from a query, most relevant first, see search.search_game_scores
+        Grabs the top 100 by default, and the cursor of the next results, null if none
 
-    for token in tokens:
-        filtered_tags |= Tag.objects.filter(text__icontains=token)
-        filtered_games |= Game.objects.filter(title__icontains=token)
-        filtered_users |= User.objects.filter(username__icontains=token)
-
-    game_ids = {}
-    for tag in filtered_tags:
-        for game in tag.game_set.filter(is_published=True):
-            if not game.id in game_ids:
-                game_ids[game.id] = 1
-            else:
-                game_ids[game.id] += 1
-
-    for game in filtered_games.filter(is_published=True):
-        if not game.id in game_ids:
-            game_ids[game.id] = .5
-        else:
-            game_ids[game.id] += .5
-
-    for user in filtered_users:
-        for game in user.game_set.filter(is_published=True):
-            if not game.id in game_ids:
-                game_ids[game.id] = .15
-            else:
-                game_ids[game.id] += .15
-
-    game_ids = [key for key, value in sorted(game_ids.items(), key=lambda k: k[1], reverse=True)]
-
-    return JsonResponse({"games": game_ids})
+        query: q=search+terms+here, limit=<1-500>, cursor=<from the previous results>
+    """
+    q = request.GET.get("q", "")
+    try:
+        limit = clamp(int(request.GET.get("limit", search.SEARCH_LIMIT)), 1, 500)
+    except ValueError:
+        return JsonResponse({"error": "invalid limit"}, status=400)
+
+    cursor = request.GET.get("cursor", None)
+    after = decode_cursor(cursor, (float, int)) if cursor else None
+    if cursor and after is None:
+        return JsonResponse({"error": "invalid cursor"}, status=400)
+
+    # one more than asked for, to tell if there are more
+    scores = search.search_game_scores(q, limit + 1, after)
+    next_cursor = None
+    if len(scores) > limit:
+        scores = scores[:limit]
+        game_id, score = scores[-1]
+        next_cursor = encode_cursor((score, game_id))
+
+    return JsonResponse({"games": [game_id for game_id, _ in scores], "next": next_cursor})
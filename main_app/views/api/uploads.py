@@ -0,0 +1,375 @@
+"""
+    Upload session api views, for uploading files straight from the browser
+    to s3 without passing through our server. All functions return JSON data.
+    Direct uploads need s3, with other storage backends `create` fails and
+    the browser uploads files with the form instead.
+
+    create         - starts a session, returns a presigned target to POST the file to
+    create_chunked - starts a session for a file uploaded in chunks through our server
+    status         - shows which chunks have been received, to resume an upload
+    upload_chunk   - receives one chunk
+    complete       - marks the file as uploaded, and queues its processing if the
+                     session belongs to a game
+    cancel         - discards a session & what was uploaded for it
+
+    Flow:
+        1. POST api/uploads/ with kind ("bundle" or "screenshot"), filename,
+           and game_id if the game already exists
+        2. POST the file to the returned url, with the returned fields
+        3. POST api/uploads/<id>/complete/
+        4. For a new game, submit the game form with the session id in
+           "zip_upload_session" / "screenshot_session"
+
+    Chunked flow, for large files:
+        1. POST api/uploads/chunked/ with kind, filename, size, and game_id
+           if the game already exists. Returns the chunk size & count.
+        2. PUT each chunk's bytes to api/uploads/<id>/chunks/<index>/, with
+           the chunk's sha256 hex digest in the X-Chunk-SHA256 header.
+           Chunks may be sent in any order, and resent if they fail.
+        3. To resume after a dropped connection, GET api/uploads/<id>/ to
+           find the chunks that were received, and send the rest.
+        4. POST api/uploads/<id>/complete/ assembles the chunks in storage, then
+           continues like step 3 & 4 above. Completing again, e.g. on a retry,
+           succeeds without assembling the file twice.
+
+    Sessions can be cancelled until their file is queued for processing,
+    POST api/uploads/<id>/cancel/. Sessions left unused are discarded by the
+    worker after a day, see jobs.expire_upload_sessions.
+"""
+import base64
+import hashlib
+import tempfile
+import uuid
+from pathlib import PurePath
+
+from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import HttpRequest, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_POST, require_GET, require_http_methods
+
+from ... import jobs
+from ...models import Game, UploadSession
+from ...util.storage import get_storage
+
+# Largest file accepted per kind of upload, in bytes
+MAX_SIZES = {
+    UploadSession.Kind.BUNDLE: 1024 * 1024 * 1024,
+    UploadSession.Kind.SCREENSHOT: 10 * 1024 * 1024,
+}
+
+# Size of each chunk of a chunked upload, s3 needs parts of at least 5MB
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# Size of reads from the request while receiving a chunk
+_READ_SIZE = 64 * 1024
+
+# Chunks are buffered in memory up to this size, then spooled to disk
+_SPOOL_SIZE = 1024 * 1024
+
+
+def queue_upload_session(session: UploadSession) -> bool:
+    """
+        Queues processing of a session's file, if it has been uploaded and
+        the session belongs to a game. Only ever queues a session once.
+
+        Returns:
+            True if processing was queued by this call
+    """
+    if session.game_id is None or session.status != UploadSession.Status.UPLOADED:
+        return False
+
+    # claim the session, in case the form and the browser race to queue it
+    claimed = UploadSession.objects.filter(
+        id=session.id, status=UploadSession.Status.UPLOADED).update(status=UploadSession.Status.QUEUED)
+    if not claimed:
+        return False
+    session.status = UploadSession.Status.QUEUED
+
+    if session.kind == UploadSession.Kind.BUNDLE:
+        jobs.queue_bundle(session.game, session.key, session.filename)
+    else:
+        jobs.queue_screenshot(session.game, session.key, session.filename)
+
+    return True
+
+
+def claim_upload_session(session_id, user_id: int, game: Game, kind: str) -> UploadSession | None:
+    """
+        Attaches a session started from a game form to the game, and queues
+        its processing if the file has already been uploaded.
+
+        Args:
+            session_id: id submitted with the form, may be empty
+            user_id: user submitting the form, must own the session
+            game: game the form is for
+            kind: kind of upload the form field expects
+
+        Returns:
+            the session, or None if there is no valid session for the id
+    """
+    if not session_id:
+        return None
+
+    session = UploadSession.objects.filter(id=session_id, user_id=user_id, kind=kind).first()
+    if session is None or session.game_id not in (None, game.id):
+        return None
+
+    # update only the game, the browser may be completing the session right now
+    if session.game_id is None:
+        UploadSession.objects.filter(id=session.id, game__isnull=True).update(game=game)
+        session.refresh_from_db()
+
+    queue_upload_session(session)
+    return session
+
+
+def _start_session(request: HttpRequest) -> UploadSession | JsonResponse:
+    """
+        Validates a request to start a session, and creates it
+
+        Returns:
+            the new session, or an error response
+    """
+    kind = request.POST.get("kind", "")
+    filename = request.POST.get("filename", "")
+
+    if kind not in UploadSession.Kind.values:
+        return JsonResponse({"error": "invalid kind"}, status=400)
+    if not filename:
+        return JsonResponse({"error": "missing filename"}, status=400)
+
+    game = None
+    if request.POST.get("game_id"):
+        game = get_object_or_404(Game, id=request.POST["game_id"])
+        if game.user_id != request.user.id and not request.user.is_staff:
+            return JsonResponse({"error": "not allowed"}, status=403)
+
+    key = f"user/{request.user.id}/uploads/{uuid.uuid4().hex}{PurePath(filename).suffix}"
+    return UploadSession.objects.create(user=request.user, game=game, kind=kind,
+                                        key=key, filename=filename[:256])
+
+
+@login_required
+@require_POST
+def create(request: HttpRequest) -> JsonResponse:
+    """
+        Starts an upload session
+
+        url:   api/uploads/
+        name: "uploads_create"
+        form:  kind=bundle|screenshot, filename=..., game_id=... (optional)
+    """
+    session = _start_session(request)
+    if isinstance(session, JsonResponse):
+        return session
+
+    try:
+        target = get_storage().presigned_post(session.key, MAX_SIZES[session.kind])
+    except NotImplementedError:
+        session.delete()
+        return JsonResponse({"error": "direct uploads are not supported by this storage"}, status=501)
+
+    return JsonResponse({
+        "id": session.id,
+        "url": target["url"],
+        "fields": target["fields"],
+    })
+
+
+@login_required
+@require_POST
+def create_chunked(request: HttpRequest) -> JsonResponse:
+    """
+        Starts an upload session for a file sent in chunks
+
+        url:   api/uploads/chunked/
+        name: "uploads_create_chunked"
+        form:  kind=bundle|screenshot, filename=..., size=<bytes>, game_id=... (optional)
+    """
+    try:
+        size = int(request.POST.get("size", ""))
+    except ValueError:
+        return JsonResponse({"error": "invalid size"}, status=400)
+
+    kind = request.POST.get("kind", "")
+    if kind in UploadSession.Kind.values and not 0 < size <= MAX_SIZES[kind]:
+        return JsonResponse({"error": "file is empty or too large"}, status=400)
+
+    session = _start_session(request)
+    if isinstance(session, JsonResponse):
+        return session
+
+    session.size = size
+    session.chunk_size = CHUNK_SIZE
+    try:
+        session.upload_id = get_storage().create_multipart_upload(session.key)
+    except Exception as e:
+        print(f"create_chunked error: failed to start multipart upload for session: {session.id}", e)
+        session.delete()
+        return JsonResponse({"error": "failed to start the upload"}, status=502)
+
+    try:
+        session.save()
+    except Exception:
+        # don't leave an upload no session knows about
+        get_storage().abort_multipart_upload(session.key, session.upload_id)
+        raise
+
+    return JsonResponse({
+        "id": session.id,
+        "chunk_size": session.chunk_size,
+        "chunk_count": session.chunk_count,
+    })
+
+
+@login_required
+@require_GET
+def status(request: HttpRequest, session_id: int) -> JsonResponse:
+    """
+        Shows a session's status, and for chunked uploads, the chunks received
+
+        url:   api/uploads/<int:session_id>/
+        name: "uploads_status"
+    """
+    session = get_object_or_404(UploadSession, id=session_id, user_id=request.user.id)
+
+    return JsonResponse({
+        "id": session.id,
+        "status": session.status,
+        "chunk_size": session.chunk_size,
+        "chunk_count": session.chunk_count,
+        "received": sorted(int(index) for index in session.parts),
+    })
+
+
+@login_required
+@require_http_methods(["PUT"])
+def upload_chunk(request: HttpRequest, session_id: int, index: int) -> JsonResponse:
+    """
+        Receives one chunk of a chunked upload as the raw request body, and
+        uploads it as a part of the session's s3 multipart upload.
+        The chunk is read from the request a piece at a time, so memory use
+        stays constant no matter the chunk size.
+
+        url:     api/uploads/<int:session_id>/chunks/<int:index>/
+        name:   "uploads_chunk"
+        headers: X-Chunk-SHA256: sha256 hex digest of the chunk
+    """
+    session = get_object_or_404(UploadSession, id=session_id, user_id=request.user.id)
+
+    if not session.is_chunked or session.status != UploadSession.Status.PENDING:
+        return JsonResponse({"error": "session is not accepting chunks"}, status=409)
+    if not 0 <= index < session.chunk_count:
+        return JsonResponse({"error": "invalid chunk index"}, status=400)
+
+    expected_sha256 = request.headers.get("X-Chunk-SHA256", "").lower()
+    if not expected_sha256:
+        return JsonResponse({"error": "missing X-Chunk-SHA256 header"}, status=400)
+
+    expected_size = session.expected_chunk_size(index)
+
+    with tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE) as chunk:
+        # receive chunk, checksumming as it arrives
+        sha256 = hashlib.sha256()
+        md5 = hashlib.md5()
+        size = 0
+        while data := request.read(_READ_SIZE):
+            size += len(data)
+            if size > expected_size:
+                return JsonResponse({"error": "chunk is too large"}, status=400)
+
+            sha256.update(data)
+            md5.update(data)
+            chunk.write(data)
+
+        if size != expected_size:
+            return JsonResponse({"error": f"expected {expected_size} bytes, received {size}"},
+                                status=400)
+        if sha256.hexdigest() != expected_sha256:
+            return JsonResponse({"error": "checksum mismatch"}, status=400)
+
+        chunk.seek(0)
+        etag = get_storage().upload_part(session.key, session.upload_id, index + 1, chunk,
+                                         base64.b64encode(md5.digest()).decode())
+
+    # record the part, chunks may arrive at the same time
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(id=session.id)
+        session.parts[str(index)] = {"etag": etag, "sha256": expected_sha256}
+        session.save()
+
+    return JsonResponse({"id": session.id, "index": index, "received": len(session.parts)})
+
+
+@login_required
+@require_POST
+def complete(request: HttpRequest, session_id: int) -> JsonResponse:
+    """
+        Marks a session's file as uploaded, after checking that it landed in storage
+
+        url:   api/uploads/<int:session_id>/complete/
+        name: "uploads_complete"
+    """
+    session = get_object_or_404(UploadSession, id=session_id, user_id=request.user.id)
+    storage = get_storage()
+
+    if session.status == UploadSession.Status.PENDING and session.is_chunked:
+        missing = [i for i in range(session.chunk_count) if str(i) not in session.parts]
+        if missing:
+            return JsonResponse({"error": "missing chunks", "missing": missing}, status=409)
+
+        # claim the session, so a retry or a concurrent call doesn't assemble it again
+        claimed = UploadSession.objects.filter(
+            id=session.id, status=UploadSession.Status.PENDING).update(status=UploadSession.Status.ASSEMBLING)
+        if claimed:
+            try:
+                storage.complete_multipart_upload(
+                    session.key, session.upload_id,
+                    [session.parts[str(i)]["etag"] for i in range(session.chunk_count)])
+            except Exception as e:
+                # unless assembled anyway, e.g. the request timed out after s3 was done
+                if storage.head(session.key) is None:
+                    print(f"complete error: failed to assemble upload session: {session.id}", e)
+                    UploadSession.objects.filter(
+                        id=session.id, status=UploadSession.Status.ASSEMBLING).update(status=UploadSession.Status.PENDING)
+                    return JsonResponse({"error": "failed to assemble the upload"}, status=502)
+        session.refresh_from_db()
+
+    if session.status in (UploadSession.Status.PENDING, UploadSession.Status.ASSEMBLING):
+        info = storage.head(session.key)
+        if info is None:
+            if session.status == UploadSession.Status.ASSEMBLING:
+                return JsonResponse({"error": "upload is being assembled, try again"}, status=409)
+            return JsonResponse({"error": "file has not been uploaded"}, status=409)
+
+        # update only these fields, the form may be claiming the session right now
+        UploadSession.objects.filter(id=session.id, status=session.status).update(
+            size=info.size, status=UploadSession.Status.UPLOADED)
+        session.refresh_from_db()
+
+    # already uploaded by an earlier call, e.g. a retry, is a success too
+    queue_upload_session(session)
+
+    return JsonResponse({"id": session.id, "status": session.status})
+
+
+@login_required
+@require_POST
+def cancel(request: HttpRequest, session_id: int) -> JsonResponse:
+    """
+        Discards a session, aborting its unfinished upload and deleting its file,
+        see UploadSession.discard. Too late once the file is queued for processing.
+
+        url:   api/uploads/<int:session_id>/cancel/
+        name: "uploads_cancel"
+    """
+    with transaction.atomic():
+        session = get_object_or_404(UploadSession.objects.select_for_update(),
+                                    id=session_id, user_id=request.user.id)
+        if session.status == UploadSession.Status.QUEUED:
+            return JsonResponse({"error": "upload is already being processed"}, status=409)
+
+        session.discard()
+
+    return JsonResponse({"id": session_id, "status": "cancelled"})
@@ -7,109 +7,76 @@
     update - displays update game form, and handles submissions on post
     delete - deletes a game
 """
-from pathlib import PurePath
 
-import botocore.client
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.core.exceptions import PermissionDenied
 from django.core.files.uploadedfile import UploadedFile
 from django.db.models import F
-from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from django.urls import reverse
-
-import boto3
 
 from ..forms import GameCreateForm
 from ..forms.GameEditForm import GameEditForm
-from ..models import Game, File, Favorite
-from ..models.helpers import create_screenshot, create_or_update_single_screenshot
-import requests
-
-from ..util.s3 import get_base_url, boto3_client, get_bucket_name
-from ..util.zip import BgsZipfile
+from ..models import BundleManifest, Game, File, Favorite, UploadSession
+from ..models.helpers import stage_upload
+from .. import jobs, listings
+from .api.uploads import claim_upload_session
 
 
 def index(request: HttpRequest):
     """
-        Displays the games listing page
+        Displays the games listing page, a page of games at a time
         Shows games based on a search query if any was provided
+        Further pages are loaded as the user scrolls, see views.api.games.page
 
         url:  "games/"
-        query: q=search+terms+here
+        query: q=search+terms+here, cursor=<next page's cursor, from the previous page>
         name: "games_index"
     """
     q = request.GET.get("q", None)
-    games = None
+    cursor = request.GET.get("cursor", None)
+    try:
+        games, next_cursor = listings.game_page(q, cursor)
+    except ValueError:
+        return HttpResponseBadRequest("invalid cursor")
+
     featured_games = []
     if q:   # if there is a query
-        try:
-            # get list of games for query
-            game_ids = requests.get(request.scheme + "://" + request.get_host() + reverse("search_games") + "?q=" + q)
-            game_ids = game_ids.json()
-            game_ids = game_ids["games"]
-
-            games = Game.objects.filter(id__in=game_ids)
-        except Exception as e:
-            print("Error while searching for games in games index", e)
-            redirect("games_index")
-
         query_title = "Results for: " + q
-    else:  # if no query, display featured & latest games
-        featured_games.append(Game.objects.filter(user__username="aaron").first())
-        featured_games.append(Game.objects.filter(user__username="aaron").last())
-        featured_games.append(Game.objects.filter(user__username="user1").first())
+    else:  # if no query, display featured & popular games
+        if not cursor:
+            # covers are loaded with the games, so listings make no query per game
+            featured = Game.objects.select_related("user", "cover__file")
+            featured_games.append(featured.filter(user__username="aaron").first())
+            featured_games.append(featured.filter(user__username="aaron").last())
+            featured_games.append(featured.filter(user__username="user1").first())
 
-        games = Game.objects.filter(is_published=True).order_by("-times_viewed")
         query_title = "Popular Games"
     return render(request, "games/index.html", {
         "games": games,
+        "next_cursor": next_cursor,
         "query_title": query_title,
         "featured_games": featured_games
     })
 
 
-def _upload_game_file(file, key_base: str):
+def _enqueue_bundle(zip_upload: UploadedFile, game: Game):
     """
-        Helper file that uploads a file directly opened from a zip.
-
-        Args:
-            file: the file to upload
-            key_base: the root folder in s3 to upload the file to
+        Stages a zip upload on s3 and queues a job to ingest it
     """
-    path = PurePath(file.name)
-    path = PurePath(*path.parts[1:]) #  since this is a file extracted from a zip,
-                                     #  the first part of the filename is discarded
-
-    File.helpers.s3_upload(file, key_base + str(path))
+    key = stage_upload(zip_upload, game.user_id)
+    jobs.queue_bundle(game, key, zip_upload.name)
 
 
-def _process_zip_upload_for_game(zip_upload: UploadedFile, game: Game):
+def _enqueue_screenshot(screenshot_upload: UploadedFile, game: Game):
     """
-        Uploads zip file to s3.
-        If None, do nothing.
-        Make sure to save game afterward, since its URL gets updated.
-
-        location of files: base_url + "user/<user_id>/games/<game_id>/files/"
+        Stages a screenshot upload on s3 and queues a job to create or
+        replace the game's screenshot with it
     """
+    key = stage_upload(screenshot_upload, game.user_id)
+    jobs.queue_screenshot(game, key, screenshot_upload.name)
 
-    if not zip_upload:
-        return
-
-    # open zip
-    zip_file = BgsZipfile(zip_upload)
-
-    # folder key on s3 to upload to
-    folder = f"user/{game.user_id}/games/{game.id}/"
-
-    # upload each file to folder
-    for file in zip_file.files:
-        _upload_game_file(file, folder + "files/")
-
-    File.helpers.s3_upload(zip_file.file.fp, folder + "/compressed.zip")
-
-    zip_file.close()
 
 @login_required
 def create(request: HttpRequest):
@@ -140,28 +107,25 @@ def create(request: HttpRequest):
             new_game.user_id = request.user.id
             new_game.save()
 
-            # upload and set screenshot if user provided one
+            # queue processing of the screenshot if user provided one
             screenshot_file = request.FILES.get("screenshot", None)
 
             try:
                 if screenshot_file:
-                    # create screenshot from file
-                    screenshot = create_screenshot(request.FILES.get("screenshot"), new_game.id)
-
-                    # add it to game if it created
-                    if screenshot is None:
-                        print(f"failed to upload or create screenshot for game: {new_game.title}")
-                    else:
-                        new_game.screenshot_set.add(screenshot)
-                        new_game.save()
+                    _enqueue_screenshot(screenshot_file, new_game)
+                else:
+                    claim_upload_session(form.cleaned_data["screenshot_session"], request.user.id,
+                                         new_game, UploadSession.Kind.SCREENSHOT)
 
             except Exception as e:
                 print(f"failed to upload screenshot file for game: {new_game.title}", e)
 
             zip_upload = request.FILES.get("zip_upload", None)
             if zip_upload:
-                _process_zip_upload_for_game(zip_upload, new_game)
-                new_game.save()
+                _enqueue_bundle(zip_upload, new_game)
+            else:
+                claim_upload_session(form.cleaned_data["zip_upload_session"], request.user.id,
+                                     new_game, UploadSession.Kind.BUNDLE)
 
 
             return redirect("games_detail", pk=new_game.id)
@@ -219,24 +183,28 @@ def detail(request: HttpRequest, pk: int) -> HttpResponse:
 
     # increase times_viewed when any user except the creator views it
     if request.user.id != game.user_id:
-        times_viewed = game.times_viewed
-
-        # set views via F to prevent potential errors from race conditions
-        game.times_viewed = F("times_viewed") + 1
-        game.save()
+        # only the counter is written, via F to prevent errors from race conditions.
+        # a full save would write back the rest of the game as loaded, undoing
+        # changes made meanwhile, e.g. a bundle job setting the status
+        Game.objects.filter(id=game.id).update(times_viewed=F("times_viewed") + 1)
 
-        # set it temporarily to read in template, don't save
-        # (otherwise it appears as F(times_viewed) + 1)
-        game.times_viewed = times_viewed + 1
+        # shown in the template
+        game.times_viewed += 1
 
     is_faved = False
     if request.user.is_authenticated and \
         request.user.favorite_set.filter(game_id=pk, user_id=request.user.id).count():
         is_faved = True
 
+    # authors & their avatars in the same query, for the review list
+    reviews = game.review_set.select_related("user__profile__avatar")
+    screenshots = game.screenshot_set.select_related("file")
+
     return render(request, "games/detail.html",
                   {
                       "game": game,
+                      "reviews": reviews,
+                      "screenshots": screenshots,
                       "can_review": _can_review_game(request.user, game),
                       "is_faved": is_faved
                   })
@@ -272,30 +240,27 @@ def update(request: HttpRequest, pk: int) -> HttpResponse:
 
         if form.is_valid():
 
+            # commit changes before queueing jobs, which update the game
+            form.save()
+
             # update game's screenshot if user uploaded one
             screenshot_upload = request.FILES.get("screenshot")
             if screenshot_upload:
-
-                if not create_or_update_single_screenshot(screenshot_upload, game.id):
-                    print("error while creating or updating Game's screenshot")
-
+                _enqueue_screenshot(screenshot_upload, game)
+            else:
+                claim_upload_session(form.cleaned_data["screenshot_session"], request.user.id,
+                                     game, UploadSession.Kind.SCREENSHOT)
 
             # update zip file upload if user uploaded one
-            _process_zip_upload_for_game(request.FILES.get("zip_upload"), game)
-
-            # done, commit changes
-            form.save()
+            zip_upload = request.FILES.get("zip_upload")
+            if zip_upload:
+                _enqueue_bundle(zip_upload, game)
+            else:
+                claim_upload_session(form.cleaned_data["zip_upload_session"], request.user.id,
+                                     game, UploadSession.Kind.BUNDLE)
 
     return redirect( "games_detail", pk=game.id)
 
-def _delete_contents(s3, bucket: str, folder_key: str, delete_folder=True):
-    objects = s3.list_objects(Bucket=bucket, Prefix=folder_key)
-    for obj in objects["Contents"]:
-        s3.delete_object(Bucket=bucket, Key=obj["Key"])
-
-    if delete_folder:
-        s3.delete_object(Bucket=bucket, Key=folder_key)
-
 def delete_files(request: HttpRequest, pk: int) -> HttpResponse:
     """
         Delete files for a game, but not the game itself
@@ -304,11 +269,12 @@ def delete_files(request: HttpRequest, pk: int) -> HttpResponse:
     """
     try:
         game = get_object_or_404(Game, pk=pk)
-        s3 = boto3_client("s3")
 
-        bucket = get_bucket_name()
         key = f"user/{game.user_id}/games/{game.id}/files/"
-        _delete_contents(s3, bucket, key)
+        jobs.enqueue("delete_folder", key=key)
+
+        # files are gone, next upload must send every file again
+        BundleManifest.objects.filter(game=game).delete()
         return JsonResponse({"success": "deleted"})
     except Exception as e:
         return JsonResponse({"error": e})
@@ -327,11 +293,8 @@ def delete(request: HttpRequest, pk: int) -> HttpResponse:
 
     # only staff and game creator can delete game
     if request.user.is_staff or request.user.id == game.user_id:
-        s3 = boto3_client("s3")
-        bucket = get_bucket_name()
         key = f"user/{game.user_id}/games/{game.id}/"
-
-        _delete_contents(s3, bucket, key)
+        jobs.enqueue("delete_folder", key=key)
 
         game.delete()
     else:
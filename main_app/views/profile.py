@@ -11,8 +11,6 @@
 
     delete - deletes profile
 """
-from pathlib import PurePath
-
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import UploadedFile
@@ -20,7 +18,7 @@ from django.http import HttpRequest, HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 
 from ..forms import ProfileForm
-from ..models import File
+from ..models.helpers import create_avatar
 
 
 @login_required
@@ -44,7 +42,8 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
 
     target_user = get_object_or_404(User, username=username)
     return render(request, "profile/index.html", {
-        "target_user": target_user
+        "target_user": target_user,
+        "games": target_user.game_set.select_related("cover__file"),
     })
 
 
@@ -96,13 +95,13 @@ def update(request: HttpRequest) -> HttpResponse:
 
             if avatar_file:
 
-                # create and upload avatar
-                avatar = File.helpers.create_and_upload(avatar_file,
-                 f"user/{str(user.id)}/profile/avatar{PurePath(avatar_file.name).suffix}")
+                # create and upload avatar, with square copies at standard sizes
+                avatar = create_avatar(avatar_file, user.id)
 
                 if avatar:
 
-                    # delete any pre-existing avatar
+                    # delete any pre-existing avatar, its files are deleted in the background
+                    # unless it was the same picture
                     if prof.avatar:
                         prof.avatar.delete()
 
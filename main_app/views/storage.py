@@ -0,0 +1,57 @@
+"""
+    Serves files kept in local or memory storage, see util/storage.py.
+    Files on s3 are served by s3 itself, so these views 404 when using it.
+
+    These files are uploaded by users, games' html & js included, and are
+    served from the site's own origin. So that they can't act as the site,
+    e.g. read its cookies or post forms as whoever views them, they're
+    sandboxed into an origin of their own, see serve.
+"""
+import re
+
+from django.http import HttpRequest, FileResponse, Http404
+
+from ..util.storage import get_storage, S3Storage
+
+# Keys of uploads staged for processing, see models/helpers.stage_upload,
+# never served: they have not been checked yet
+_STAGED_KEY = re.compile(r"^user/\d+/uploads/")
+
+# Runs stored html as a page of a unique, opaque origin: scripts may run,
+# but can't reach the site's cookies, storage or same-origin requests
+_SANDBOX = "sandbox allow-scripts allow-pointer-lock"
+
+
+def serve(request: HttpRequest, key: str) -> FileResponse:
+    """
+        Streams a stored file, with the content type, encoding & caching it was uploaded with,
+        sandboxed & without content type sniffing. Staged uploads are not served.
+
+        url:   storage/<path:key>
+        name: "storage_serve"
+    """
+    storage = get_storage()
+    if isinstance(storage, S3Storage) or _STAGED_KEY.match(key.lstrip("/")):
+        raise Http404()
+
+    try:
+        info = storage.head(key)
+    except ValueError:  # key outside of the storage folder
+        raise Http404()
+    if info is None:
+        raise Http404()
+
+    response = FileResponse(storage.open(key), content_type=info.content_type)
+    response["Content-Length"] = info.size
+    if info.content_encoding:
+        response["Content-Encoding"] = info.content_encoding
+    if info.cache_control:
+        response["Cache-Control"] = info.cache_control
+
+    response["Content-Security-Policy"] = _SANDBOX
+    response["X-Content-Type-Options"] = "nosniff"
+    # sandboxed games have an opaque origin, so their own requests for their
+    # files are cross-origin, as they are to s3
+    response["Access-Control-Allow-Origin"] = "*"
+
+    return response